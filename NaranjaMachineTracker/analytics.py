@@ -0,0 +1,144 @@
+"""
+Vectorized report aggregations for machine utilization data.
+
+Hourly records are flattened once into a long-format DataFrame (one row per
+machine-hour); every report figure is then a grouped reduction over that
+frame. Nothing here depends on Streamlit, so the same code serves the app,
+scripts and notebooks.
+"""
+import pandas as pd
+
+from NaranjaMachineTracker.storage import MACHINE_FIELDS
+from NaranjaMachineTracker.utils import calculate_metrics_batch, capacities, get_machine_type
+
+FRAME_COLUMNS = ['timestamp', 'date', 'hour', 'username', 'machine'] + MACHINE_FIELDS
+
+
+def records_to_frame(records):
+    """
+    Flatten hourly records into a long-format DataFrame.
+
+    Args:
+        records (list): List of hourly records
+
+    Returns:
+        pandas.DataFrame: One row per machine-hour with the columns in FRAME_COLUMNS
+    """
+    columns = {column: [] for column in FRAME_COLUMNS}
+
+    for data in records:
+        machines = data['machines']
+        count = len(machines)
+        columns['timestamp'].extend([data['timestamp']] * count)
+        columns['date'].extend([data['date']] * count)
+        columns['hour'].extend([data['hour']] * count)
+        columns['username'].extend([data['username']] * count)
+
+        for machine_name, machine_data in machines.items():
+            columns['machine'].append(int(machine_name.split(' ')[-1]))
+            for field in MACHINE_FIELDS:
+                columns[field].append(machine_data[field])
+
+    df = pd.DataFrame(columns)
+    df = df.astype({
+        'hour': 'int64',
+        'machine': 'int64',
+        'packers': 'int64',
+        'cartons_packed': 'int64',
+        'utilization': 'float64',
+        'cartons_per_packer': 'float64',
+        'carton_type': 'category',
+        'inventory': 'category'
+    })
+    return df
+
+
+def recompute_metrics(df):
+    """
+    Re-derive capacity, utilization and cartons per packer from the raw readings.
+
+    Useful after the capacity configuration changes: the stored values were
+    computed with the capacities in force when each hour was saved.
+
+    Args:
+        df (pandas.DataFrame): Frame from records_to_frame
+
+    Returns:
+        pandas.DataFrame: Copy of df with the derived columns recomputed
+    """
+    df = df.copy()
+    df['capacity'] = capacities(df['machine'].to_numpy(), df['carton_type'].to_numpy())
+    df['utilization'], df['cartons_per_packer'] = calculate_metrics_batch(
+        df['cartons_packed'].to_numpy(), df['capacity'].to_numpy(), df['packers'].to_numpy())
+    return df
+
+
+def machine_averages(df):
+    """
+    Calculate per-machine averages.
+
+    Cartons per packer is averaged over every data point, counting hours
+    without packers as zero, as the Daily Report always has.
+
+    Args:
+        df (pandas.DataFrame): Frame from records_to_frame
+
+    Returns:
+        pandas.DataFrame: Indexed by machine number with the columns type,
+                          avg_utilization, avg_cartons_per_packer and total_cartons
+    """
+    active_cartons_per_packer = df['cartons_per_packer'].where(df['packers'] > 0, 0.0)
+
+    averages = (
+        df.assign(active_cartons_per_packer=active_cartons_per_packer)
+        .groupby('machine', sort=True)
+        .agg(
+            avg_utilization=('utilization', 'mean'),
+            avg_cartons_per_packer=('active_cartons_per_packer', 'mean'),
+            total_cartons=('cartons_packed', 'sum')
+        )
+    )
+    averages.insert(0, 'type', averages.index.map(get_machine_type))
+    return averages
+
+
+def daily_average_utilization(df):
+    """
+    Calculate the average utilization across all machines for each day.
+
+    Args:
+        df (pandas.DataFrame): Frame from records_to_frame
+
+    Returns:
+        pandas.Series: Average utilization indexed by date string, in date order
+    """
+    return df.groupby('date', sort=True)['utilization'].mean()
+
+
+def hourly_utilization(df, dimension='all'):
+    """
+    Calculate the average utilization for each recorded hour.
+
+    Args:
+        df (pandas.DataFrame): Frame from records_to_frame
+        dimension (str): "all" for one average over all machines, or a column
+            to average per group: "machine", "carton_type" or "inventory"
+
+    Returns:
+        pandas.DataFrame: Indexed by the start of the hour (datetime64) with one
+                          column per group ("all" for dimension "all"); NaN
+                          where a group was not seen that hour
+    """
+    hour_start = pd.to_datetime(df['date']) + pd.to_timedelta(df['hour'], unit='h')
+
+    if dimension == 'all':
+        averages = df['utilization'].groupby(hour_start.to_numpy(), sort=True).mean()
+        return averages.to_frame('all')
+
+    return df.assign(hour_start=hour_start).pivot_table(
+        index='hour_start',
+        columns=dimension,
+        values='utilization',
+        aggfunc='mean',
+        observed=True
+    ).sort_index()
@@ -0,0 +1,219 @@
+"""
+Re-derive capacity, utilization and cartons per packer for stored records.
+
+The derived fields are baked into each record when it is saved, so they go
+stale whenever the standard capacities (machines.json) change. This job
+recomputes them from the raw readings for a date range, one month per worker
+process, and rewrites only the records that changed.
+
+Usage:
+    python -m NaranjaMachineTracker.backfill START_DATE END_DATE
+        [--data-dir data] [--backend json|binary|parquet|history|sqlite] [--workers N] [--dry-run]
+
+Running Streamlit servers keep serving cached values until they restart.
+"""
+import argparse
+import datetime
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+
+from NaranjaMachineTracker import analytics
+from NaranjaMachineTracker.data_handler import SAVE_LOCK_BATCH, create_data_handler
+from NaranjaMachineTracker.rollups import period_bounds
+from NaranjaMachineTracker.storage import record_version
+
+DERIVED_FIELDS = ['capacity', 'utilization', 'cartons_per_packer']
+
+
+def month_shards(start_date_str, end_date_str):
+    """
+    Split a date range into per-month sub-ranges.
+
+    Args:
+        start_date_str (str): Start date string (format: "YYYY-MM-DD")
+        end_date_str (str): End date string (format: "YYYY-MM-DD")
+
+    Returns:
+        list: (start, end) date string pairs, one per calendar month
+    """
+    shards = []
+    current = start_date_str
+    while current <= end_date_str:
+        _, _, month_end = period_bounds('monthly', current)
+        shards.append((current, min(month_end, end_date_str)))
+        current = str(datetime.date.fromisoformat(month_end) + datetime.timedelta(days=1))
+    return shards
+
+
+def recompute_records(records):
+    """
+    Recompute the derived fields of a batch of records.
+
+    Args:
+        records (list): List of hourly records
+
+    Returns:
+        tuple: (updated records, diffs) where updated records are copies of the
+               records that changed and diffs lists
+               (timestamp, machine name, field, old value, new value)
+    """
+    if not records:
+        return [], []
+
+    recomputed = analytics.recompute_metrics(analytics.records_to_frame(records))
+    new_values = {field: recomputed[field].tolist() for field in DERIVED_FIELDS}
+
+    # The frame rows follow the records and their machines in order
+    updated = []
+    diffs = []
+    row = 0
+    for data in records:
+        changed_machines = {}
+        for machine_name, machine_data in data['machines'].items():
+            for field in DERIVED_FIELDS:
+                old_value = machine_data[field]
+                new_value = new_values[field][row]
+                if old_value != new_value:
+                    changed_machines.setdefault(machine_name, dict(machine_data))[field] = new_value
+                    diffs.append((data['timestamp'], machine_name, field, old_value, new_value))
+            row += 1
+
+        if changed_machines:
+            updated.append(dict(data, machines={**data['machines'], **changed_machines}))
+
+    return updated, diffs
+
+
+def backfill_shard(data_dir, backend, start_date_str, end_date_str, dry_run):
+    """
+    Backfill one shard of the date range. Runs in a worker process.
+
+    Args:
+        data_dir (str): Data directory
+        backend (str): Storage backend name
+        start_date_str (str): Start date string (format: "YYYY-MM-DD")
+        end_date_str (str): End date string (format: "YYYY-MM-DD")
+        dry_run (bool): Compute the differences without writing anything
+
+    Returns:
+        dict: records, updated, skipped, diffs and the dates that changed
+    """
+    data_handler = create_data_handler(backend, data_dir)
+    storage = data_handler.storage
+    records = data_handler.load_date_range_data(start_date_str, end_date_str)
+    versions = {data['timestamp']: record_version(data) for data in records}
+    updated, diffs = recompute_records(records)
+
+    skipped = set()
+    if updated and not dry_run:
+        by_lock = {}
+        for data in updated:
+            by_lock.setdefault(storage.lock_key(data['timestamp']), []).append(data)
+
+        # Hold the same locks as save_data, in a fixed order and a bounded
+        # number at a time (one open file each), and leave out any hour that
+        # an operator re-saved since it was read
+        names = sorted(by_lock)
+        written = []
+        for start in range(0, len(names), SAVE_LOCK_BATCH):
+            with ExitStack() as stack:
+                batch = []
+                for name in names[start:start + SAVE_LOCK_BATCH]:
+                    stack.enter_context(storage.lock(name))
+                    batch.extend(by_lock[name])
+
+                for data in batch:
+                    if record_version(storage.read(data['timestamp'])) != versions[data['timestamp']]:
+                        skipped.add(data['timestamp'])
+                batch = [data for data in batch if data['timestamp'] not in skipped]
+
+                # Each backend writes a batch atomically: renamed JSON files, a
+                # replaced Parquet partition or a single SQLite transaction
+                if batch:
+                    storage.write_many(batch)
+                    written.extend(batch)
+        updated = written
+
+    return {
+        'records': len(records),
+        'updated': len(updated),
+        'skipped': sorted(skipped),
+        'diffs': [diff for diff in diffs if diff[0] not in skipped],
+        'dates': sorted(set(data['date'] for data in updated))
+    }
+
+
+def backfill(data_dir, backend, start_date_str, end_date_str, workers=None, dry_run=False):
+    """
+    Recompute the derived fields for a date range across a process pool.
+
+    Args:
+        data_dir (str): Data directory
+        backend (str): Storage backend name
+        start_date_str (str): Start date string (format: "YYYY-MM-DD")
+        end_date_str (str): End date string (format: "YYYY-MM-DD")
+        workers (int): Number of worker processes (defaults to the CPU count)
+        dry_run (bool): Report the differences without writing anything
+
+    Returns:
+        dict: records, updated, skipped (timestamps changed concurrently),
+              diffs, elapsed seconds and records_per_sec
+    """
+    shards = month_shards(start_date_str, end_date_str)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(shards) or 1))
+    started = time.perf_counter()
+
+    args = [(data_dir, backend, start, end, dry_run) for start, end in shards]
+    if workers == 1:
+        results = [backfill_shard(*shard_args) for shard_args in args]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(backfill_shard, *zip(*args)))
+
+    summary = {
+        'records': sum(result['records'] for result in results),
+        'updated': sum(result['updated'] for result in results),
+        'skipped': [timestamp for result in results for timestamp in result['skipped']],
+        'diffs': [diff for result in results for diff in result['diffs']]
+    }
+
+    # Rollups hold utilization, so refresh the days that changed
+    if not dry_run:
+        data_handler = create_data_handler(backend, data_dir)
+        data_handler.refresh_rollups(date_str for result in results for date_str in result['dates'])
+
+    summary['elapsed'] = time.perf_counter() - started
+    summary['records_per_sec'] = summary['records'] / summary['elapsed'] if summary['elapsed'] > 0 else 0
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recompute capacity, utilization and cartons per packer for stored data.")
+    parser.add_argument("start_date", help="Start date (YYYY-MM-DD)")
+    parser.add_argument("end_date", help="End date (YYYY-MM-DD)")
+    parser.add_argument("--data-dir", default="data", help="Data directory (default: data)")
+    parser.add_argument("--backend", default="json", help="Storage backend: json, binary, parquet, history or sqlite")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: CPU count)")
+    parser.add_argument("--dry-run", action="store_true", help="Show what would change without writing")
+    parser.add_argument("--show", type=int, default=20, help="Number of differences to print (default: 20)")
+    args = parser.parse_args(argv)
+
+    summary = backfill(args.data_dir, args.backend, args.start_date, args.end_date, args.workers, args.dry_run)
+
+    for timestamp, machine_name, field, old_value, new_value in summary['diffs'][:args.show]:
+        print(f"{timestamp} {machine_name} {field}: {old_value} -> {new_value}")
+    if len(summary['diffs']) > args.show:
+        print(f"... {len(summary['diffs']) - args.show} more differences")
+
+    if summary['skipped']:
+        print(f"Skipped {len(summary['skipped'])} records saved during the run: {', '.join(summary['skipped'])}")
+
+    action = "Would update" if args.dry_run else "Updated"
+    print(f"{action} {summary['updated']} of {summary['records']} records "
+          f"in {summary['elapsed']:.2f}s ({summary['records_per_sec']:.0f} records/sec)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+import bisect
+import sys
+import threading
+from collections import OrderedDict
+
+from NaranjaMachineTracker.rollups import period_bounds
+from NaranjaMachineTracker.storage import parse_timestamp, record_version
+
+
+def estimate_size(value):
+    """
+    Roughly estimate the memory used by a loaded value.
+
+    Args:
+        value: Record, list of records or aggregate built from dicts, lists,
+               strings and numbers
+
+    Returns:
+        int: Approximate size in bytes
+    """
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        for key, item in value.items():
+            size += sys.getsizeof(key) + estimate_size(item)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            size += estimate_size(item)
+    return size
+
+
+class CachedDataHandler:
+    """
+    Process-wide cache in front of a DataHandler.
+
+    Loaded records, date ranges and report aggregates are kept in an LRU cache
+    bounded by an approximate memory budget, so that Streamlit reruns and
+    concurrent sessions share parsed data instead of re-reading it from disk.
+    Saving a timestamp through the cache invalidates exactly the entries that
+    cover it. Writes made by other processes are not seen until the entries
+    are evicted.
+
+    Cached records are shared between callers and must be treated as read-only.
+    """
+
+    def __init__(self, data_handler, max_bytes=64 * 1024 * 1024):
+        """
+        Initialize the cache.
+
+        Args:
+            data_handler (DataHandler): The data handler to cache
+            max_bytes (int): Memory budget for cached values
+        """
+        self.data_handler = data_handler
+        self.max_bytes = max_bytes
+
+        # key -> (value, size, start_date, end_date); the date span is what a
+        # save has to overlap to invalidate the entry
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        # Bumped on every save so that a load which started before the save
+        # does not put stale data back into the cache
+        self._generation = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __getattr__(self, name):
+        # Anything not cached (data_dir, storage, ...) goes to the wrapped handler
+        return getattr(self.data_handler, name)
+
+    def _get(self, key, start_date, end_date, loader):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            generation = self._generation
+
+        value = loader()
+        size = estimate_size(value)
+
+        with self._lock:
+            if generation == self._generation and size <= self.max_bytes:
+                if key in self._entries:
+                    self._bytes -= self._entries.pop(key)[1]
+                self._entries[key] = (value, size, start_date, end_date)
+                self._bytes += size
+
+                # Evict least recently used entries until back under budget
+                while self._bytes > self.max_bytes:
+                    _, (_, evicted_size, _, _) = self._entries.popitem(last=False)
+                    self._bytes -= evicted_size
+                    self.evictions += 1
+
+        return value
+
+    def invalidate(self, timestamp):
+        """
+        Drop every cached entry that covers a timestamp.
+
+        Args:
+            timestamp (str): Timestamp identifier (format: "YYYY-MM-DD_HH")
+        """
+        self.invalidate_many([timestamp])
+
+    def invalidate_many(self, timestamps):
+        """
+        Drop every cached entry that covers any of several timestamps.
+
+        The cache is scanned once however many timestamps there are.
+
+        Args:
+            timestamps (iterable): Timestamp identifiers (format: "YYYY-MM-DD_HH")
+        """
+        record_keys = {('record', timestamp) for timestamp in timestamps}
+        if not record_keys:
+            return
+        dates = sorted({parse_timestamp(timestamp)[0] for _, timestamp in record_keys})
+
+        def covers(start_date, end_date):
+            # Whether any saved date falls within [start_date, end_date]
+            position = bisect.bisect_left(dates, start_date)
+            return position < len(dates) and dates[position] <= end_date
+
+        with self._lock:
+            self._generation += 1
+            stale = [
+                key for key, (_, _, start_date, end_date) in self._entries.items()
+                if key in record_keys
+                or key[0] != 'record' and (start_date is None or covers(start_date, end_date))
+            ]
+            for key in stale:
+                self._bytes -= self._entries.pop(key)[1]
+
+    def clear(self):
+        """Drop every cached entry."""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """
+        Return cache counters.
+
+        Returns:
+            dict: hits, misses, evictions, entries and bytes
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._bytes
+            }
+
+    def save_data(self, timestamp, data, expected_version=None):
+        # Invalidate on conflicts too: the stored record changed underneath us
+        try:
+            return self.data_handler.save_data(timestamp, data, expected_version)
+        finally:
+            self.invalidate(timestamp)
+
+    def save_many(self, records, merge=False):
+        try:
+            return self.data_handler.save_many(records, merge)
+        finally:
+            self.invalidate_many(data['timestamp'] for data in records)
+
+    def rebuild_rollups(self):
+        days = self.data_handler.rebuild_rollups()
+        self.clear()
+        return days
+
+    def load_data(self, timestamp, with_version=False):
+        date_str, _ = parse_timestamp(timestamp)
+        data = self._get(('record', timestamp), date_str, date_str,
+                         lambda: self.data_handler.load_data(timestamp))
+        if with_version:
+            return data, record_version(data)
+        return data
+
+    def load_daily_data(self, date_str):
+        # Copy the list so callers that sort it in place don't reorder the cache
+        return list(self._get(('range', date_str, date_str), date_str, date_str,
+                              lambda: self.data_handler.load_daily_data(date_str)))
+
+    def load_date_range_data(self, start_date_str, end_date_str):
+        return list(self._get(('range', start_date_str, end_date_str), start_date_str, end_date_str,
+                              lambda: self.data_handler.load_date_range_data(start_date_str, end_date_str)))
+
+    def list_available_dates(self):
+        # Any save can add a date, so this entry spans everything
+        return list(self._get(('dates',), None, None, self.data_handler.list_available_dates))
+
+    def machine_averages(self, date_str):
+        return self._get(('machine_averages', date_str), date_str, date_str,
+                         lambda: self.data_handler.machine_averages(date_str))
+
+    def daily_average_utilization(self, start_date_str, end_date_str):
+        return self._get(('daily_average_utilization', start_date_str, end_date_str), start_date_str, end_date_str,
+                         lambda: self.data_handler.daily_average_utilization(start_date_str, end_date_str))
+
+    def daily_inventory_utilization(self, start_date_str, end_date_str):
+        return self._get(('daily_inventory_utilization', start_date_str, end_date_str), start_date_str, end_date_str,
+                         lambda: self.data_handler.daily_inventory_utilization(start_date_str, end_date_str))
+
+    def utilization_trend(self, start_date_str, end_date_str, period="daily", dimension="all"):
+        # The first bucket may start before the requested range and the last
+        # may end after it; a save anywhere in them changes their means
+        first_bucket_start = period_bounds(period, start_date_str)[1]
+        last_bucket_end = period_bounds(period, end_date_str)[2]
+        return self._get(('utilization_trend', start_date_str, end_date_str, period, dimension),
+                         first_bucket_start, last_bucket_end,
+                         lambda: self.data_handler.utilization_trend(start_date_str, end_date_str, period, dimension))
+
+    def hourly_utilization_trend(self, start_date_str, end_date_str, dimension="all"):
+        return self._get(('hourly_utilization_trend', start_date_str, end_date_str, dimension),
+                         start_date_str, end_date_str,
+                         lambda: self.data_handler.hourly_utilization_trend(start_date_str, end_date_str, dimension))
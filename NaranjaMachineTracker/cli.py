@@ -0,0 +1,377 @@
+"""
+Command-line bulk import and export of utilization data.
+
+Import reads one row per machine-hour from CSV, Excel or JSONL files with
+the columns
+
+    date, hour, machine, carton_type, packers, cartons_packed, inventory[, username]
+
+(machine as 9 or "Machine 9"; JSONL lines may also be whole hourly records
+as stored). Rows are read and validated in batches; invalid rows are
+reported and skipped. Capacity, utilization and cartons per packer are
+derived with utils, exactly as the Data Entry form does. An hour that is
+already stored keeps the machines the file does not mention.
+
+Export writes a date range as the same rows, with the derived columns, to
+CSV, Parquet or JSONL, streaming the records instead of loading the whole
+range at once.
+
+Usage:
+    python -m NaranjaMachineTracker.cli import FILE [FILE ...] [--data-dir data]
+        [--backend json|binary|parquet|history|sqlite] [--batch-size 10000]
+        [--username import] [--replace] [--dry-run]
+    python -m NaranjaMachineTracker.cli export START_DATE END_DATE OUTPUT
+        [--format csv|parquet|jsonl] [--data-dir data] [--backend ...]
+"""
+import argparse
+import itertools
+import json
+import os
+import time
+from contextlib import ExitStack
+
+import numpy as np
+import pandas as pd
+
+from NaranjaMachineTracker import analytics
+from NaranjaMachineTracker.data_handler import create_data_handler
+from NaranjaMachineTracker.utils import (
+    CARTON_TYPES, INVENTORY_TYPES, MACHINE_NUMBERS, calculate_metrics_batch, capacities
+)
+
+IMPORT_COLUMNS = ['date', 'hour', 'machine', 'carton_type', 'packers', 'cartons_packed', 'inventory']
+
+IMPORT_FORMATS = {'.csv': 'csv', '.xlsx': 'excel', '.xls': 'excel', '.jsonl': 'jsonl', '.ndjson': 'jsonl'}
+EXPORT_FORMATS = {'.csv': 'csv', '.parquet': 'parquet', '.jsonl': 'jsonl', '.ndjson': 'jsonl'}
+
+# Invalid rows printed per import; the rest are only counted
+MAX_REPORTED_ERRORS = 20
+
+
+def file_format(path, formats):
+    """
+    Work out a file's format from its extension.
+
+    Args:
+        path (str): File path
+        formats (dict): Extension -> format name
+
+    Returns:
+        str: Format name
+
+    Raises:
+        ValueError: If the extension is not one of formats
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in formats:
+        raise ValueError(f"Unsupported file type {extension or '(none)'}; use one of {', '.join(sorted(formats))}")
+    return formats[extension]
+
+
+def _record_rows(data):
+    # A stored hourly record as import rows
+    return [
+        dict(machine_data, date=data['date'], hour=data['hour'], machine=machine_name, username=data.get('username'))
+        for machine_name, machine_data in data['machines'].items()
+    ]
+
+
+def read_batches(path, batch_size=10000):
+    """
+    Read an import file in batches of rows.
+
+    Args:
+        path (str): CSV, Excel (.xlsx/.xls) or JSONL file
+        batch_size (int): Rows per batch
+
+    Yields:
+        pandas.DataFrame: Consecutive batches of rows, with the original
+                          row numbers (1-based, header excluded) as index
+    """
+    fmt = file_format(path, IMPORT_FORMATS)
+    first_row = 1
+
+    if fmt == 'csv':
+        # Keep text columns as written; numbers are checked during validation
+        batches = pd.read_csv(path, chunksize=batch_size, dtype=str, skipinitialspace=True)
+    elif fmt == 'excel':
+        try:
+            frame = pd.read_excel(path, dtype=str)
+        except ImportError as e:
+            raise ImportError(f"Reading Excel files needs openpyxl (pip install openpyxl): {e}")
+        batches = (frame.iloc[start:start + batch_size] for start in range(0, len(frame), batch_size))
+    else:
+        def jsonl_batches():
+            with open(path, 'r') as f:
+                lines = (line for line in f if line.strip())
+                while True:
+                    rows = []
+                    for line in itertools.islice(lines, batch_size):
+                        obj = json.loads(line)
+                        rows.extend(_record_rows(obj) if 'machines' in obj else [obj])
+                    if not rows:
+                        return
+                    yield pd.DataFrame(rows)
+        batches = jsonl_batches()
+
+    for batch in batches:
+        batch.index = pd.RangeIndex(first_row, first_row + len(batch))
+        first_row += len(batch)
+        yield batch
+
+
+def validate_rows(batch, default_username):
+    """
+    Check and normalize a batch of import rows.
+
+    Args:
+        batch (pandas.DataFrame): Rows from read_batches
+        default_username (str): Username for rows without one
+
+    Returns:
+        tuple: (valid rows, errors) where valid rows is a DataFrame with the
+               IMPORT_COLUMNS plus username, typed and normalized, and errors
+               lists (row number, message) for every rejected row
+    """
+    missing = [column for column in IMPORT_COLUMNS if column not in batch.columns]
+    if missing:
+        raise ValueError(f"Missing column(s): {', '.join(missing)}")
+
+    rows = pd.DataFrame(index=batch.index)
+    rows['date'] = pd.to_datetime(batch['date'].astype(str).str.strip().str[:10],
+                                  format="%Y-%m-%d", errors='coerce').dt.strftime("%Y-%m-%d")
+    rows['hour'] = pd.to_numeric(batch['hour'], errors='coerce')
+    rows['machine'] = pd.to_numeric(batch['machine'].astype(str).str.extract(r'(\d+)\s*$')[0], errors='coerce')
+    rows['carton_type'] = batch['carton_type'].astype(str).str.strip()
+    rows['packers'] = pd.to_numeric(batch['packers'], errors='coerce')
+    rows['cartons_packed'] = pd.to_numeric(batch['cartons_packed'], errors='coerce')
+    rows['inventory'] = batch['inventory'].astype(str).str.strip()
+
+    username = batch['username'] if 'username' in batch.columns else pd.Series(np.nan, index=batch.index)
+    rows['username'] = username.where(username.notna() & (username.astype(str).str.strip() != ""), default_username)
+
+    def whole(values, low, high=None):
+        ok = values.notna() & (values % 1 == 0) & (values >= low)
+        return ok & (values <= high) if high is not None else ok
+
+    checks = [
+        ('date', rows['date'].notna(), "date is not YYYY-MM-DD"),
+        ('hour', whole(rows['hour'], 0, 23), "hour is not 0-23"),
+        ('machine', rows['machine'].isin(MACHINE_NUMBERS), "unknown machine"),
+        ('carton_type', rows['carton_type'].isin(CARTON_TYPES), "unknown carton type"),
+        ('packers', whole(rows['packers'], 0), "packers is not a whole number >= 0"),
+        ('cartons_packed', whole(rows['cartons_packed'], 0), "cartons_packed is not a whole number >= 0"),
+        ('inventory', rows['inventory'].isin(INVENTORY_TYPES), "unknown inventory status")
+    ]
+
+    # Report only the first problem of each row
+    errors = []
+    valid = pd.Series(True, index=rows.index)
+    for column, ok, message in checks:
+        failed = valid & ~ok
+        errors.extend((row, f"{message} ({value!r})") for row, value in batch.loc[failed, column].items())
+        valid &= ok
+    errors.sort()
+
+    rows = rows[valid].astype({'hour': 'int64', 'machine': 'int64', 'packers': 'int64', 'cartons_packed': 'int64'})
+    return rows, errors
+
+
+def rows_to_records(rows):
+    """
+    Build hourly records from validated rows, deriving the stored metrics.
+
+    A later row for the same machine-hour replaces an earlier one.
+
+    Args:
+        rows (pandas.DataFrame): Valid rows from validate_rows
+
+    Returns:
+        list: Hourly records in the stored format, in date and hour order
+    """
+    rows = rows.drop_duplicates(['date', 'hour', 'machine'], keep='last')
+    rows = rows.sort_values(['date', 'hour', 'machine'], kind='stable')
+
+    capacity = capacities(rows['machine'].to_numpy(), rows['carton_type'].to_numpy())
+    utilization, cartons_per_packer = calculate_metrics_batch(
+        rows['cartons_packed'].to_numpy(), capacity, rows['packers'].to_numpy())
+
+    columns = zip(
+        rows['date'].tolist(), rows['hour'].tolist(), rows['username'].tolist(), rows['machine'].tolist(),
+        rows['carton_type'].tolist(), rows['packers'].tolist(), rows['cartons_packed'].tolist(),
+        rows['inventory'].tolist(), capacity.tolist(), utilization.tolist(), cartons_per_packer.tolist()
+    )
+
+    records = []
+    for (date_str, hour), hour_rows in itertools.groupby(columns, key=lambda row: (row[0], row[1])):
+        machines = {}
+        username = None
+        for _, _, username, machine, carton_type, packers, cartons, inventory, cap, util, per_packer in hour_rows:
+            machines[f"Machine {machine}"] = {
+                'carton_type': carton_type,
+                'packers': packers,
+                'cartons_packed': cartons,
+                'inventory': inventory,
+                'capacity': cap,
+                'utilization': util,
+                'cartons_per_packer': per_packer
+            }
+        records.append({
+            'timestamp': f"{date_str}_{hour}",
+            'date': date_str,
+            'hour': hour,
+            'username': username,
+            'machines': machines
+        })
+    return records
+
+
+def import_files(data_handler, paths, batch_size=10000, username="import", merge=True, dry_run=False):
+    """
+    Import machine-hour rows from files into the data store.
+
+    Args:
+        data_handler (DataHandler): Destination
+        paths (list): CSV, Excel or JSONL files
+        batch_size (int): Rows read, validated and written at a time
+        username (str): Username for rows without one
+        merge (bool): Keep stored machines that the files leave out
+        dry_run (bool): Validate only, write nothing
+
+    Returns:
+        dict: rows, imported (valid rows), records (hours written), errors
+              ((file, row, message) list), elapsed seconds and rows_per_sec
+    """
+    summary = {'rows': 0, 'imported': 0, 'records': 0, 'errors': []}
+    started = time.perf_counter()
+
+    # Hours written so far; rows for them in a later batch (an hour cut in two
+    # by a batch boundary, or repeated in another file) are merged into them
+    written = set()
+
+    for path in paths:
+        for batch in read_batches(path, batch_size):
+            rows, errors = validate_rows(batch, username)
+            summary['rows'] += len(batch)
+            summary['imported'] += len(rows)
+            summary['errors'].extend((path, row, message) for row, message in errors)
+
+            records = rows_to_records(rows)
+            if not dry_run:
+                seen = [data for data in records if data['timestamp'] in written]
+                new = [data for data in records if data['timestamp'] not in written]
+                if seen:
+                    data_handler.save_many(seen, merge=True)
+                if new:
+                    data_handler.save_many(new, merge=merge)
+            written.update(data['timestamp'] for data in records)
+
+    summary['records'] = len(written)
+
+    summary['elapsed'] = time.perf_counter() - started
+    summary['rows_per_sec'] = summary['rows'] / summary['elapsed'] if summary['elapsed'] > 0 else 0
+    return summary
+
+
+def export_range(data_handler, start_date_str, end_date_str, output, fmt=None, batch_size=10000):
+    """
+    Export a date range as machine-hour rows.
+
+    Args:
+        data_handler (DataHandler): Source of the records
+        start_date_str (str): Start date string (format: "YYYY-MM-DD")
+        end_date_str (str): End date string (format: "YYYY-MM-DD")
+        output (str): Output file
+        fmt (str): "csv", "parquet" or "jsonl" (defaults to the output extension)
+        batch_size (int): Approximate rows converted and written at a time
+
+    Returns:
+        dict: rows, records, elapsed seconds and rows_per_sec
+    """
+    fmt = fmt or file_format(output, EXPORT_FORMATS)
+    records_per_batch = max(1, batch_size // max(len(MACHINE_NUMBERS), 1))
+    summary = {'rows': 0, 'records': 0}
+    started = time.perf_counter()
+
+    records = data_handler.iter_range(start_date_str, end_date_str)
+    with ExitStack() as stack:
+        if fmt == 'parquet':
+            # pyarrow ships with streamlit, but only this format needs it
+            import pyarrow
+            import pyarrow.parquet
+            writer = None
+        else:
+            f = stack.enter_context(open(output, 'w', newline=''))
+
+        while True:
+            batch = list(itertools.islice(records, records_per_batch))
+            if not batch:
+                break
+
+            # Plain strings instead of categoricals, so every batch has the same schema
+            frame = analytics.records_to_frame(batch).astype({'carton_type': str, 'inventory': str})
+
+            if fmt == 'csv':
+                frame.to_csv(f, header=summary['rows'] == 0, index=False)
+            elif fmt == 'jsonl':
+                # Ends with a newline already, so batches join without blank lines
+                frame.to_json(f, orient='records', lines=True)
+            else:
+                table = pyarrow.Table.from_pandas(frame, preserve_index=False)
+                if writer is None:
+                    writer = stack.enter_context(pyarrow.parquet.ParquetWriter(output, table.schema))
+                writer.write_table(table)
+
+            summary['rows'] += len(frame)
+            summary['records'] += len(batch)
+
+    summary['elapsed'] = time.perf_counter() - started
+    summary['rows_per_sec'] = summary['rows'] / summary['elapsed'] if summary['elapsed'] > 0 else 0
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import and export of machine utilization data.")
+    parser.add_argument("--data-dir", default="data", help="Data directory (default: data)")
+    parser.add_argument("--backend", default="json", help="Storage backend: json, binary, parquet, history or sqlite")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = commands.add_parser("import", help="Import machine-hour rows from CSV, Excel or JSONL files")
+    import_parser.add_argument("files", nargs="+", help="Files to import")
+    import_parser.add_argument("--batch-size", type=int, default=10000, help="Rows per batch (default: 10000)")
+    import_parser.add_argument("--username", default="import", help="Username for rows without one (default: import)")
+    import_parser.add_argument("--replace", action="store_true",
+                               help="Replace stored hours entirely instead of merging machines into them")
+    import_parser.add_argument("--dry-run", action="store_true", help="Validate the files without writing")
+
+    export_parser = commands.add_parser("export", help="Export a date range to CSV, Parquet or JSONL")
+    export_parser.add_argument("start_date", help="Start date (YYYY-MM-DD)")
+    export_parser.add_argument("end_date", help="End date (YYYY-MM-DD)")
+    export_parser.add_argument("output", help="Output file (.csv, .parquet or .jsonl)")
+    export_parser.add_argument("--format", choices=sorted(set(EXPORT_FORMATS.values())),
+                               help="Output format (default: from the file extension)")
+    export_parser.add_argument("--batch-size", type=int, default=10000, help="Rows per batch (default: 10000)")
+
+    args = parser.parse_args(argv)
+    data_handler = create_data_handler(args.backend, args.data_dir)
+
+    if args.command == "import":
+        summary = import_files(data_handler, args.files, args.batch_size, args.username,
+                               merge=not args.replace, dry_run=args.dry_run)
+
+        for path, row, message in summary['errors'][:MAX_REPORTED_ERRORS]:
+            print(f"{path}, row {row}: {message}")
+        if len(summary['errors']) > MAX_REPORTED_ERRORS:
+            print(f"... {len(summary['errors']) - MAX_REPORTED_ERRORS} more invalid rows")
+
+        action = "Validated" if args.dry_run else "Imported"
+        print(f"{action} {summary['imported']} of {summary['rows']} rows into {summary['records']} hourly records "
+              f"in {summary['elapsed']:.2f}s ({summary['rows_per_sec']:.0f} rows/sec)")
+    else:
+        summary = export_range(data_handler, args.start_date, args.end_date, args.output, args.format, args.batch_size)
+        print(f"Exported {summary['rows']} rows from {summary['records']} hourly records to {args.output} "
+              f"in {summary['elapsed']:.2f}s ({summary['rows_per_sec']:.0f} rows/sec)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,73 +1,171 @@
 import os
-import json
 import datetime
+import itertools
+from contextlib import ExitStack
+
+from NaranjaMachineTracker.instrumentation import timed
+from NaranjaMachineTracker.rollups import RollupStore
+from NaranjaMachineTracker.storage import (
+    ConflictError, SqliteStorage, create_storage, parse_timestamp, project_record, record_version
+)
+from NaranjaMachineTracker.utils import get_machine_type
+
+# Locks held at once by save_many; each is an open lock file
+SAVE_LOCK_BATCH = 256
 
 class DataHandler:
     """
     Handles data storage and retrieval for the machine utilization application.
-    Uses a simple JSON file-based storage system.
+    Records are persisted through a pluggable storage backend (see storage.py);
+    by default one JSON file per hour.
     """
     
-    def __init__(self, data_dir="data"):
+    def __init__(self, data_dir="data", backend="json", storage=None):
         """
         Initialize the data handler.
         
         Args:
             data_dir (str): Directory to store data files
+            backend (str): Storage backend name ("json", "binary", "parquet" or "history")
+            storage (StorageBackend): Ready-made backend, overrides backend
         """
         self.data_dir = data_dir
         
         # Create data directory if it doesn't exist
         if not os.path.exists(data_dir):
             os.makedirs(data_dir)
+        
+        self.storage = storage if storage is not None else create_storage(backend, data_dir)
+        
+        # Daily / weekly / monthly aggregates maintained on every save. Kept in
+        # a subdirectory, like .locks and .tmp, because SQLite creates and
+        # removes its -wal and -shm files next to the database, and the JSON
+        # manifest treats any change to data_dir itself as a change of records
+        self.rollups = RollupStore(os.path.join(data_dir, ".rollups", "rollups.db"))
+        self._rollups_checked = False
     
-    def save_data(self, timestamp, data):
+    @timed("data_handler.save_data")
+    def save_data(self, timestamp, data, expected_version=None):
         """
         Save machine utilization data for a specific timestamp.
         
+        Writes are atomic and serialized per timestamp across processes. Pass
+        the version returned by load_data(..., with_version=True) to make the
+        save fail instead of overwriting a record someone else saved meanwhile.
+        
         Args:
             timestamp (str): Timestamp identifier (format: "YYYY-MM-DD_HH")
             data (dict): Data to save
+            expected_version (str): Version the data was based on, or None to
+                overwrite unconditionally
             
         Returns:
             bool: True if successful, False otherwise
+            
+        Raises:
+            ConflictError: If the stored record no longer has expected_version
         """
         try:
-            # Create filename from timestamp
-            filename = os.path.join(self.data_dir, f"{timestamp}.json")
-            
-            with open(filename, 'w') as f:
-                json.dump(data, f, indent=2)
-            
-            return True
+            with self.storage.lock(self.storage.lock_key(timestamp)):
+                if expected_version is not None:
+                    current_version = record_version(self.storage.read(timestamp))
+                    if current_version != expected_version:
+                        raise ConflictError(
+                            f"{timestamp} was changed by someone else "
+                            f"(expected version {expected_version}, found {current_version})"
+                        )
+                
+                self.storage.write(timestamp, data)
+        except ConflictError:
+            raise
         except Exception as e:
             print(f"Error saving data: {e}")
             return False
+        
+        # The record is saved; a rollup failure is reported but can be
+        # repaired later with rebuild_rollups
+        try:
+            date_str, _ = parse_timestamp(timestamp)
+            self.refresh_rollups([date_str])
+        except Exception as e:
+            print(f"Error updating rollups: {e}")
+        
+        return True
     
-    def load_data(self, timestamp):
+    @timed("data_handler.save_many")
+    def save_many(self, records, merge=False):
+        """
+        Save a batch of hourly records, e.g. from a bulk import.
+        
+        Records are written through the backend's batch write while holding
+        the same locks as save_data, then the rollups of every affected day
+        are refreshed once.
+        
+        Args:
+            records (list): Hourly records, each keyed by its 'timestamp'
+            merge (bool): Keep the machines of an already stored hour that a
+                record leaves out, instead of replacing the whole hour
+            
+        Returns:
+            int: Number of records written
+        """
+        by_lock = {}
+        for data in records:
+            by_lock.setdefault(self.storage.lock_key(data['timestamp']), []).append(data)
+        
+        # Lock a bounded number of names at a time (one open file each)
+        names = sorted(by_lock)
+        written = 0
+        for start in range(0, len(names), SAVE_LOCK_BATCH):
+            with ExitStack() as stack:
+                batch = []
+                for name in names[start:start + SAVE_LOCK_BATCH]:
+                    stack.enter_context(self.storage.lock(name))
+                    batch.extend(by_lock[name])
+                
+                if merge:
+                    stored_timestamps = set(self.storage.list_timestamps())
+                    for i, data in enumerate(batch):
+                        if data['timestamp'] in stored_timestamps:
+                            existing = self.storage.read(data['timestamp'])
+                            batch[i] = dict(data, machines={**existing['machines'], **data['machines']})
+                
+                self.storage.write_many(batch)
+                written += len(batch)
+        
+        # The records are saved; a rollup failure can be repaired with rebuild_rollups
+        try:
+            self.refresh_rollups(data['date'] for data in records)
+        except Exception as e:
+            print(f"Error updating rollups: {e}")
+        
+        return written
+    
+    @timed("data_handler.load_data")
+    def load_data(self, timestamp, with_version=False):
         """
         Load machine utilization data for a specific timestamp.
         
         Args:
             timestamp (str): Timestamp identifier (format: "YYYY-MM-DD_HH")
+            with_version (bool): Also return the record's version for use as
+                save_data's expected_version
             
         Returns:
-            dict: The loaded data or None if not found
+            dict: The loaded data or None if not found; with_version returns a
+                  (data, version) tuple instead
         """
         try:
-            filename = os.path.join(self.data_dir, f"{timestamp}.json")
-            
-            if not os.path.exists(filename):
-                return None
-            
-            with open(filename, 'r') as f:
-                data = json.load(f)
-            
-            return data
+            data = self.storage.read(timestamp)
         except Exception as e:
             print(f"Error loading data: {e}")
-            return None
+            data = None
+        
+        if with_version:
+            return data, record_version(data)
+        return data
     
+    @timed("data_handler.load_daily_data")
     def load_daily_data(self, date_str):
         """
         Load all machine utilization data for a specific date.
@@ -79,21 +177,12 @@ class DataHandler:
             list: List of data entries for the day
         """
         try:
-            daily_data = []
-            
-            # Check all possible hours (0-23)
-            for hour in range(24):
-                timestamp = f"{date_str}_{hour}"
-                data = self.load_data(timestamp)
-                
-                if data:
-                    daily_data.append(data)
-            
-            return daily_data
+            return self.storage.read_range(date_str, date_str)
         except Exception as e:
             print(f"Error loading daily data: {e}")
             return []
     
+    @timed("data_handler.load_date_range_data")
     def load_date_range_data(self, start_date_str, end_date_str):
         """
         Load all machine utilization data for a range of dates.
@@ -106,27 +195,88 @@ class DataHandler:
             list: List of data entries for the date range
         """
         try:
-            # Convert date strings to datetime objects
+            # Validate the date strings before touching storage
             start_date = datetime.datetime.strptime(start_date_str, "%Y-%m-%d").date()
             end_date = datetime.datetime.strptime(end_date_str, "%Y-%m-%d").date()
             
-            # Initialize result list
-            range_data = []
+            if start_date > end_date:
+                return []
             
-            # Iterate through dates
-            current_date = start_date
-            while current_date <= end_date:
-                daily_data = self.load_daily_data(str(current_date))
-                range_data.extend(daily_data)
-                
-                # Move to next day
-                current_date += datetime.timedelta(days=1)
-            
-            return range_data
+            # The backend reads the range in as few file opens as it can
+            return self.storage.read_range(start_date_str, end_date_str)
         except Exception as e:
             print(f"Error loading date range data: {e}")
             return []
     
+    def iter_range(self, start_date_str, end_date_str, machines=None, fields=None, by_day=False):
+        """
+        Stream the machine utilization data for a range of dates.
+        
+        Records are read lazily, so long ranges can be aggregated in bounded
+        memory and the first days are available before the rest is read.
+        Storage errors while streaming are raised to the caller, so that a
+        stream cut short is never taken for the whole range.
+        
+        Args:
+            start_date_str (str): Start date string (format: "YYYY-MM-DD")
+            end_date_str (str): End date string (format: "YYYY-MM-DD")
+            machines (iterable): Machine numbers to keep, or None for all
+            fields (list): Per-machine fields to keep, e.g. ['utilization',
+                'inventory'], or None for all
+            by_day (bool): Yield one (date_str, records) chunk per day instead
+                of single records
+            
+        Returns:
+            iterator: Hourly records in date and hour order, or (date_str, list)
+                      tuples when by_day is set
+            
+        Raises:
+            ValueError: If a date string is malformed, when called rather than
+                on the first record
+        """
+        # Validate the date strings before touching storage
+        start_date = datetime.datetime.strptime(start_date_str, "%Y-%m-%d").date()
+        end_date = datetime.datetime.strptime(end_date_str, "%Y-%m-%d").date()
+        
+        if start_date > end_date:
+            return iter(())
+        return self._iter_range(start_date_str, end_date_str, machines, fields, by_day)
+    
+    def _iter_range(self, start_date_str, end_date_str, machines, fields, by_day):
+        records = self.storage.iter_range(start_date_str, end_date_str)
+        if machines is not None or fields is not None:
+            records = (project_record(data, machines, fields) for data in records)
+        
+        if by_day:
+            for date_str, day_records in itertools.groupby(records, key=lambda data: data['date']):
+                yield date_str, list(day_records)
+        else:
+            yield from records
+    
+    @timed("data_handler.load_frame")
+    def load_frame(self, start_date_str, end_date_str):
+        """
+        Load the data for a range of dates as a long-format DataFrame.
+        
+        Backends that store rows in columns (the history file) build the
+        frame without creating a record per hour first.
+        
+        Args:
+            start_date_str (str): Start date string (format: "YYYY-MM-DD")
+            end_date_str (str): End date string (format: "YYYY-MM-DD")
+            
+        Returns:
+            pandas.DataFrame: One row per machine-hour, empty if nothing was found
+        """
+        try:
+            return self.storage.read_frame(start_date_str, end_date_str)
+        except Exception as e:
+            from NaranjaMachineTracker import analytics
+            
+            print(f"Error loading data frame: {e}")
+            return analytics.records_to_frame([])
+    
+    @timed("data_handler.list_available_dates")
     def list_available_dates(self):
         """
         List all dates for which data is available.
@@ -135,17 +285,249 @@ class DataHandler:
             list: List of dates with available data
         """
         try:
-            # Get all data files
-            files = [f for f in os.listdir(self.data_dir) if f.endswith('.json')]
-            
-            # Extract dates
-            dates = set()
-            for file in files:
-                # Remove extension and extract date part
-                date_str = file.replace('.json', '').split('_')[0]
-                dates.add(date_str)
-            
-            return sorted(list(dates))
+            return self.storage.list_dates()
         except Exception as e:
             print(f"Error listing available dates: {e}")
             return []
+    
+    @timed("data_handler.rebuild_rollups")
+    def rebuild_rollups(self):
+        """
+        Recompute the rollup tables from the stored records, e.g. after
+        data files were edited or copied in by hand.
+        
+        Returns:
+            int: Number of days rolled up
+        """
+        days = self.rollups.rebuild(self)
+        self._rollups_checked = True
+        return days
+    
+    def refresh_rollups(self, date_strs):
+        """
+        Recompute the rollups of days whose records changed.
+        
+        Args:
+            date_strs (iterable): Date strings (format: "YYYY-MM-DD")
+        """
+        self._ensure_rollups()
+        self.rollups.update_days(sorted(set(date_strs)), lambda date_str: self.storage.read_range(date_str, date_str))
+    
+    def _ensure_rollups(self):
+        # Build the rollups once from every stored record, so that data
+        # recorded before they existed is not left out by incremental updates
+        if not self._rollups_checked:
+            if not self.rollups.is_built():
+                self.rebuild_rollups()
+            self._rollups_checked = True
+    
+    @timed("data_handler.utilization_trend")
+    def utilization_trend(self, start_date_str, end_date_str, period="daily", dimension="all"):
+        """
+        Average utilization per period bucket, read from the rollup tables.
+        
+        Args:
+            start_date_str (str): Start date string (format: "YYYY-MM-DD")
+            end_date_str (str): End date string (format: "YYYY-MM-DD")
+            period (str): "daily", "weekly" or "monthly"
+            dimension (str): "all", "machine", "machine_type", "carton_type" or "inventory"
+            
+        Returns:
+            dict: Bucket start date -> {group value -> average utilization}, in date order
+        """
+        try:
+            self._ensure_rollups()
+            return self.rollups.mean_utilization(period, dimension, start_date_str, end_date_str)
+        except Exception as e:
+            print(f"Error loading utilization trend: {e}")
+            return {}
+    
+    @timed("data_handler.hourly_utilization_trend")
+    def hourly_utilization_trend(self, start_date_str, end_date_str, dimension="all"):
+        """
+        Average utilization for every recorded hour in a range.
+        
+        Computed from the hourly records rather than the rollups, so long
+        ranges return many points; see downsample.py for charting them.
+        
+        Args:
+            start_date_str (str): Start date string (format: "YYYY-MM-DD")
+            end_date_str (str): End date string (format: "YYYY-MM-DD")
+            dimension (str): "all", "machine", "carton_type" or "inventory"
+            
+        Returns:
+            pandas.DataFrame: Indexed by hour start with one column per group value,
+                              empty if nothing was found
+        """
+        import pandas as pd
+        from NaranjaMachineTracker import analytics
+        
+        df = self.load_frame(start_date_str, end_date_str)
+        if df.empty:
+            return pd.DataFrame()
+        
+        try:
+            return analytics.hourly_utilization(df, dimension)
+        except Exception as e:
+            print(f"Error calculating hourly utilization: {e}")
+            return pd.DataFrame()
+    
+    @timed("data_handler.machine_averages")
+    def machine_averages(self, date_str):
+        """
+        Calculate per-machine averages for a specific date.
+        
+        Args:
+            date_str (str): Date string (format: "YYYY-MM-DD")
+            
+        Returns:
+            dict: Machine name -> {'type', 'avg_utilization',
+                  'avg_cartons_per_packer', 'total_cartons'}, ordered by machine number
+        """
+        from NaranjaMachineTracker import analytics
+        
+        df = self.load_frame(date_str, date_str)
+        if df.empty:
+            return {}
+        
+        averages = analytics.machine_averages(df)
+        return {
+            f"Machine {machine_number}": row
+            for machine_number, row in averages.to_dict(orient='index').items()
+        }
+    
+    @timed("data_handler.daily_average_utilization")
+    def daily_average_utilization(self, start_date_str, end_date_str):
+        """
+        Calculate the average utilization across all machines for each day in a range.
+        Read from the daily rollups.
+        
+        Args:
+            start_date_str (str): Start date string (format: "YYYY-MM-DD")
+            end_date_str (str): End date string (format: "YYYY-MM-DD")
+            
+        Returns:
+            dict: Date string -> average utilization, for days with data, in date order
+        """
+        trend = self.utilization_trend(start_date_str, end_date_str, "daily", "all")
+        return {date_str: averages['all'] for date_str, averages in trend.items()}
+    
+    @timed("data_handler.daily_inventory_utilization")
+    def daily_inventory_utilization(self, start_date_str, end_date_str):
+        """
+        Calculate the average utilization per inventory status for each day in a range.
+        Read from the daily rollups.
+        
+        Args:
+            start_date_str (str): Start date string (format: "YYYY-MM-DD")
+            end_date_str (str): End date string (format: "YYYY-MM-DD")
+            
+        Returns:
+            dict: Date string -> {inventory status -> average utilization}, for days
+                  with data, in date order
+        """
+        return self.utilization_trend(start_date_str, end_date_str, "daily", "inventory")
+
+
+class SqliteDataHandler(DataHandler):
+    """
+    DataHandler backed by a SQLite database (see storage.SqliteStorage).
+    Report aggregates are computed in SQL instead of in Python.
+    """
+    
+    def __init__(self, data_dir="data", db_filename="utilization.db"):
+        """
+        Initialize the SQLite data handler.
+        
+        Args:
+            data_dir (str): Directory to store the database file in
+            db_filename (str): Name of the database file
+        """
+        super().__init__(data_dir, storage=SqliteStorage(os.path.join(data_dir, db_filename)))
+    
+    def _query(self, sql, params):
+        return self.storage.connection().execute(sql, params).fetchall()
+    
+    @timed("data_handler.machine_averages")
+    def machine_averages(self, date_str):
+        try:
+            rows = self._query(
+                """
+                SELECT machine,
+                       AVG(utilization) AS avg_utilization,
+                       SUM(CASE WHEN packers > 0 THEN cartons_per_packer ELSE 0 END) * 1.0 / COUNT(*) AS avg_cartons_per_packer,
+                       SUM(cartons_packed) AS total_cartons
+                FROM machine_readings
+                WHERE date = ?
+                GROUP BY machine
+                ORDER BY machine
+                """,
+                (date_str,)
+            )
+            return {
+                f"Machine {row['machine']}": {
+                    'type': get_machine_type(row['machine']),
+                    'avg_utilization': row['avg_utilization'],
+                    'avg_cartons_per_packer': row['avg_cartons_per_packer'],
+                    'total_cartons': row['total_cartons']
+                }
+                for row in rows
+            }
+        except Exception as e:
+            print(f"Error calculating machine averages: {e}")
+            return {}
+    
+    @timed("data_handler.daily_average_utilization")
+    def daily_average_utilization(self, start_date_str, end_date_str):
+        try:
+            rows = self._query(
+                """
+                SELECT date, AVG(utilization) AS avg_utilization
+                FROM machine_readings
+                WHERE date BETWEEN ? AND ?
+                GROUP BY date
+                ORDER BY date
+                """,
+                (start_date_str, end_date_str)
+            )
+            return {row['date']: row['avg_utilization'] for row in rows}
+        except Exception as e:
+            print(f"Error calculating daily utilization: {e}")
+            return {}
+    
+    @timed("data_handler.daily_inventory_utilization")
+    def daily_inventory_utilization(self, start_date_str, end_date_str):
+        try:
+            rows = self._query(
+                """
+                SELECT date, inventory, AVG(utilization) AS avg_utilization
+                FROM machine_readings
+                WHERE date BETWEEN ? AND ?
+                GROUP BY date, inventory
+                ORDER BY date
+                """,
+                (start_date_str, end_date_str)
+            )
+            result = {}
+            for row in rows:
+                result.setdefault(row['date'], {})[row['inventory']] = row['avg_utilization']
+            return result
+        except Exception as e:
+            print(f"Error calculating inventory utilization: {e}")
+            return {}
+
+
+def create_data_handler(backend="json", data_dir="data"):
+    """
+    Create the data handler for a storage backend.
+    
+    Args:
+        backend (str): "json", "binary", "parquet", "history" or "sqlite"
+        data_dir (str): Directory to store data files
+        
+    Returns:
+        DataHandler: The data handler
+    """
+    if backend == "sqlite":
+        return SqliteDataHandler(data_dir)
+    return DataHandler(data_dir, backend=backend)
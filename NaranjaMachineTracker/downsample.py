@@ -0,0 +1,159 @@
+"""
+Downsampling of line chart series to a fixed point budget.
+
+A browser can only show about one value per pixel column, so sending more
+points than the chart is wide only makes the payload and the render slower.
+Two reducers are provided:
+
+    lttb     Largest-Triangle-Three-Buckets: keeps the points that preserve
+             the visual shape of the line best
+    minmax   keeps the lowest and highest point of every bucket, so spikes
+             and dips are never lost
+
+Both keep the first and last point and return indices into the input, in
+order, so several columns sampled at the same x can share the selection.
+"""
+import numpy as np
+
+# Points per pixel column of the chart that still render distinguishably
+POINTS_PER_PIXEL = 2
+
+DOWNSAMPLE_METHODS = ('lttb', 'minmax')
+
+
+def point_budget(width_px, points_per_pixel=POINTS_PER_PIXEL, minimum=100):
+    """
+    Number of points worth sending for a chart of a given width.
+
+    Args:
+        width_px (int): Chart width in pixels
+        points_per_pixel (float): Points per pixel column
+        minimum (int): Lower bound, for very narrow charts
+
+    Returns:
+        int: Point budget per series
+    """
+    return max(int(width_px * points_per_pixel), minimum)
+
+
+def _as_float(x):
+    # Datetimes are sampled on their nanosecond values
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        return x.astype('datetime64[ns]').astype(np.int64).astype(float)
+    return x.astype(float)
+
+
+def _bucket_edges(n, buckets):
+    # Edges over the interior points; the first and last point are kept apart
+    return np.linspace(1, n - 1, buckets + 1).astype(np.int64)
+
+
+def lttb_indices(x, y, max_points):
+    """
+    Select up to max_points points with Largest-Triangle-Three-Buckets.
+
+    Args:
+        x (array-like): Ascending x values (numbers or datetimes)
+        y (array-like): Values, without NaN
+        max_points (int): Point budget, at least 3
+
+    Returns:
+        numpy.ndarray: Ascending indices of the selected points
+    """
+    n = len(y)
+    if n <= max_points or max_points < 3:
+        return np.arange(n)
+
+    x = _as_float(x)
+    y = np.asarray(y, dtype=float)
+    buckets = max_points - 2
+    edges = _bucket_edges(n, buckets)
+
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    previous = 0
+    for bucket in range(buckets):
+        start, end = edges[bucket], edges[bucket + 1]
+
+        # The average of the next bucket stands in for the next point; after
+        # the last bucket that is the last point
+        if bucket + 1 < buckets:
+            next_start, next_end = edges[bucket + 1], edges[bucket + 2]
+        else:
+            next_start, next_end = n - 1, n
+        next_x = x[next_start:next_end].mean()
+        next_y = y[next_start:next_end].mean()
+
+        # Twice the area of the triangle (previous, candidate, next)
+        area = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+        previous = start + int(np.argmax(area))
+        selected[bucket + 1] = previous
+
+    return selected
+
+
+def minmax_indices(x, y, max_points):
+    """
+    Select the lowest and highest point of each bucket.
+
+    Args:
+        x (array-like): Ascending x values (unused beyond their count; buckets
+            are equal in point count)
+        y (array-like): Values, without NaN
+        max_points (int): Point budget, at least 4
+
+    Returns:
+        numpy.ndarray: Ascending indices of the selected points
+    """
+    n = len(y)
+    if n <= max_points or max_points < 4:
+        return np.arange(n)
+
+    y = np.asarray(y, dtype=float)
+    buckets = (max_points - 2) // 2
+    edges = _bucket_edges(n, buckets)
+
+    # Sort by (bucket, value): each bucket's first entry is its minimum and
+    # its last entry its maximum
+    interior = np.arange(1, n - 1)
+    bucket_ids = np.searchsorted(edges, interior, side='right') - 1
+    order = interior[np.lexsort((y[interior], bucket_ids))]
+    counts = np.bincount(bucket_ids, minlength=buckets)
+    ends = np.cumsum(counts)
+    filled = counts > 0
+
+    lows = order[(ends - counts)[filled]]
+    highs = order[(ends - 1)[filled]]
+    return np.unique(np.concatenate(([0, n - 1], lows, highs)))
+
+
+def downsample(x, y, max_points, method='lttb'):
+    """
+    Reduce a series to at most max_points points.
+
+    Args:
+        x (array-like): Ascending x values (numbers or datetimes)
+        y (array-like): Values; NaN (missing hours) are dropped first
+        max_points (int): Point budget
+        method (str): "lttb" or "minmax"
+
+    Returns:
+        tuple: (x, y) numpy arrays of the kept points
+    """
+    if method not in DOWNSAMPLE_METHODS:
+        raise ValueError(f"Unknown downsampling method: {method}")
+
+    x = np.asarray(x)
+    y = np.asarray(y, dtype=float)
+    valid = ~np.isnan(y)
+    x, y = x[valid], y[valid]
+
+    select = lttb_indices if method == 'lttb' else minmax_indices
+    indices = select(x, y, max_points)
+    return x[indices], y[indices]
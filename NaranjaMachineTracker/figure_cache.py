@@ -0,0 +1,222 @@
+"""
+Cache of built Plotly figures for the Daily Report.
+
+Figures are keyed by (figure kind, date, content hash of the day's records).
+A past day's records do not change, so its figures are built once and then
+served from the cache. The current day's records change with every save,
+which changes the key, so only the current day is rebuilt.
+
+Figures are kept in memory and, when a cache directory is given, on disk as
+figure JSON, so that they survive server restarts. Both tiers are bounded
+by size, and the least recently used entries are evicted first.
+"""
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+from NaranjaMachineTracker.storage import record_version
+
+
+def _remove(path):
+    # Another process may have evicted the file already
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def content_hash(records):
+    """
+    Hash the content of a set of hourly records.
+
+    Args:
+        records (list): Hourly records, in any order
+
+    Returns:
+        str: Hex digest that changes whenever any record changes
+    """
+    digest = hashlib.sha1()
+    for data in sorted(records, key=lambda data: data['timestamp']):
+        digest.update(record_version(data).encode('ascii'))
+    return digest.hexdigest()[:16]
+
+
+class FigureCache:
+    """
+    Two-tier (memory and disk) cache of Plotly figures.
+
+    Cached figures are shared between sessions and must be treated as
+    read-only.
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=16 * 1024 * 1024, max_disk_bytes=64 * 1024 * 1024):
+        """
+        Initialize the figure cache.
+
+        Args:
+            cache_dir (str): Directory for the figure JSON files, or None to
+                cache in memory only
+            max_bytes (int): Memory budget, measured as figure JSON size
+            max_disk_bytes (int): Disk budget for cache_dir
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_disk_bytes = max_disk_bytes
+
+        # key -> (figure, size)
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if cache_dir and not os.path.exists(cache_dir):
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, kind, date_str, digest):
+        return os.path.join(self.cache_dir, f"{kind}_{date_str}_{digest}.json")
+
+    def _remember(self, key, figure, size):
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (figure, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+
+    def _load_from_disk(self, path):
+        import plotly.graph_objects as go
+
+        try:
+            with open(path, 'r') as f:
+                payload = f.read()
+        except FileNotFoundError:
+            return None, 0
+
+        # Mark as recently used for disk eviction
+        os.utime(path)
+
+        # The figure was validated when it was built; validating it again
+        # would cost as much as building it
+        return go.Figure(json.loads(payload), _validate=False), len(payload)
+
+    def _save_to_disk(self, kind, date_str, digest, payload):
+        path = self._path(kind, date_str, digest)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+
+        # Figures for an older version of the same day will not be asked for again
+        prefix = f"{kind}_{date_str}_"
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if not entry.name.endswith('.json'):
+                continue
+            if entry.name.startswith(prefix) and entry.path != path:
+                _remove(entry.path)
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+
+        # Evict least recently used files until back under budget
+        total = sum(size for _, size, _ in entries)
+        for _, size, evicted_path in sorted(entries):
+            if total <= self.max_disk_bytes:
+                break
+            if evicted_path != path:
+                _remove(evicted_path)
+                total -= size
+
+    def get(self, kind, date_str, records, build):
+        """
+        Return the figure for a day's records, building it only if needed.
+
+        Args:
+            kind (str): Figure name, e.g. "daily_utilization"
+            date_str (str): Date string (format: "YYYY-MM-DD")
+            records (list): The day's hourly records
+            build (callable): Builds the figure from a list of records
+
+        Returns:
+            plotly.graph_objects.Figure: The figure
+        """
+        digest = content_hash(records)
+        key = (kind, date_str, digest)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+        if self.cache_dir:
+            figure, size = self._load_from_disk(self._path(kind, date_str, digest))
+            if figure is not None:
+                self.disk_hits += 1
+                self._remember(key, figure, size)
+                return figure
+
+        self.misses += 1
+        figure = build(list(records))
+        payload = figure.to_json()
+        self._remember(key, figure, len(payload))
+
+        if self.cache_dir:
+            try:
+                self._save_to_disk(kind, date_str, digest, payload)
+            except OSError as e:
+                print(f"Error saving cached figure: {e}")
+
+        return figure
+
+    def prewarm(self, data_handler, days, figures):
+        """
+        Build the figures for the most recent days with data.
+
+        Args:
+            data_handler (DataHandler): Source of the daily records
+            days (int): Number of most recent dates to prepare
+            figures (dict): Figure kind -> build function
+
+        Returns:
+            int: Number of dates prepared
+        """
+        dates = data_handler.list_available_dates()[-days:] if days > 0 else []
+        try:
+            for date_str in dates:
+                records = data_handler.load_daily_data(date_str)
+                if records:
+                    for kind, build in figures.items():
+                        self.get(kind, date_str, records, build)
+        except Exception as e:
+            print(f"Error prewarming figures: {e}")
+        return len(dates)
+
+    def stats(self):
+        """
+        Return cache counters.
+
+        Returns:
+            dict: hits, disk_hits, misses, entries and bytes
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'entries': len(self._entries),
+                'bytes': self._bytes
+            }
@@ -0,0 +1,290 @@
+"""
+Lightweight timing of the app's hot paths.
+
+Stages are timed with the timed decorator or the timer context manager and
+recorded into an in-memory histogram per stage: cumulative bucket counts for
+Prometheus, plus the most recent WINDOW_SIZE durations for percentiles.
+The stages recorded by one Streamlit rerun are also collected, so a rerun
+can show where its own time went.
+
+Timing is off unless NARANJA_TIMINGS=1 or set_enabled(True) is called; while
+off, a timed function costs one extra call and a flag check.
+
+Usage:
+    @timed("data_handler.load_daily_data")
+    def load_daily_data(...): ...
+
+    with timer("app.trend.aggregate"):
+        ...
+"""
+import os
+import json
+import math
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+
+# Recent durations kept per stage for percentiles
+WINDOW_SIZE = 500
+
+# Upper bounds of the Prometheus histogram buckets, in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Seconds between dumps written by maybe_dump
+DUMP_INTERVAL = 30
+
+_enabled = os.environ.get("NARANJA_TIMINGS", "0") == "1"
+
+_stages = {}
+_lock = threading.Lock()
+_local = threading.local()
+_last_dump = 0.0
+
+
+class StageHistogram:
+    """
+    Durations recorded for one stage.
+    """
+
+    def __init__(self):
+        self.recent = deque(maxlen=WINDOW_SIZE)
+        self.bucket_counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, seconds):
+        self.recent.append(seconds)
+        self.count += 1
+        self.total += seconds
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.bucket_counts[i] += 1
+                break
+
+
+def enabled():
+    """
+    Whether timings are being recorded.
+
+    Returns:
+        bool: True if enabled
+    """
+    return _enabled
+
+
+def set_enabled(value):
+    """
+    Turn timing on or off for the whole process.
+
+    Args:
+        value (bool): True to record timings
+    """
+    global _enabled
+    _enabled = bool(value)
+
+
+def record(stage, seconds):
+    """
+    Record one duration of a stage.
+
+    Args:
+        stage (str): Stage name, e.g. "visualization.plot_daily_utilization"
+        seconds (float): Duration
+    """
+    with _lock:
+        histogram = _stages.get(stage)
+        if histogram is None:
+            histogram = _stages[stage] = StageHistogram()
+        histogram.add(seconds)
+
+    trace = getattr(_local, 'trace', None)
+    if trace is not None:
+        trace.append((stage, seconds))
+
+
+@contextmanager
+def timer(stage):
+    """
+    Time the enclosed block as a stage.
+
+    Args:
+        stage (str): Stage name
+    """
+    if not _enabled:
+        yield
+        return
+
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - started)
+
+
+def timed(stage):
+    """
+    Decorator timing every call of a function as a stage.
+
+    Args:
+        stage (str): Stage name
+
+    Returns:
+        callable: Decorator
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(stage, time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+
+def begin_rerun():
+    """
+    Start collecting the stages recorded by this thread, i.e. by the
+    current Streamlit rerun.
+    """
+    _local.trace = [] if _enabled else None
+
+
+def rerun_stages():
+    """
+    Stages recorded by this thread since begin_rerun.
+
+    Returns:
+        list: (stage, seconds) in the order they finished
+    """
+    return list(getattr(_local, 'trace', None) or [])
+
+
+def _percentile(ordered, fraction):
+    # Nearest-rank percentile of a sorted list
+    return ordered[max(math.ceil(fraction * len(ordered)) - 1, 0)]
+
+
+def snapshot():
+    """
+    Summary of every stage over its recent window.
+
+    Returns:
+        dict: Stage name -> {'count', 'p50_ms', 'p95_ms', 'max_ms', 'total_s'},
+              sorted by stage name; count and total_s cover the whole process life
+    """
+    with _lock:
+        stages = {stage: (sorted(h.recent), h.count, h.total) for stage, h in _stages.items()}
+
+    summary = {}
+    for stage in sorted(stages):
+        recent, count, total = stages[stage]
+        summary[stage] = {
+            'count': count,
+            'p50_ms': _percentile(recent, 0.5) * 1000,
+            'p95_ms': _percentile(recent, 0.95) * 1000,
+            'max_ms': recent[-1] * 1000,
+            'total_s': total
+        }
+    return summary
+
+
+def reset():
+    """
+    Forget every recorded duration.
+    """
+    with _lock:
+        _stages.clear()
+
+
+def prometheus_text():
+    """
+    Render the histograms in the Prometheus text exposition format.
+
+    Returns:
+        str: naranja_stage_seconds histogram and naranja_stage_recent_seconds
+             p50/p95 summary, one series per stage
+    """
+    with _lock:
+        stages = {
+            stage: (list(h.bucket_counts), h.count, h.total, sorted(h.recent))
+            for stage, h in sorted(_stages.items())
+        }
+
+    lines = [
+        "# HELP naranja_stage_seconds Duration of timed stages.",
+        "# TYPE naranja_stage_seconds histogram"
+    ]
+    for stage, (bucket_counts, count, total, _) in stages.items():
+        cumulative = 0
+        for bound, bucket_count in zip(BUCKETS, bucket_counts):
+            cumulative += bucket_count
+            lines.append(f'naranja_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+        lines.append(f'naranja_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {count}')
+        lines.append(f'naranja_stage_seconds_sum{{stage="{stage}"}} {total}')
+        lines.append(f'naranja_stage_seconds_count{{stage="{stage}"}} {count}')
+
+    lines += [
+        f"# HELP naranja_stage_recent_seconds Percentiles of the last {WINDOW_SIZE} durations per stage.",
+        "# TYPE naranja_stage_recent_seconds summary"
+    ]
+    for stage, (_, _, _, recent) in stages.items():
+        for quantile in (0.5, 0.95):
+            lines.append(f'naranja_stage_recent_seconds{{stage="{stage}",quantile="{quantile}"}} '
+                         f'{_percentile(recent, quantile)}')
+
+    return "\n".join(lines) + "\n"
+
+
+def dump(path):
+    """
+    Write the timings to a file, replacing it atomically.
+
+    Args:
+        path (str): Output file; ".json" writes the snapshot as JSON, anything
+            else the Prometheus text format (e.g. for a node exporter's
+            textfile collector)
+    """
+    if path.endswith('.json'):
+        payload = json.dumps({'generated': time.time(), 'stages': snapshot()}, indent=2)
+    else:
+        payload = prometheus_text()
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(payload)
+    os.replace(tmp_path, path)
+
+
+def maybe_dump(path, interval=DUMP_INTERVAL):
+    """
+    Dump the timings if enabled and the last dump is older than interval.
+
+    Args:
+        path (str): Output file (see dump)
+        interval (float): Minimum seconds between dumps
+
+    Returns:
+        bool: True if a dump was written
+    """
+    global _last_dump
+    now = time.monotonic()
+    with _lock:
+        if not _enabled or now - _last_dump < interval:
+            return False
+        _last_dump = now
+
+    try:
+        dump(path)
+    except OSError as e:
+        print(f"Error writing timings: {e}")
+        return False
+    return True
@@ -0,0 +1,65 @@
+"""
+Migrate hourly JSON records into the monthly Parquet store or the history file.
+
+Usage:
+    python -m NaranjaMachineTracker.migrate_storage SOURCE_DIR [--dest DEST_DIR]
+        [--backend parquet|history]
+"""
+import argparse
+import os
+
+from NaranjaMachineTracker.storage import JsonStorage, create_storage
+
+
+def migrate_json_to_parquet(source_dir, dest_dir=None, backend="parquet"):
+    """
+    Copy every JSON record in a directory into monthly Parquet partitions,
+    or into another storage backend.
+
+    The JSON files are left in place so the migration can be verified (or
+    re-run) before switching the application over to the new backend.
+
+    Args:
+        source_dir (str): Directory containing the YYYY-MM-DD_H.json files
+        dest_dir (str): Directory for the new files (defaults to source_dir)
+        backend (str): Destination backend name, "parquet" or "history"
+
+    Returns:
+        int: Number of hourly records migrated
+    """
+    dest_dir = dest_dir or source_dir
+    if not os.path.exists(dest_dir):
+        os.makedirs(dest_dir)
+
+    source = JsonStorage(source_dir)
+    dest = create_storage(backend, dest_dir)
+
+    # Group records by month so every partition is written exactly once
+    records_by_month = {}
+    for timestamp in source.list_timestamps():
+        data = source.read(timestamp)
+        if data:
+            records_by_month.setdefault(data['date'][:7], []).append(data)
+
+    migrated = 0
+    for month in sorted(records_by_month):
+        dest.write_many(records_by_month[month])
+        migrated += len(records_by_month[month])
+        print(f"{month}: {len(records_by_month[month])} records")
+
+    return migrated
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Migrate hourly JSON records to monthly Parquet partitions or the history file.")
+    parser.add_argument("source", help="Directory containing the JSON data files")
+    parser.add_argument("--dest", help="Directory for the new files (defaults to the source directory)")
+    parser.add_argument("--backend", default="parquet", choices=["parquet", "history"], help="Destination backend (default: parquet)")
+    args = parser.parse_args(argv)
+
+    migrated = migrate_json_to_parquet(args.source, args.dest, args.backend)
+    print(f"Migrated {migrated} records")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,420 @@
+"""
+Multi-page PDF reports for a shift, a day or a week.
+
+The report opens with a summary page. Every day then gets a page with its
+utilization and inventory charts, followed by one page per recorded hour in
+the layout of the hourly image export (see report_image.py).
+
+Pages are rendered in a process pool and written one day at a time, each
+day appended to the file as soon as its pages are ready, so only a day of
+page images is held in memory at once.
+
+The charts are the figures from visualization.py, exported with kaleido
+when it is installed. Without kaleido they are drawn directly with PIL.
+
+Usage:
+    python -m NaranjaMachineTracker.pdf_report START_DATE [END_DATE]
+        [--hours 6-17] [--data-dir data] [--backend json|binary|parquet|history|sqlite]
+        [--output report.pdf] [--workers N]
+"""
+import argparse
+import io
+import importlib.util
+import itertools
+import os
+import textwrap
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from NaranjaMachineTracker import analytics
+from NaranjaMachineTracker.data_handler import create_data_handler
+from NaranjaMachineTracker.instrumentation import timed
+from NaranjaMachineTracker.report_image import (
+    IMAGE_SIZE, create_hourly_data_image, default_workers, load_fonts, worker_context,
+)
+from NaranjaMachineTracker.utils import INVENTORY_TYPES, MACHINE_NUMBERS
+
+# Pages share the hourly image size; at 100 dpi that is 8 x 10 inches
+PAGE_SIZE = IMAGE_SIZE
+PAGE_RESOLUTION = 100
+
+# Plotly's default line colors, so the PIL charts match the app
+LINE_COLORS = [
+    "#636efa", "#EF553B", "#00cc96", "#ab63fa", "#FFA15A",
+    "#19d3f3", "#FF6692", "#B6E880", "#FF97FF", "#FECB52"
+]
+
+
+def kaleido_available():
+    """
+    Check whether Plotly figures can be exported as images.
+
+    Returns:
+        bool: True if the kaleido package is installed
+    """
+    return importlib.util.find_spec("kaleido") is not None
+
+
+def _new_page(title, subtitle):
+    font_title, font_subtitle, _, _ = load_fonts()
+    page = Image.new('RGB', PAGE_SIZE, color='white')
+    draw = ImageDraw.Draw(page)
+    draw.text((20, 20), title, fill="black", font=font_title)
+    draw.text((20, 60), subtitle, fill="black", font=font_subtitle)
+    return page, draw
+
+
+def render_summary_page(records, start_date_str, end_date_str, hours_label):
+    """
+    Render the first page of a report: totals, per-machine and per-day averages.
+
+    Args:
+        records (list): Hourly records in the report
+        start_date_str (str): First date of the report
+        end_date_str (str): Last date of the report
+        hours_label (str): Hours included, e.g. "6:00-17:00"
+
+    Returns:
+        PIL.Image: The page
+    """
+    width, height = PAGE_SIZE
+    _, font_subtitle, font_text, font_small = load_fonts()
+    period = start_date_str if start_date_str == end_date_str else f"{start_date_str} to {end_date_str}"
+
+    page, draw = _new_page("Naranja Automation", "Machine Utilization Report")
+    draw.text((20, 100), f"Period: {period} | Hours: {hours_label}", fill="black", font=font_text)
+
+    df = analytics.records_to_frame(records)
+    if df.empty:
+        draw.text((20, 150), "No data recorded for this period.", fill="black", font=font_text)
+        return page
+
+    average = df['utilization'].mean()
+    draw.text((20, 130), f"Hours recorded: {len(records)} | Average utilization: {average:.1f}% | "
+                         f"Cartons packed: {int(df['cartons_packed'].sum()):,}", fill="black", font=font_text)
+    draw.line([(20, 165), (width-20, 165)], fill="black", width=2)
+
+    # Per-machine averages over the whole period
+    draw.text((20, 180), "Machines", fill="black", font=font_subtitle)
+    positions = [20, 170, 320, 470, 640]
+    for position, header in zip(positions, ["Machine", "Type", "Avg Util%", "Cartons/Packer", "Cartons"]):
+        draw.text((position, 220), header, fill="black", font=font_text)
+
+    y_position = 255
+    for machine_number, row in analytics.machine_averages(df).iterrows():
+        text_color = "red" if row['avg_utilization'] < 70 else "black"
+        cells = [
+            f"Machine {machine_number}",
+            row['type'],
+            f"{row['avg_utilization']:.1f}%",
+            f"{row['avg_cartons_per_packer']:.1f}",
+            f"{int(row['total_cartons']):,}"
+        ]
+        for position, text in zip(positions, cells):
+            draw.text((position, y_position), text, fill=text_color, font=font_text)
+        y_position += 28
+
+    # Per-day averages, as many as fit on the page
+    y_position += 15
+    draw.text((20, y_position), "Days", fill="black", font=font_subtitle)
+    y_position += 40
+    daily = analytics.daily_average_utilization(df)
+    hours_per_day = df.groupby('date')['hour'].nunique()
+    rows_left = (height - 60 - y_position) // 26
+    for shown, (date_str, utilization) in enumerate(daily.items()):
+        if shown == rows_left - 1 and len(daily) > rows_left:
+            draw.text((20, y_position), f"... {len(daily) - shown} more days", fill="gray", font=font_text)
+            break
+        text_color = "red" if utilization < 70 else "black"
+        draw.text((20, y_position), date_str, fill=text_color, font=font_text)
+        draw.text((200, y_position), f"{hours_per_day[date_str]} hours", fill=text_color, font=font_text)
+        draw.text((350, y_position), f"{utilization:.1f}%", fill=text_color, font=font_text)
+        y_position += 26
+
+    draw.text((20, height-40), f"Report generated: {time.strftime('%Y-%m-%d %H:%M:%S')}", fill="gray", font=font_small)
+    return page
+
+
+def _figure_image(fig, size):
+    # Plotly figure -> PIL image, through kaleido
+    png = fig.to_image(format="png", width=size[0], height=size[1])
+    return Image.open(io.BytesIO(png)).convert('RGB')
+
+
+def _draw_axes(draw, box, title, y_label_every=20):
+    left, top, right, bottom = box
+    _, _, font_text, font_small = load_fonts()
+    draw.text((left, top - 40), title, fill="black", font=font_text)
+    for value in range(0, 101, y_label_every):
+        y = bottom - (bottom - top) * value / 100
+        draw.line([(left, y), (right, y)], fill="#e5e5e5", width=1)
+        draw.text((left - 35, y - 6), f"{value}%", fill="gray", font=font_small)
+    draw.line([(left, top), (left, bottom), (right, bottom)], fill="black", width=1)
+
+
+def draw_utilization_chart(draw, box, records):
+    """
+    Draw the hourly machine utilization lines (PIL version of
+    visualization.plot_daily_utilization).
+
+    Args:
+        draw (PIL.ImageDraw.ImageDraw): Drawing context of the page
+        box (tuple): (left, top, right, bottom) of the plot area
+        records (list): The day's hourly records
+    """
+    left, top, right, bottom = box
+    _, _, _, font_small = load_fonts()
+    _draw_axes(draw, box, "Hourly Machine Utilization")
+
+    hours = sorted(set(data['hour'] for data in records))
+    if not hours:
+        return
+    span = max(hours[-1] - hours[0], 1)
+
+    def x_of(hour):
+        return left + 10 + (right - left - 20) * (hour - hours[0]) / span
+
+    def y_of(utilization):
+        return bottom - (bottom - top) * min(max(utilization, 0), 100) / 100
+
+    for hour in hours:
+        draw.text((x_of(hour) - 10, bottom + 6), f"{hour}:00", fill="gray", font=font_small)
+
+    # 70% target line, dashed
+    for x in np.arange(left, right, 12):
+        draw.line([(x, y_of(70)), (min(x + 6, right), y_of(70))], fill="red", width=2)
+
+    by_hour = sorted(records, key=lambda data: data['hour'])
+    for index, machine_number in enumerate(MACHINE_NUMBERS):
+        machine_name = f"Machine {machine_number}"
+        points = [
+            (x_of(data['hour']), y_of(data['machines'][machine_name]['utilization']))
+            for data in by_hour if machine_name in data['machines']
+        ]
+        color = LINE_COLORS[index % len(LINE_COLORS)]
+        if len(points) > 1:
+            draw.line(points, fill=color, width=2)
+        for x, y in points:
+            draw.ellipse([x - 3, y - 3, x + 3, y + 3], fill=color)
+
+        # Legend, two rows under the axis labels
+        legend_x = left + (index % 6) * 110
+        legend_y = bottom + 28 + (index // 6) * 18
+        draw.line([(legend_x, legend_y + 6), (legend_x + 16, legend_y + 6)], fill=color, width=3)
+        draw.text((legend_x + 20, legend_y), machine_name, fill="black", font=font_small)
+
+
+def draw_inventory_chart(draw, box, records):
+    """
+    Draw the average utilization per inventory status (PIL version of
+    visualization.plot_inventory_impact).
+
+    Args:
+        draw (PIL.ImageDraw.ImageDraw): Drawing context of the page
+        box (tuple): (left, top, right, bottom) of the plot area
+        records (list): The day's hourly records
+    """
+    left, top, right, bottom = box
+    _, _, font_text, font_small = load_fonts()
+    _draw_axes(draw, box, "Impact of Inventory Status on Machine Utilization")
+
+    values = {inv_type: [] for inv_type in INVENTORY_TYPES}
+    for data in records:
+        for machine_data in data['machines'].values():
+            values.setdefault(machine_data['inventory'], []).append(machine_data['utilization'])
+
+    slot = (right - left) / max(len(values), 1)
+    for index, (inv_type, utilizations) in enumerate(values.items()):
+        center = left + slot * (index + 0.5)
+        label = "\n".join(textwrap.wrap(inv_type, 12))
+        if utilizations:
+            label += f"\nn={len(utilizations)}"
+        draw.multiline_text((center, bottom + 8), label, fill="black", font=font_small, anchor="ma", align="center")
+        if not utilizations:
+            continue
+        mean = float(np.mean(utilizations))
+        y = bottom - (bottom - top) * min(max(mean, 0), 100) / 100
+        draw.rectangle([center - slot * 0.3, y, center + slot * 0.3, bottom], fill=LINE_COLORS[index % len(LINE_COLORS)])
+        draw.text((center, y - 6), f"{mean:.1f}%", fill="black", font=font_text, anchor="md")
+
+
+def render_chart_page(date_str, records):
+    """
+    Render the chart page of one day.
+
+    Args:
+        date_str (str): Date string (format: "YYYY-MM-DD")
+        records (list): The day's hourly records
+
+    Returns:
+        PIL.Image: The page
+    """
+    _, _, font_text, _ = load_fonts()
+    page, draw = _new_page("Daily Machine Utilization", f"Date: {date_str}")
+
+    if kaleido_available():
+        from NaranjaMachineTracker.visualization import plot_daily_utilization, plot_inventory_impact
+        page.paste(_figure_image(plot_daily_utilization(records), (800, 440)), (0, 100))
+        page.paste(_figure_image(plot_inventory_impact(records), (800, 440)), (0, 550))
+    else:
+        draw_utilization_chart(draw, (80, 160, 760, 480), records)
+        draw_inventory_chart(draw, (80, 640, 760, 920), records)
+
+    return page
+
+
+def render_page(page):
+    """
+    Render one report page. Runs in a worker process.
+
+    Args:
+        page (tuple): (kind, *args) where kind is "summary", "charts" or
+            "hour" and args are the arguments of render_summary_page,
+            render_chart_page or, for "hour", the hourly record
+
+    Returns:
+        PIL.Image: The page
+    """
+    kind, *args = page
+    if kind == "summary":
+        return render_summary_page(*args)
+    if kind == "charts":
+        return render_chart_page(*args)
+    data, = args
+    return create_hourly_data_image(data['machines'], data['date'], data['hour'], data['username'])
+
+
+def report_sections(records, start_date_str, end_date_str, hours_label):
+    """
+    Plan the pages of a report.
+
+    Args:
+        records (list): Hourly records in date and hour order
+        start_date_str (str): First date of the report
+        end_date_str (str): Last date of the report
+        hours_label (str): Hours included, e.g. "6:00-17:00"
+
+    Returns:
+        list: Sections, written one at a time; each a list of render_page
+              page tuples
+    """
+    sections = [[("summary", records, start_date_str, end_date_str, hours_label)]]
+    for date_str, day_records in itertools.groupby(records, key=lambda data: data['date']):
+        day_records = list(day_records)
+        sections.append(
+            [("charts", date_str, day_records)] + [("hour", data) for data in day_records]
+        )
+    return sections
+
+
+def write_pdf(records, output, start_date_str, end_date_str, hours_label="all", workers=None):
+    """
+    Write a report PDF.
+
+    Args:
+        records (list): Hourly records in date and hour order
+        output (str or file): Path or writable binary file object
+        start_date_str (str): First date of the report
+        end_date_str (str): Last date of the report
+        hours_label (str): Hours included, e.g. "6:00-17:00"
+        workers (int): Number of worker processes (default: default_workers());
+            1 renders in this process
+
+    Returns:
+        int: Number of pages written
+    """
+    sections = report_sections(records, start_date_str, end_date_str, hours_label)
+    workers = default_workers() if workers is None else max(1, workers)
+    # No more workers than the largest section has pages
+    workers = min(workers, max((len(section) for section in sections), default=1))
+
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=worker_context()) if workers > 1 else None
+    try:
+        pages_written = 0
+        for section in sections:
+            if pool is not None:
+                pages = list(pool.map(render_page, section))
+            else:
+                pages = [render_page(page) for page in section]
+
+            # The first section creates the file; the others are appended to it
+            first, *rest = pages
+            first.save(output, "PDF", resolution=PAGE_RESOLUTION, save_all=True,
+                       append_images=rest, append=pages_written > 0)
+            if not isinstance(output, (str, os.PathLike)):
+                output.seek(0)
+            pages_written += len(pages)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    return pages_written
+
+
+def parse_hours(hours):
+    """
+    Parse an hour range such as "6-17".
+
+    Args:
+        hours (str): "FIRST-LAST" (inclusive), a single hour, or None for all hours
+
+    Returns:
+        tuple: (first hour, last hour)
+    """
+    if not hours:
+        return 0, 23
+    first, _, last = hours.partition("-")
+    return int(first), int(last or first)
+
+
+@timed("pdf_report.generate_report")
+def generate_report(data_handler, start_date_str, end_date_str, output, first_hour=0, last_hour=23, workers=None):
+    """
+    Load a date range and write its report PDF.
+
+    Args:
+        data_handler (DataHandler): Source of the hourly records
+        start_date_str (str): Start date string (format: "YYYY-MM-DD")
+        end_date_str (str): End date string (format: "YYYY-MM-DD")
+        output (str or file): Path or writable binary file object
+        first_hour (int): First hour of the shift
+        last_hour (int): Last hour of the shift
+        workers (int): Number of worker processes (default: default_workers())
+
+    Returns:
+        int: Number of pages written
+    """
+    records = [
+        data for data in data_handler.load_date_range_data(start_date_str, end_date_str)
+        if first_hour <= data['hour'] <= last_hour
+    ]
+    hours_label = "all" if (first_hour, last_hour) == (0, 23) else f"{first_hour}:00-{last_hour}:00"
+    return write_pdf(records, output, start_date_str, end_date_str, hours_label, workers)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a multi-page PDF report for a shift, day or week.")
+    parser.add_argument("start_date", help="First date (YYYY-MM-DD)")
+    parser.add_argument("end_date", nargs="?", help="Last date (defaults to the first date)")
+    parser.add_argument("--hours", help="Hours to include, e.g. 6-17 (default: all)")
+    parser.add_argument("--data-dir", default="data", help="Data directory (default: data)")
+    parser.add_argument("--backend", default="json", help="Storage backend: json, binary, parquet, history or sqlite")
+    parser.add_argument("--output", help="PDF file to write (default: report_START_END.pdf)")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: up to 4)")
+    args = parser.parse_args(argv)
+
+    end_date = args.end_date or args.start_date
+    output = args.output or f"report_{args.start_date}_{end_date}.pdf"
+    first_hour, last_hour = parse_hours(args.hours)
+
+    started = time.perf_counter()
+    pages = generate_report(create_data_handler(args.backend, args.data_dir), args.start_date, end_date,
+                            output, first_hour, last_hour, args.workers)
+    print(f"Wrote {pages} pages to {output} in {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+Opt-in profiling of single Streamlit reruns.
+
+A capture runs two profilers over the same block of code:
+
+    cProfile       exact call counts and times, saved as .pstats
+                   (python -m pstats, snakeviz, ...)
+    stack sampler  the profiled thread's stack every few milliseconds,
+                   saved as collapsed stacks ("a;b;c count" per line), the
+                   input of flamegraph.pl, speedscope and similar tools
+
+Captures are written to a local directory and the oldest are removed beyond
+MAX_CAPTURES, so profiling in production cannot fill the disk.
+"""
+import os
+import re
+import sys
+import time
+import pstats
+import cProfile
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+# Seconds between stack samples
+SAMPLE_INTERVAL = 0.005
+
+# Captures kept in the profile directory (each is a .pstats and a .collapsed file)
+MAX_CAPTURES = 100
+
+
+def _frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """
+    Samples the stack of one thread from a background thread.
+    """
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        """
+        Initialize the sampler.
+
+        Args:
+            thread_id (int): threading.get_ident() of the thread to sample
+            interval (float): Seconds between samples
+        """
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            if labels:
+                self.stacks[";".join(reversed(labels))] += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="StackSampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self):
+        """
+        Return the samples as collapsed stacks.
+
+        Returns:
+            str: One "outermost;...;innermost count" line per distinct stack
+        """
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def _prune(profile_dir, keep):
+    for base in list_captures(profile_dir)[keep:]:
+        for extension in ('.pstats', '.collapsed'):
+            try:
+                os.remove(base + extension)
+            except FileNotFoundError:
+                pass
+
+
+@contextmanager
+def capture(profile_dir, label, interval=SAMPLE_INTERVAL, keep=MAX_CAPTURES):
+    """
+    Profile the enclosed block and save the results.
+
+    Only the calling thread is profiled. If another profiler is already
+    active the block runs unprofiled.
+
+    Args:
+        profile_dir (str): Directory for the capture files
+        label (str): Added to the file names, e.g. the user and the view
+        interval (float): Seconds between stack samples
+        keep (int): Captures kept in profile_dir
+
+    Yields:
+        dict: Filled in when the block ends: 'pstats' and 'collapsed' paths,
+              'seconds' and 'samples'; empty if nothing was captured
+    """
+    result = {}
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError as e:
+        print(f"Error starting profiler: {e}")
+        profiler = None
+
+    if profiler is None:
+        yield result
+        return
+
+    sampler = StackSampler(threading.get_ident(), interval)
+    sampler.start()
+    started = time.perf_counter()
+    try:
+        yield result
+    finally:
+        profiler.disable()
+        sampler.stop()
+        elapsed = time.perf_counter() - started
+
+        try:
+            os.makedirs(profile_dir, exist_ok=True)
+            stamp = time.strftime("%Y%m%d-%H%M%S")
+            label = re.sub(r'[^A-Za-z0-9_.-]', '_', label)
+            base = os.path.join(profile_dir, f"{stamp}-{int(time.time() * 1000) % 1000:03d}_{label}")
+
+            profiler.dump_stats(base + '.pstats')
+            with open(base + '.collapsed', 'w') as f:
+                f.write(sampler.collapsed())
+
+            result.update({
+                'pstats': base + '.pstats',
+                'collapsed': base + '.collapsed',
+                'seconds': elapsed,
+                'samples': sum(sampler.stacks.values())
+            })
+            _prune(profile_dir, keep)
+        except OSError as e:
+            print(f"Error saving profile: {e}")
+
+
+def top_functions(pstats_path, limit=15, sort='cumulative'):
+    """
+    Summarize a saved capture.
+
+    Args:
+        pstats_path (str): Path of a .pstats file
+        limit (int): Number of functions
+        sort (str): "cumulative" or "tottime"
+
+    Returns:
+        list: Dicts with 'function', 'calls', 'tottime' and 'cumtime' (seconds),
+              most expensive first
+    """
+    stats = pstats.Stats(pstats_path)
+    index = 3 if sort == 'cumulative' else 2
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][index], reverse=True)[:limit]
+    return [
+        {
+            'function': f"{name} ({os.path.basename(filename)}:{line})",
+            'calls': calls,
+            'tottime': tottime,
+            'cumtime': cumtime
+        }
+        for (filename, line, name), (_, calls, tottime, cumtime, _) in rows
+    ]
+
+
+def list_captures(profile_dir):
+    """
+    List the saved captures, newest first.
+
+    Args:
+        profile_dir (str): Directory holding the captures
+
+    Returns:
+        list: Base paths (without extension) of the captures
+    """
+    if not os.path.isdir(profile_dir):
+        return []
+    return sorted(
+        (entry.path[:-len('.pstats')] for entry in os.scandir(profile_dir) if entry.name.endswith('.pstats')),
+        reverse=True
+    )
@@ -0,0 +1,329 @@
+"""
+Pre-aggregated daily, ISO-week and monthly rollups of machine utilization.
+
+For every period bucket the rollup tables hold the sum, count, min and max of
+utilization and cartons packed, grouped by machine, machine type, carton type,
+inventory status and across all machines. DataHandler.save_data keeps them up
+to date incrementally, so long-range trends read one row per bucket instead of
+re-aggregating every hourly record.
+
+Usage:
+    python -m NaranjaMachineTracker.rollups rebuild [DATA_DIR] [--backend json|binary|parquet|history|sqlite]
+"""
+import argparse
+import datetime
+import os
+import sqlite3
+import threading
+
+from NaranjaMachineTracker.utils import get_machine_type
+
+PERIODS = ['daily', 'weekly', 'monthly']
+
+# Per-machine fields summarize_day reads
+ROLLUP_FIELDS = ['carton_type', 'inventory', 'cartons_packed', 'utilization']
+
+# Dimension name -> function giving the group value for (machine number, machine data)
+DIMENSIONS = {
+    'all': lambda machine_number, machine_data: 'all',
+    'machine': lambda machine_number, machine_data: f"Machine {machine_number}",
+    'machine_type': lambda machine_number, machine_data: get_machine_type(machine_number),
+    'carton_type': lambda machine_number, machine_data: machine_data['carton_type'],
+    'inventory': lambda machine_number, machine_data: machine_data['inventory']
+}
+
+
+def period_bounds(period, date_str):
+    """
+    Return the bucket a date falls in for a rollup period.
+
+    Args:
+        period (str): "daily", "weekly" (ISO weeks) or "monthly"
+        date_str (str): Date string (format: "YYYY-MM-DD")
+
+    Returns:
+        tuple: (bucket label, first date, last date), dates as "YYYY-MM-DD" strings
+    """
+    date = datetime.date.fromisoformat(date_str)
+
+    if period == 'daily':
+        return date_str, date_str, date_str
+
+    if period == 'weekly':
+        year, week, weekday = date.isocalendar()
+        start = date - datetime.timedelta(days=weekday - 1)
+        return f"{year}-W{week:02d}", str(start), str(start + datetime.timedelta(days=6))
+
+    if period == 'monthly':
+        start = date.replace(day=1)
+        next_month = (start + datetime.timedelta(days=32)).replace(day=1)
+        return date_str[:7], str(start), str(next_month - datetime.timedelta(days=1))
+
+    raise ValueError(f"Unknown rollup period: {period}")
+
+
+def summarize_day(records):
+    """
+    Aggregate one day's hourly records into rollup values per dimension.
+
+    Args:
+        records (list): Hourly records for a single date
+
+    Returns:
+        dict: (dimension, value) -> [util_sum, util_count, util_min, util_max,
+              cartons_sum, cartons_min, cartons_max]
+    """
+    groups = {}
+    for data in records:
+        for machine_name, machine_data in data['machines'].items():
+            machine_number = int(machine_name.split(' ')[-1])
+            utilization = machine_data['utilization']
+            cartons = machine_data['cartons_packed']
+
+            for dimension, get_value in DIMENSIONS.items():
+                key = (dimension, get_value(machine_number, machine_data))
+                group = groups.get(key)
+                if group is None:
+                    groups[key] = [utilization, 1, utilization, utilization, cartons, cartons, cartons]
+                else:
+                    group[0] += utilization
+                    group[1] += 1
+                    group[2] = min(group[2], utilization)
+                    group[3] = max(group[3], utilization)
+                    group[4] += cartons
+                    group[5] = min(group[5], cartons)
+                    group[6] = max(group[6], cartons)
+    return groups
+
+
+class RollupStore:
+    """
+    SQLite-backed rollup tables kept next to the data files.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS rollups (
+            period TEXT NOT NULL,
+            bucket TEXT NOT NULL,
+            bucket_start TEXT NOT NULL,
+            dimension TEXT NOT NULL,
+            value TEXT NOT NULL,
+            util_sum REAL NOT NULL,
+            util_count INTEGER NOT NULL,
+            util_min REAL NOT NULL,
+            util_max REAL NOT NULL,
+            cartons_sum INTEGER NOT NULL,
+            cartons_min INTEGER NOT NULL,
+            cartons_max INTEGER NOT NULL,
+            PRIMARY KEY (period, dimension, bucket_start, value)
+        );
+        -- Days and buckets are replaced by (period, bucket_start), which the
+        -- primary key cannot look up without scanning every dimension
+        CREATE INDEX IF NOT EXISTS rollups_bucket ON rollups (period, bucket_start);
+        -- 'built' is set by rebuild: until then the rollups only cover the
+        -- days saved since they were created
+        CREATE TABLE IF NOT EXISTS rollup_meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+    """
+
+    def __init__(self, db_path):
+        """
+        Initialize the rollup store.
+
+        Args:
+            db_path (str): Path of the rollup database file
+        """
+        self.db_path = db_path
+        self._local = threading.local()
+
+    def connection(self):
+        """
+        Return this thread's connection, creating the schema on first use.
+
+        Returns:
+            sqlite3.Connection: The database connection
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(self.SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def _replace_day(self, conn, date_str, records):
+        conn.execute("DELETE FROM rollups WHERE period = 'daily' AND bucket_start = ?", (date_str,))
+        conn.executemany(
+            "INSERT INTO rollups VALUES ('daily', ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (date_str, date_str, dimension, value) + tuple(group)
+                for (dimension, value), group in summarize_day(records).items()
+            ]
+        )
+
+    def _refresh_bucket(self, conn, period, date_str):
+        # Weekly and monthly rows are re-derived from the daily rows they cover
+        bucket, start, end = period_bounds(period, date_str)
+        conn.execute("DELETE FROM rollups WHERE period = ? AND bucket_start = ?", (period, start))
+        conn.execute(
+            """
+            INSERT INTO rollups
+            SELECT ?, ?, ?, dimension, value,
+                   SUM(util_sum), SUM(util_count), MIN(util_min), MAX(util_max),
+                   SUM(cartons_sum), MIN(cartons_min), MAX(cartons_max)
+            FROM rollups
+            WHERE period = 'daily' AND bucket_start BETWEEN ? AND ?
+            GROUP BY dimension, value
+            """,
+            (period, bucket, start, start, end)
+        )
+
+    def update_day(self, date_str, load_records):
+        """
+        Recompute the rollups touched by one day after its records changed.
+
+        Args:
+            date_str (str): Date string (format: "YYYY-MM-DD")
+            load_records (callable): Returns all hourly records currently
+                stored for that date. It is called inside the rollup write
+                transaction, so concurrent saves to the same day cannot
+                leave an older summary behind.
+        """
+        self.update_days([date_str], lambda _: load_records())
+
+    def update_days(self, date_strs, load_records):
+        """
+        Recompute the rollups touched by several days in one transaction,
+        refreshing each weekly and monthly bucket once. Used by bulk imports.
+
+        Args:
+            date_strs (list): Date strings (format: "YYYY-MM-DD")
+            load_records (callable): Takes a date string and returns all hourly
+                records currently stored for it; called inside the transaction
+        """
+        conn = self.connection()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            for date_str in date_strs:
+                self._replace_day(conn, date_str, load_records(date_str))
+            self._refresh_buckets(conn, date_strs)
+
+    def _refresh_buckets(self, conn, date_strs):
+        refreshed = set()
+        for date_str in date_strs:
+            for period in ('weekly', 'monthly'):
+                bucket_start = period_bounds(period, date_str)[1]
+                if (period, bucket_start) not in refreshed:
+                    self._refresh_bucket(conn, period, date_str)
+                    refreshed.add((period, bucket_start))
+
+    def rebuild(self, data_handler):
+        """
+        Recompute every rollup from the stored hourly records.
+
+        Args:
+            data_handler (DataHandler): Source of the hourly records
+
+        Returns:
+            int: Number of days rolled up
+        """
+        dates = data_handler.list_available_dates()
+
+        conn = self.connection()
+        rolled_up = []
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM rollups")
+
+            # Stream one day at a time, with only the fields the rollups use
+            if dates:
+                for date_str, records in data_handler.iter_range(dates[0], dates[-1], fields=ROLLUP_FIELDS, by_day=True):
+                    self._replace_day(conn, date_str, records)
+                    rolled_up.append(date_str)
+
+            self._refresh_buckets(conn, rolled_up)
+            conn.execute(
+                "INSERT OR REPLACE INTO rollup_meta VALUES ('built', ?)",
+                (datetime.datetime.now().isoformat(timespec='seconds'),)
+            )
+
+        return len(rolled_up)
+
+    def is_built(self):
+        """
+        Check whether the rollups have been built from every stored record.
+
+        Returns:
+            bool: True once rebuild has completed for this database
+        """
+        return self.connection().execute("SELECT 1 FROM rollup_meta WHERE key = 'built'").fetchone() is not None
+
+    def query(self, period, dimension, start_date_str, end_date_str):
+        """
+        Read rollup rows for the buckets overlapping a date range.
+
+        Args:
+            period (str): "daily", "weekly" or "monthly"
+            dimension (str): One of DIMENSIONS
+            start_date_str (str): Start date string (format: "YYYY-MM-DD")
+            end_date_str (str): End date string (format: "YYYY-MM-DD")
+
+        Returns:
+            list: Row dicts ordered by bucket start, each with a computed 'util_mean'
+        """
+        first_bucket_start = period_bounds(period, start_date_str)[1]
+        rows = self.connection().execute(
+            """
+            SELECT * FROM rollups
+            WHERE period = ? AND dimension = ? AND bucket_start BETWEEN ? AND ?
+            ORDER BY bucket_start, value
+            """,
+            (period, dimension, first_bucket_start, end_date_str)
+        ).fetchall()
+
+        result = []
+        for row in rows:
+            row = dict(row)
+            row['util_mean'] = row['util_sum'] / row['util_count']
+            result.append(row)
+        return result
+
+    def mean_utilization(self, period, dimension, start_date_str, end_date_str):
+        """
+        Average utilization per bucket and group value.
+
+        Args:
+            period (str): "daily", "weekly" or "monthly"
+            dimension (str): One of DIMENSIONS
+            start_date_str (str): Start date string (format: "YYYY-MM-DD")
+            end_date_str (str): End date string (format: "YYYY-MM-DD")
+
+        Returns:
+            dict: Bucket start date -> {group value -> average utilization}, in date order
+        """
+        result = {}
+        for row in self.query(period, dimension, start_date_str, end_date_str):
+            result.setdefault(row['bucket_start'], {})[row['value']] = row['util_mean']
+        return result
+
+
+def main(argv=None):
+    from NaranjaMachineTracker.data_handler import create_data_handler
+
+    parser = argparse.ArgumentParser(description="Maintain the utilization rollup tables.")
+    parser.add_argument("command", choices=["rebuild"], help="rebuild: recompute every rollup from the stored records")
+    parser.add_argument("data_dir", nargs="?", default="data", help="Data directory (default: data)")
+    parser.add_argument("--backend", default="json", help="Storage backend: json, binary, parquet, history or sqlite")
+    args = parser.parse_args(argv)
+
+    data_handler = create_data_handler(args.backend, args.data_dir)
+    days = data_handler.rebuild_rollups()
+    print(f"Rebuilt rollups for {days} days")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1364 @@
+import os
+import json
+import bisect
+import struct
+import sqlite3
+import hashlib
+import datetime
+import itertools
+import threading
+import time
+import weakref
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property
+
+from NaranjaMachineTracker.record_codec import decode, encode_record
+
+try:
+    import fcntl
+except ImportError:
+    # No advisory file locks on this platform; locks only order threads
+    fcntl = None
+
+# Guards the creation of the per-backend FileLock instances
+_LOCKS_MUTEX = threading.Lock()
+
+# A JSON manifest is only reused once the directory's mtime is this old
+# (nanoseconds); coarse-timestamp filesystems such as FAT and some network
+# mounts round mtimes to 2 seconds
+MTIME_GRANULARITY_NS = 2_000_000_000
+
+# Files JsonStorage reads concurrently in range queries; raise it when the
+# data directory is on a high-latency (network) volume
+DEFAULT_LOAD_WORKERS = int(os.environ.get("NARANJA_LOAD_WORKERS", "1"))
+
+# Per-machine fields stored for every hourly record, in the order the data
+# entry form writes them
+MACHINE_FIELDS = [
+    'carton_type',
+    'packers',
+    'cartons_packed',
+    'inventory',
+    'capacity',
+    'utilization',
+    'cartons_per_packer'
+]
+
+
+# Version reported for a timestamp that has no record yet
+NEW_RECORD_VERSION = "new"
+
+
+class ConflictError(Exception):
+    """
+    Raised when a record changed since the version the caller loaded.
+    """
+
+
+def record_version(data):
+    """
+    Compute the version (etag) of a record from its content.
+
+    Args:
+        data (dict): Hourly record, or None if there is none
+
+    Returns:
+        str: Version string, NEW_RECORD_VERSION when data is None
+    """
+    if data is None:
+        return NEW_RECORD_VERSION
+    canonical = json.dumps(data, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()[:16]
+
+
+class FileLock:
+    """
+    Exclusive advisory lock on a lock file, shared between processes.
+
+    The lock is re-entrant within a thread, so code holding it may call other
+    code that takes the same lock.
+
+    With remove=True the lock file is deleted on release, so locks named
+    after ever-growing keys such as timestamps do not pile up. A process
+    that was waiting on the deleted file then finds the path no longer
+    leads to the file it locked, and locks the new file instead.
+    """
+
+    def __init__(self, path, remove=False):
+        """
+        Initialize the lock.
+
+        Args:
+            path (str): Path of the lock file (created on first use)
+            remove (bool): Delete the lock file when the lock is released
+        """
+        self.path = path
+        self.remove = remove and fcntl is not None
+        self._thread_lock = threading.RLock()
+        self._local = threading.local()
+
+    def _acquire_file(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        while True:
+            lock_file = open(self.path, 'a')
+            if fcntl is None:
+                return lock_file
+            try:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                if not self.remove or os.fstat(lock_file.fileno()).st_ino == os.stat(self.path).st_ino:
+                    return lock_file
+            except FileNotFoundError:
+                # Removed by the previous holder while we waited
+                pass
+            except BaseException:
+                lock_file.close()
+                raise
+            lock_file.close()
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        depth = getattr(self._local, 'depth', 0)
+        if depth == 0:
+            try:
+                self._local.file = self._acquire_file()
+            except BaseException:
+                self._thread_lock.release()
+                raise
+        self._local.depth = depth + 1
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._local.depth -= 1
+        if self._local.depth == 0:
+            lock_file = self._local.file
+            self._local.file = None
+            if self.remove:
+                # Removed while still held, so no one can lock this file
+                # after we release it and believe they hold the lock
+                try:
+                    os.remove(self.path)
+                except FileNotFoundError:
+                    pass
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            lock_file.close()
+        self._thread_lock.release()
+
+
+def parse_timestamp(timestamp):
+    """
+    Split a timestamp identifier into its date and hour parts.
+
+    Args:
+        timestamp (str): Timestamp identifier (format: "YYYY-MM-DD_HH")
+
+    Returns:
+        tuple: (date_str, hour) where hour is an int
+    """
+    date_str, hour = timestamp.rsplit('_', 1)
+    return date_str, int(hour)
+
+
+def is_timestamp_filename(filename, extension):
+    """
+    Check whether a file name is a record file named after a timestamp.
+
+    Args:
+        filename (str): File name without directory
+        extension (str): Expected extension including the dot (e.g. ".json")
+
+    Returns:
+        bool: True if the name looks like "YYYY-MM-DD_H<extension>"
+    """
+    if not filename.endswith(extension):
+        return False
+    try:
+        date_str, _ = parse_timestamp(filename[:-len(extension)])
+        datetime.datetime.strptime(date_str, "%Y-%m-%d")
+    except ValueError:
+        return False
+    return True
+
+
+def iter_dates(start_date_str, end_date_str):
+    """
+    Yield every date string between two dates, inclusive.
+
+    Args:
+        start_date_str (str): Start date string (format: "YYYY-MM-DD")
+        end_date_str (str): End date string (format: "YYYY-MM-DD")
+
+    Yields:
+        str: Date string (format: "YYYY-MM-DD")
+    """
+    start_date = datetime.datetime.strptime(start_date_str, "%Y-%m-%d").date()
+    end_date = datetime.datetime.strptime(end_date_str, "%Y-%m-%d").date()
+
+    current_date = start_date
+    while current_date <= end_date:
+        yield str(current_date)
+        current_date += datetime.timedelta(days=1)
+
+
+def flatten_record(data):
+    """
+    Convert an hourly record into one row per machine.
+
+    Args:
+        data (dict): Hourly record as saved by the data entry form
+
+    Returns:
+        list: List of flat row dicts, one per machine
+    """
+    rows = []
+    for machine_name, machine_data in data['machines'].items():
+        row = {
+            'timestamp': data['timestamp'],
+            'date': data['date'],
+            'hour': data['hour'],
+            'username': data['username'],
+            'machine': int(machine_name.split(' ')[-1])
+        }
+        for field in MACHINE_FIELDS:
+            row[field] = machine_data[field]
+        rows.append(row)
+    return rows
+
+
+def unflatten_rows(rows):
+    """
+    Rebuild hourly records from per-machine rows.
+
+    Rows belonging to the same timestamp are grouped together; records are
+    returned in the order their timestamps first appear. A row whose machine
+    is None stands for an hour without machines.
+
+    Args:
+        rows (iterable): Flat row dicts as produced by flatten_record
+
+    Returns:
+        list: List of hourly records
+    """
+    records = {}
+    for row in rows:
+        record = records.get(row['timestamp'])
+        if record is None:
+            record = {
+                'timestamp': row['timestamp'],
+                'date': row['date'],
+                'hour': int(row['hour']),
+                'username': row['username'],
+                'machines': {}
+            }
+            records[row['timestamp']] = record
+
+        if row['machine'] is not None:
+            record['machines'][f"Machine {row['machine']}"] = {
+                field: row[field] for field in MACHINE_FIELDS
+            }
+    return list(records.values())
+
+
+def iter_ordered_rows(rows):
+    """
+    Rebuild hourly records from per-machine rows already ordered by date and hour.
+
+    Unlike unflatten_rows this yields each record as soon as its rows are
+    complete, so a large result set is never held in memory at once.
+
+    Args:
+        rows (iterable): Flat row dicts (or sqlite3.Row) ordered by timestamp
+
+    Yields:
+        dict: Hourly records
+    """
+    record = None
+    for row in rows:
+        if record is None or record['timestamp'] != row['timestamp']:
+            if record is not None:
+                yield record
+            record = {
+                'timestamp': row['timestamp'],
+                'date': row['date'],
+                'hour': int(row['hour']),
+                'username': row['username'],
+                'machines': {}
+            }
+
+        if row['machine'] is not None:
+            record['machines'][f"Machine {row['machine']}"] = {
+                field: row[field] for field in MACHINE_FIELDS
+            }
+    if record is not None:
+        yield record
+
+
+def project_record(data, machines=None, fields=None):
+    """
+    Return a copy of a record reduced to some machines and fields.
+
+    Args:
+        data (dict): Hourly record
+        machines (iterable): Machine numbers to keep, or None for all
+        fields (list): Per-machine fields to keep (see MACHINE_FIELDS), or None for all
+
+    Returns:
+        dict: The projected record
+    """
+    wanted = None if machines is None else set(f"Machine {number}" for number in machines)
+    return dict(data, machines={
+        machine_name: machine_data if fields is None else {field: machine_data[field] for field in fields}
+        for machine_name, machine_data in data['machines'].items()
+        if wanted is None or machine_name in wanted
+    })
+
+
+class StorageBackend:
+    """
+    Base class for the storage backends used by DataHandler.
+
+    Backends deal in whole hourly records and raise on failure; DataHandler
+    is responsible for reporting errors to the caller.
+
+    Subclasses set lock_dir to the directory for their lock files.
+    """
+
+    lock_dir = None
+
+    def lock_key(self, timestamp):
+        """
+        Name of the lock guarding writes to a timestamp.
+
+        Args:
+            timestamp (str): Timestamp identifier (format: "YYYY-MM-DD_HH")
+
+        Returns:
+            str: Lock name; writes with different names may run concurrently
+        """
+        return timestamp
+
+    def lock(self, name):
+        """
+        Return the inter-process lock with a given name.
+
+        Args:
+            name (str): Lock name, e.g. from lock_key
+
+        Returns:
+            FileLock: The lock (one shared instance per name while it is in
+                      use); its file is removed again on release
+        """
+        # Instances are only kept while someone holds a reference, so the
+        # mapping does not grow with every timestamp ever locked
+        with _LOCKS_MUTEX:
+            locks = self.__dict__.setdefault('_locks', weakref.WeakValueDictionary())
+            lock = locks.get(name)
+            if lock is None:
+                lock = locks[name] = FileLock(os.path.join(self.lock_dir, f"{name}.lock"), remove=True)
+        return lock
+
+    def write(self, timestamp, data):
+        """
+        Persist the record for a timestamp, replacing any previous version.
+
+        Args:
+            timestamp (str): Timestamp identifier (format: "YYYY-MM-DD_HH")
+            data (dict): Hourly record to save
+        """
+        raise NotImplementedError
+
+    def write_many(self, records):
+        """
+        Persist many records, each keyed by its own 'timestamp' field.
+
+        Args:
+            records (list): List of hourly records
+        """
+        for data in records:
+            self.write(data['timestamp'], data)
+
+    def read(self, timestamp):
+        """
+        Read the record for a timestamp.
+
+        Args:
+            timestamp (str): Timestamp identifier (format: "YYYY-MM-DD_HH")
+
+        Returns:
+            dict: The record or None if not found
+        """
+        raise NotImplementedError
+
+    def read_range(self, start_date_str, end_date_str):
+        """
+        Read all records between two dates, inclusive, ordered by date and hour.
+
+        Args:
+            start_date_str (str): Start date string (format: "YYYY-MM-DD")
+            end_date_str (str): End date string (format: "YYYY-MM-DD")
+
+        Returns:
+            list: List of hourly records
+        """
+        raise NotImplementedError
+
+    def iter_range(self, start_date_str, end_date_str):
+        """
+        Yield the records between two dates, inclusive, ordered by date and hour.
+
+        The default reads a month at a time; backends override it to stream
+        record by record.
+
+        Args:
+            start_date_str (str): Start date string (format: "YYYY-MM-DD")
+            end_date_str (str): End date string (format: "YYYY-MM-DD")
+
+        Yields:
+            dict: Hourly records
+        """
+        month_start = datetime.date.fromisoformat(start_date_str)
+        end_date = datetime.date.fromisoformat(end_date_str)
+        while month_start <= end_date:
+            next_month = (month_start.replace(day=1) + datetime.timedelta(days=32)).replace(day=1)
+            month_end = min(next_month - datetime.timedelta(days=1), end_date)
+            yield from self.read_range(str(month_start), str(month_end))
+            month_start = next_month
+
+    def read_frame(self, start_date_str, end_date_str):
+        """
+        Read all records between two dates as a long-format DataFrame.
+
+        Args:
+            start_date_str (str): Start date string (format: "YYYY-MM-DD")
+            end_date_str (str): End date string (format: "YYYY-MM-DD")
+
+        Returns:
+            pandas.DataFrame: One row per machine-hour (see analytics.records_to_frame)
+        """
+        from NaranjaMachineTracker.analytics import records_to_frame
+        return records_to_frame(self.read_range(start_date_str, end_date_str))
+
+    def list_timestamps(self):
+        """
+        List the timestamps of every stored record.
+
+        Returns:
+            list: List of timestamp identifiers
+        """
+        raise NotImplementedError
+
+    def list_dates(self):
+        """
+        List all dates for which at least one record is stored.
+
+        Returns:
+            list: Sorted list of date strings
+        """
+        return sorted(set(parse_timestamp(ts)[0] for ts in self.list_timestamps()))
+
+
+class JsonStorage(StorageBackend):
+    """
+    Stores each hourly record as a pretty-printed JSON file named after its
+    timestamp (data_dir/YYYY-MM-DD_H.json).
+
+    A manifest of the files that exist and their format, taken from one
+    directory listing, is kept in memory so that range queries open only
+    the hours that were actually recorded instead of probing all 24 paths
+    per day. It is reused until the directory's mtime changes, so writers
+    update nothing but their own files and need no lock beyond the one per
+    timestamp. Readers open the files themselves, so the manifest only has
+    to know which exist.
+
+    With record_format="binary" records are written in the compact encoding
+    of record_codec (data_dir/YYYY-MM-DD_H.rec) instead. Either kind of file
+    is read regardless of the format being written.
+
+    Range queries can read files on a thread pool (load_workers), which hides
+    per-file latency on network volumes; records are still returned in
+    timestamp order.
+    """
+
+    # File extension for each record format
+    EXTENSIONS = {'json': '.json', 'binary': '.rec'}
+
+    def __init__(self, data_dir, record_format="json", load_workers=None):
+        """
+        Initialize the JSON storage.
+
+        Args:
+            data_dir (str): Directory holding the record files
+            record_format (str): Format for new records, "json" or "binary"
+            load_workers (int): Files read concurrently by range queries, 1 to
+                read sequentially (defaults to DEFAULT_LOAD_WORKERS)
+        """
+        if record_format not in self.EXTENSIONS:
+            raise ValueError(f"Unknown record format: {record_format}")
+
+        self.data_dir = data_dir
+        self.record_format = record_format
+        self.extension = self.EXTENSIONS[record_format]
+        self.load_workers = max(1, load_workers or DEFAULT_LOAD_WORKERS)
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+        # Lock files live in a subdirectory so creating them does not touch
+        # the data directory's mtime
+        self.lock_dir = os.path.join(data_dir, ".locks")
+
+        # Likewise for the temporary files records are written to before being
+        # renamed into place; were they created in the data directory, every
+        # write would find the manifest stale and rescan
+        self.tmp_dir = os.path.join(data_dir, ".tmp")
+
+        # (directory mtime, manifest) of the last listing that can be reused
+        self._listing = None
+
+    def _path(self, timestamp, extension=None):
+        return os.path.join(self.data_dir, f"{timestamp}{extension or self.extension}")
+
+    def _scan(self):
+        # Build the manifest from a single directory listing: timestamp -> extension
+        files = {}
+        mtimes = {}
+        with os.scandir(self.data_dir) as entries:
+            for entry in entries:
+                for extension in self.EXTENSIONS.values():
+                    if is_timestamp_filename(entry.name, extension) and entry.is_file():
+                        timestamp = entry.name[:-len(extension)]
+
+                        # If an hour exists in both formats, the newer file wins;
+                        # only then is a file's mtime needed
+                        if timestamp in files:
+                            mtimes[timestamp] = mtimes.get(timestamp) or os.stat(
+                                self._path(timestamp, files[timestamp])).st_mtime_ns
+                            mtime = entry.stat().st_mtime_ns
+                            if mtime <= mtimes[timestamp]:
+                                continue
+                            mtimes[timestamp] = mtime
+                        files[timestamp] = extension
+        return files
+
+    def _get_index(self):
+        """
+        Return the manifest, listing the directory again when it changed.
+
+        Adding, renaming or removing a file updates the directory's mtime.
+        A listing is only reused if that mtime was already MTIME_GRANULARITY_NS
+        old when the listing started: a file renamed in later during the same
+        timestamp tick would leave the mtime unchanged.
+        """
+        listed_at = time.time_ns()
+        dir_mtime = os.stat(self.data_dir).st_mtime_ns
+
+        listing = self._listing
+        if listing is not None and listing[0] == dir_mtime:
+            return listing[1]
+
+        index = self._scan()
+        if listed_at - dir_mtime > MTIME_GRANULARITY_NS:
+            self._listing = (dir_mtime, index)
+        return index
+
+    def rebuild_index(self):
+        """
+        Drop the cached manifest and list the directory again.
+
+        Returns:
+            int: Number of record files indexed
+        """
+        self._listing = None
+        return len(self._get_index())
+
+    def _encode(self, data):
+        if self.record_format == 'binary':
+            return encode_record(data)
+        return json.dumps(data, indent=2).encode('utf-8')
+
+    def _write_temp_file(self, timestamp, data):
+        # Records are written to a temporary file and renamed into place, so a
+        # crash or a concurrent reader never sees a half-written record
+        tmp_filename = os.path.join(
+            self.tmp_dir, f"{timestamp}{self.extension}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            with open(tmp_filename, 'wb') as f:
+                f.write(self._encode(data))
+                f.flush()
+                os.fsync(f.fileno())
+        except BaseException:
+            if os.path.exists(tmp_filename):
+                os.remove(tmp_filename)
+            raise
+        return tmp_filename
+
+    def write(self, timestamp, data):
+        self._write_many([(timestamp, data)])
+
+    def write_many(self, records):
+        self._write_many([(data['timestamp'], data) for data in records])
+
+    def _write_many(self, items):
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        tmp_filenames = {timestamp: self._write_temp_file(timestamp, data) for timestamp, data in items}
+
+        try:
+            for timestamp, tmp_filename in tmp_filenames.items():
+                os.replace(tmp_filename, self._path(timestamp))
+
+                # Drop the copy in the other format, e.g. the JSON file an
+                # hour had before the switch to binary records
+                for extension in self.EXTENSIONS.values():
+                    if extension != self.extension:
+                        try:
+                            os.remove(self._path(timestamp, extension))
+                        except FileNotFoundError:
+                            pass
+        finally:
+            for tmp_filename in tmp_filenames.values():
+                if os.path.exists(tmp_filename):
+                    os.remove(tmp_filename)
+
+    def _read_file(self, timestamp, extension):
+        # The format is detected from the file contents
+        with open(self._path(timestamp, extension), 'rb') as f:
+            return decode(f.read())
+
+    def _read_entry(self, timestamp, extension):
+        try:
+            return self._read_file(timestamp, extension)
+        except FileNotFoundError:
+            # Removed since the manifest was validated
+            return None
+
+    def read(self, timestamp):
+        entry = self._get_index().get(timestamp)
+        if entry is None:
+            return None
+
+        return self._read_entry(timestamp, entry)
+
+    def _entries_in_range(self, start_date_str, end_date_str):
+        # Manifest entries within the range, ordered by date and hour
+        # Comparing the date prefix first avoids parsing every timestamp
+        selected = []
+        for timestamp, entry in self._get_index().items():
+            if start_date_str <= timestamp[:10] <= end_date_str:
+                date_str, hour = parse_timestamp(timestamp)
+                if start_date_str <= date_str <= end_date_str:
+                    selected.append((date_str, hour, timestamp, entry))
+        selected.sort(key=lambda item: item[:2])
+        return [(timestamp, entry) for _, _, timestamp, entry in selected]
+
+    def _get_executor(self):
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.load_workers,
+                                                    thread_name_prefix="JsonStorage")
+            return self._executor
+
+    def iter_range(self, start_date_str, end_date_str):
+        entries = self._entries_in_range(start_date_str, end_date_str)
+
+        if self.load_workers == 1 or len(entries) < 2:
+            for timestamp, entry in entries:
+                data = self._read_entry(timestamp, entry)
+                if data:
+                    yield data
+            return
+
+        # Keep a bounded window of reads in flight and yield them in order
+        executor = self._get_executor()
+        remaining = iter(entries)
+        pending = deque(
+            executor.submit(self._read_entry, timestamp, entry)
+            for timestamp, entry in itertools.islice(remaining, self.load_workers * 2)
+        )
+        try:
+            while pending:
+                data = pending.popleft().result()
+                for timestamp, entry in itertools.islice(remaining, 1):
+                    pending.append(executor.submit(self._read_entry, timestamp, entry))
+                if data:
+                    yield data
+        finally:
+            # The caller stopped early or a read failed
+            for future in pending:
+                future.cancel()
+
+    def read_range(self, start_date_str, end_date_str):
+        return list(self.iter_range(start_date_str, end_date_str))
+
+    def list_timestamps(self):
+        return list(self._get_index())
+
+
+class ParquetStorage(StorageBackend):
+    """
+    Stores records as one row per machine-hour in monthly Parquet partitions
+    (data_dir/YYYY-MM.parquet).
+
+    A range query reads one file per month instead of one file per hour.
+    Writes rewrite only the affected month, which stays small (at most
+    31 days x 24 hours x 12 machines rows per line).
+    """
+
+    def __init__(self, data_dir):
+        """
+        Initialize the Parquet storage.
+
+        Args:
+            data_dir (str): Directory holding the monthly partition files
+        """
+        # pyarrow ships with streamlit, but only this backend needs it
+        import pyarrow
+        import pyarrow.compute
+        import pyarrow.parquet
+
+        self.pa = pyarrow
+        self.pq = pyarrow.parquet
+        self.data_dir = data_dir
+        self.lock_dir = os.path.join(data_dir, ".locks")
+        self.schema = pyarrow.schema([
+            ('timestamp', pyarrow.string()),
+            ('date', pyarrow.string()),
+            ('hour', pyarrow.int8()),
+            ('username', pyarrow.string()),
+            ('machine', pyarrow.int16()),
+            ('carton_type', pyarrow.dictionary(pyarrow.int8(), pyarrow.string())),
+            ('packers', pyarrow.int16()),
+            ('cartons_packed', pyarrow.int32()),
+            ('inventory', pyarrow.dictionary(pyarrow.int8(), pyarrow.string())),
+            ('capacity', pyarrow.int32()),
+            ('utilization', pyarrow.float64()),
+            ('cartons_per_packer', pyarrow.float64())
+        ])
+
+    def lock_key(self, timestamp):
+        # A write rewrites the whole month, so writers of the same month must queue
+        return parse_timestamp(timestamp)[0][:7]
+
+    def _partition_path(self, month):
+        return os.path.join(self.data_dir, f"{month}.parquet")
+
+    def _list_partitions(self):
+        return sorted(f[:-len('.parquet')] for f in os.listdir(self.data_dir) if f.endswith('.parquet'))
+
+    def _read_partition(self, month, filters=None):
+        path = self._partition_path(month)
+        if not os.path.exists(path):
+            return None
+        return self.pq.read_table(path, schema=self.schema, filters=filters)
+
+    def _write_partition(self, month, table):
+        # Sort so that a partition reads back in date/hour/machine order
+        table = table.sort_by([('date', 'ascending'), ('hour', 'ascending'), ('machine', 'ascending')])
+
+        # Write to a temporary file first so readers never see a partial partition
+        path = self._partition_path(month)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        self.pq.write_table(table, tmp_path)
+        os.replace(tmp_path, path)
+
+    def _record_rows(self, data):
+        rows = flatten_record(data)
+        if not rows:
+            # Keep an hour without machines as a single row with no machine
+            rows = [{
+                'timestamp': data['timestamp'],
+                'date': data['date'],
+                'hour': data['hour'],
+                'username': data['username'],
+                'machine': None,
+                **dict.fromkeys(MACHINE_FIELDS)
+            }]
+        return rows
+
+    def _rows_to_table(self, rows):
+        return self.pa.Table.from_pylist(rows, schema=self.schema)
+
+    def _table_to_records(self, table):
+        return unflatten_rows(table.to_pylist())
+
+    def write(self, timestamp, data):
+        self.write_many([data])
+
+    def write_many(self, records):
+        """
+        Write many records at once, rewriting each affected month only once.
+
+        Args:
+            records (list): List of hourly records
+        """
+        # Group new rows by month partition
+        by_month = {}
+        for data in records:
+            by_month.setdefault(data['date'][:7], []).extend(self._record_rows(data))
+
+        for month, rows in by_month.items():
+            with self.lock(month):
+                new_table = self._rows_to_table(rows)
+                existing = self._read_partition(month)
+
+                if existing is not None:
+                    # Drop any previous version of the timestamps being written
+                    replaced = self.pa.array(sorted(set(row['timestamp'] for row in rows)))
+                    keep = self.pa.compute.invert(self.pa.compute.is_in(existing['timestamp'], value_set=replaced))
+                    new_table = self.pa.concat_tables([existing.filter(keep), new_table])
+
+                self._write_partition(month, new_table)
+
+    def read(self, timestamp):
+        date_str, _ = parse_timestamp(timestamp)
+        table = self._read_partition(date_str[:7], filters=[('timestamp', '=', timestamp)])
+        if table is None or table.num_rows == 0:
+            return None
+        return self._table_to_records(table)[0]
+
+    def iter_range(self, start_date_str, end_date_str):
+        start_month = start_date_str[:7]
+        end_month = end_date_str[:7]
+        filters = [('date', '>=', start_date_str), ('date', '<=', end_date_str)]
+
+        # One partition in memory at a time
+        for month in self._list_partitions():
+            if start_month <= month <= end_month:
+                table = self._read_partition(month, filters=filters)
+                yield from self._table_to_records(table)
+
+    def read_range(self, start_date_str, end_date_str):
+        return list(self.iter_range(start_date_str, end_date_str))
+
+    def list_timestamps(self):
+        timestamps = []
+        for month in self._list_partitions():
+            table = self.pq.read_table(self._partition_path(month), columns=['timestamp'])
+            timestamps.extend(table['timestamp'].unique().to_pylist())
+        return timestamps
+
+
+class SqliteStorage(StorageBackend):
+    """
+    Stores records in a SQLite database with one row per (date, hour, machine).
+
+    The database runs in WAL mode so that readers never block writers and
+    several Streamlit sessions can save at the same time; each write replaces
+    one hour inside a single transaction.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS hourly_records (
+            timestamp TEXT PRIMARY KEY,
+            date TEXT NOT NULL,
+            hour INTEGER NOT NULL,
+            username TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_hourly_records_date ON hourly_records (date, hour);
+
+        -- The primary key doubles as the date index
+        CREATE TABLE IF NOT EXISTS machine_readings (
+            date TEXT NOT NULL,
+            hour INTEGER NOT NULL,
+            machine INTEGER NOT NULL,
+            carton_type TEXT,
+            packers INTEGER,
+            cartons_packed INTEGER,
+            inventory TEXT,
+            capacity INTEGER,
+            utilization REAL,
+            cartons_per_packer REAL,
+            PRIMARY KEY (date, hour, machine)
+        );
+        CREATE INDEX IF NOT EXISTS idx_machine_readings_machine ON machine_readings (machine, date);
+    """
+
+    def __init__(self, db_path):
+        """
+        Initialize the SQLite storage.
+
+        Args:
+            db_path (str): Path of the database file
+        """
+        self.db_path = db_path
+        self.lock_dir = os.path.join(os.path.dirname(db_path), ".locks")
+
+        # sqlite3 connections may not be shared between threads, and Streamlit
+        # runs each session in its own thread
+        self._local = threading.local()
+
+    def connection(self):
+        """
+        Return this thread's connection, creating the schema on first use.
+
+        Returns:
+            sqlite3.Connection: The database connection
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(self.SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def write(self, timestamp, data):
+        self.write_many([data])
+
+    def write_many(self, records):
+        """
+        Write many records in a single transaction.
+
+        Args:
+            records (list): List of hourly records
+        """
+        conn = self.connection()
+        with conn:
+            # Take the write lock up front so concurrent writers queue on the
+            # busy timeout instead of failing halfway through
+            conn.execute("BEGIN IMMEDIATE")
+            for data in records:
+                conn.execute("DELETE FROM machine_readings WHERE date = ? AND hour = ?", (data['date'], data['hour']))
+                conn.execute(
+                    "INSERT OR REPLACE INTO hourly_records (timestamp, date, hour, username) VALUES (?, ?, ?, ?)",
+                    (data['timestamp'], data['date'], data['hour'], data['username'])
+                )
+                conn.executemany(
+                    "INSERT INTO machine_readings (date, hour, machine, " + ", ".join(MACHINE_FIELDS) + ") "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (row['date'], row['hour'], row['machine']) + tuple(row[field] for field in MACHINE_FIELDS)
+                        for row in flatten_record(data)
+                    ]
+                )
+
+    def _select_rows(self, where, params):
+        # Returns the cursor; rows are fetched as it is iterated. An hour
+        # without machines comes back as one row with a NULL machine
+        return self.connection().execute(
+            "SELECT h.timestamp, h.date, h.hour, h.username, m.machine, " +
+            ", ".join(f"m.{field}" for field in MACHINE_FIELDS) +
+            " FROM hourly_records h LEFT JOIN machine_readings m ON m.date = h.date AND m.hour = h.hour"
+            f" WHERE {where} ORDER BY h.date, h.hour, m.machine",
+            params
+        )
+
+    def read(self, timestamp):
+        records = unflatten_rows(self._select_rows("h.timestamp = ?", (timestamp,)))
+        return records[0] if records else None
+
+    def iter_range(self, start_date_str, end_date_str):
+        return iter_ordered_rows(self._select_rows("h.date BETWEEN ? AND ?", (start_date_str, end_date_str)))
+
+    def read_range(self, start_date_str, end_date_str):
+        return list(self.iter_range(start_date_str, end_date_str))
+
+    def list_timestamps(self):
+        return [row[0] for row in self.connection().execute("SELECT timestamp FROM hourly_records")]
+
+    def list_dates(self):
+        return [row[0] for row in self.connection().execute("SELECT DISTINCT date FROM hourly_records ORDER BY date")]
+
+
+class HistoryStorage(StorageBackend):
+    """
+    Stores every machine-hour as a fixed-size row in a single file
+    (data_dir/history.bin), kept sorted by hour.
+
+    The file is memory-mapped and exposed as a NumPy structured array, so a
+    range query is a binary search on the hour column plus a slice of the
+    mapping. Nothing outside the range is read or decoded, and memory stays
+    flat however many years a query spans. Usernames, carton types and
+    inventory statuses are stored as codes into a string table kept in
+    data_dir/history.strings.json.
+
+    Hours later than any stored are appended in place and become visible
+    when the row count in the file header is updated. Re-saving an hour
+    that is already stored, or an earlier one, rewrites the file through a
+    temporary copy.
+
+    An hour saved with no machines is kept as a single placeholder row for
+    machine EMPTY_HOUR_MACHINE, so that it is still listed and read back.
+    """
+
+    FILENAME = "history.bin"
+    STRINGS_FILENAME = "history.strings.json"
+
+    # Header: magic, format version, number of committed rows
+    HEADER = struct.Struct("<4sIQ")
+    MAGIC = b"NMH1"
+    FORMAT_VERSION = 1
+
+    # One row per machine-hour; slot is date ordinal * 24 + hour
+    FIELDS = [
+        ('slot', '<i4'),
+        ('machine', '<u2'),
+        ('username', '<u2'),
+        ('carton_type', '<u2'),
+        ('packers', '<u2'),
+        ('cartons_packed', '<u4'),
+        ('inventory', '<u2'),
+        ('capacity', '<u4'),
+        ('utilization', '<f8'),
+        ('cartons_per_packer', '<f8')
+    ]
+
+    # Rows decoded per step of iter_range
+    CHUNK_ROWS = 4096
+
+    # Machine number of the placeholder row of an hour without machines
+    EMPTY_HOUR_MACHINE = 0
+
+    def __init__(self, data_dir):
+        """
+        Initialize the history storage.
+
+        Args:
+            data_dir (str): Directory holding the history files
+        """
+        self.data_dir = data_dir
+        self.lock_dir = os.path.join(data_dir, ".locks")
+        self.path = os.path.join(data_dir, self.FILENAME)
+        self.strings_path = os.path.join(data_dir, self.STRINGS_FILENAME)
+
+        # (file identity, value) of the current mapping and string table
+        self._mapped = None
+        self._strings = None
+        self._mutex = threading.Lock()
+
+    def lock_key(self, timestamp):
+        # Every write may rewrite the single file
+        return 'history'
+
+    @cached_property
+    def dtype(self):
+        # Built on first use so that importing the storage module does not
+        # import numpy
+        import numpy as np
+
+        return np.dtype(self.FIELDS)
+
+    @staticmethod
+    def _slot(date_str, hour):
+        return datetime.date.fromisoformat(date_str).toordinal() * 24 + hour
+
+    @staticmethod
+    def _slot_date(slot):
+        return str(datetime.date.fromordinal(slot // 24))
+
+    def _read_header(self):
+        # Returns (inode, committed rows), or None if there is no file yet
+        try:
+            with open(self.path, 'rb') as f:
+                header = f.read(self.HEADER.size)
+                inode = os.fstat(f.fileno()).st_ino
+        except FileNotFoundError:
+            return None
+
+        magic, format_version, count = self.HEADER.unpack(header)
+        if magic != self.MAGIC or format_version != self.FORMAT_VERSION:
+            raise ValueError(f"{self.path} is not a version {self.FORMAT_VERSION} history file")
+        return inode, count
+
+    def rows(self):
+        """
+        Return every stored row as a read-only structured array.
+
+        The array is a view of the memory-mapped file; it stays valid after
+        later writes, which are seen by the next call.
+
+        Returns:
+            numpy.ndarray: Rows of FIELDS in hour order
+        """
+        import numpy as np
+
+        identity = self._read_header()
+        if identity is None or identity[1] == 0:
+            return np.zeros(0, dtype=self.dtype)
+
+        with self._mutex:
+            if self._mapped is None or self._mapped[0] != identity:
+                mapping = np.memmap(self.path, dtype=self.dtype, mode='r',
+                                    offset=self.HEADER.size, shape=(identity[1],))
+                self._mapped = (identity, mapping.view(np.ndarray))
+            return self._mapped[1]
+
+    def strings(self):
+        """
+        Return the string table the row codes index into.
+
+        Returns:
+            list: Strings in code order
+        """
+        try:
+            stat = os.stat(self.strings_path)
+        except FileNotFoundError:
+            return []
+
+        identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        with self._mutex:
+            if self._strings is None or self._strings[0] != identity:
+                with open(self.strings_path, 'r') as f:
+                    self._strings = (identity, json.load(f))
+            return self._strings[1]
+
+    def _write_strings(self, strings):
+        tmp_path = f"{self.strings_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(strings, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.strings_path)
+
+    def _records_to_rows(self, records, code):
+        import numpy as np
+
+        # The last record for an hour wins, as with repeated write calls
+        by_slot = {self._slot(data['date'], data['hour']): data for data in records}
+
+        values = []
+        for slot in sorted(by_slot):
+            data = by_slot[slot]
+            username = code(data['username'] or "")
+            if not data['machines']:
+                values.append((slot, self.EMPTY_HOUR_MACHINE, username, 0, 0, 0, 0, 0, 0.0, 0.0))
+            for machine_name, machine_data in data['machines'].items():
+                values.append((
+                    slot,
+                    int(machine_name.split(' ')[-1]),
+                    username,
+                    code(machine_data['carton_type']),
+                    machine_data['packers'],
+                    machine_data['cartons_packed'],
+                    code(machine_data['inventory']),
+                    machine_data['capacity'],
+                    machine_data['utilization'],
+                    machine_data['cartons_per_packer']
+                ))
+        return np.array(values, dtype=self.dtype)
+
+    def _append(self, count, rows):
+        # Rows past the committed count are invisible until the header is
+        # updated, so a crash mid-append leaves the file as it was
+        with open(self.path, 'r+b') as f:
+            f.seek(self.HEADER.size + count * self.dtype.itemsize)
+            f.write(rows.tobytes())
+            f.truncate()
+            f.flush()
+            os.fsync(f.fileno())
+
+            f.seek(0)
+            f.write(self.HEADER.pack(self.MAGIC, self.FORMAT_VERSION, count + len(rows)))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _rewrite(self, rows):
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(self.HEADER.pack(self.MAGIC, self.FORMAT_VERSION, len(rows)))
+                f.write(rows.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def write(self, timestamp, data):
+        self.write_many([data])
+
+    def write_many(self, records):
+        """
+        Write many records, appending when they are all later than any stored.
+
+        Args:
+            records (list): List of hourly records
+        """
+        if not records:
+            return
+
+        import numpy as np
+
+        with self.lock('history'):
+            strings = list(self.strings())
+            codes = {value: code for code, value in enumerate(strings)}
+
+            def code(value):
+                if value not in codes:
+                    codes[value] = len(strings)
+                    strings.append(value)
+                return codes[value]
+
+            rows = self._records_to_rows(records, code)
+            if len(rows) == 0:
+                return
+
+            # New strings must be on disk before any row that refers to them
+            if len(strings) > len(self.strings()):
+                self._write_strings(strings)
+
+            existing = self.rows()
+            if len(existing) and rows['slot'][0] > existing['slot'][-1]:
+                self._append(len(existing), rows)
+            else:
+                keep = existing[~np.isin(existing['slot'], rows['slot'])]
+                merged = np.concatenate([keep, rows])
+                self._rewrite(merged[np.argsort(merged['slot'], kind='stable')])
+
+    def scan(self, start_date_str, end_date_str):
+        """
+        Return the rows between two dates, inclusive, without copying them.
+
+        Args:
+            start_date_str (str): Start date string (format: "YYYY-MM-DD")
+            end_date_str (str): End date string (format: "YYYY-MM-DD")
+
+        Returns:
+            numpy.ndarray: Slice of rows() in hour order
+        """
+        rows = self.rows()
+        slots = rows['slot']
+        first = bisect.bisect_left(slots, self._slot(start_date_str, 0))
+        last = bisect.bisect_left(slots, self._slot(end_date_str, 0) + 24, first)
+        return rows[first:last]
+
+    def _rows_to_records(self, rows):
+        strings = self.strings()
+        records = []
+        record = None
+        for (slot, machine, username, carton_type, packers, cartons_packed,
+             inventory, capacity, utilization, cartons_per_packer) in rows.tolist():
+            if record is None or record_slot != slot:
+                record_slot = slot
+                date_str = self._slot_date(slot)
+                record = {
+                    'timestamp': f"{date_str}_{slot % 24}",
+                    'date': date_str,
+                    'hour': slot % 24,
+                    'username': strings[username],
+                    'machines': {}
+                }
+                records.append(record)
+
+            if machine == self.EMPTY_HOUR_MACHINE:
+                continue
+            record['machines'][f"Machine {machine}"] = {
+                'carton_type': strings[carton_type],
+                'packers': packers,
+                'cartons_packed': cartons_packed,
+                'inventory': strings[inventory],
+                'capacity': capacity,
+                'utilization': utilization,
+                'cartons_per_packer': cartons_per_packer
+            }
+        return records
+
+    def read(self, timestamp):
+        date_str, hour = parse_timestamp(timestamp)
+        rows = self.rows()
+        slot = self._slot(date_str, hour)
+        first = bisect.bisect_left(rows['slot'], slot)
+        last = bisect.bisect_right(rows['slot'], slot, first)
+        records = self._rows_to_records(rows[first:last])
+        return records[0] if records else None
+
+    def iter_range(self, start_date_str, end_date_str):
+        rows = self.scan(start_date_str, end_date_str)
+        slots = rows['slot']
+
+        # Decode a block of rows at a time, never splitting an hour
+        first = 0
+        while first < len(rows):
+            last = min(first + self.CHUNK_ROWS, len(rows))
+            if last < len(rows):
+                last = bisect.bisect_left(slots, slots[last], first)
+                if last == first:
+                    last = bisect.bisect_right(slots, slots[first], first)
+            yield from self._rows_to_records(rows[first:last])
+            first = last
+
+    def read_range(self, start_date_str, end_date_str):
+        return self._rows_to_records(self.scan(start_date_str, end_date_str))
+
+    def read_frame(self, start_date_str, end_date_str):
+        import numpy as np
+        import pandas as pd
+
+        rows = self.scan(start_date_str, end_date_str)
+        placeholders = rows['machine'] == self.EMPTY_HOUR_MACHINE
+        if placeholders.any():
+            rows = rows[~placeholders]
+        strings = np.array(self.strings(), dtype=object)
+
+        # Build the date and timestamp strings once per hour, not per row
+        slots, inverse = np.unique(rows['slot'], return_inverse=True)
+        dates = np.array([self._slot_date(slot) for slot in slots.tolist()], dtype=object)
+        timestamps = np.array([f"{date_str}_{slot % 24}" for date_str, slot in zip(dates, slots.tolist())], dtype=object)
+
+        def categorical(codes):
+            # Categories are the strings actually used, codes map straight onto them
+            used, category_codes = np.unique(codes, return_inverse=True)
+            return pd.Categorical.from_codes(category_codes, categories=strings[used])
+
+        return pd.DataFrame({
+            'timestamp': timestamps[inverse],
+            'date': dates[inverse],
+            'hour': (rows['slot'] % 24).astype('int64'),
+            'username': strings[rows['username']],
+            'machine': rows['machine'].astype('int64'),
+            'carton_type': categorical(rows['carton_type']),
+            'packers': rows['packers'].astype('int64'),
+            'cartons_packed': rows['cartons_packed'].astype('int64'),
+            'inventory': categorical(rows['inventory']),
+            'capacity': rows['capacity'].astype('int64'),
+            'utilization': rows['utilization'].astype('float64'),
+            'cartons_per_packer': rows['cartons_per_packer'].astype('float64')
+        })
+
+    def _unique_slots(self):
+        import numpy as np
+
+        slots = self.rows()['slot']
+        if len(slots) == 0:
+            return slots
+        return slots[np.concatenate([[True], slots[1:] != slots[:-1]])]
+
+    def list_timestamps(self):
+        return [f"{self._slot_date(slot)}_{slot % 24}" for slot in self._unique_slots().tolist()]
+
+    def list_dates(self):
+        import numpy as np
+
+        days = self._unique_slots() // 24
+        if len(days) == 0:
+            return []
+        days = days[np.concatenate([[True], days[1:] != days[:-1]])]
+        return [str(datetime.date.fromordinal(day)) for day in days.tolist()]
+
+
+# Backends selectable by name, e.g. from configuration
+STORAGE_BACKENDS = {
+    'json': JsonStorage,
+    'binary': lambda data_dir: JsonStorage(data_dir, record_format='binary'),
+    'parquet': ParquetStorage,
+    'history': HistoryStorage
+}
+
+
+def create_storage(backend, data_dir):
+    """
+    Create a storage backend by name.
+
+    Args:
+        backend (str): Backend name (one of STORAGE_BACKENDS)
+        data_dir (str): Directory the backend stores its files in
+
+    Returns:
+        StorageBackend: The storage backend
+    """
+    if backend not in STORAGE_BACKENDS:
+        raise ValueError(f"Unknown storage backend: {backend}")
+    return STORAGE_BACKENDS[backend](data_dir)
@@ -0,0 +1,217 @@
+"""
+Synthetic hourly records for benchmarks and load testing.
+
+Records follow the configured machines, carton types and capacities, with
+derived fields computed exactly as the Data Entry form does, so they can be
+written through any storage backend and fed to every report.
+
+Each machine carries its state from one hour to the next, as on the floor:
+a machine runs the same carton type and inventory status for hours at a
+time, has its own typical efficiency, slows down at the start of the shift
+and over lunch, and now and then stops for an hour or more. The same seed
+always produces the same records.
+
+Usage:
+    python -m NaranjaMachineTracker.synthetic --data-dir data --days 365
+"""
+import argparse
+import datetime
+import itertools
+import math
+import random
+import time
+
+from NaranjaMachineTracker.utils import (
+    CARTON_TYPES, INVENTORY_TYPES, MACHINE_NUMBERS,
+    calculate_cartons_per_packer, calculate_utilization, get_machine_capacity, get_machine_type
+)
+
+USERNAMES = ["Ed", "Ana", "Luis", "Maria", "Jorge"]
+
+# Hours recorded on a typical working day
+SHIFT_HOURS = list(range(6, 18))
+
+# Share of capacity reached in an hour, before noise; the first hour of the
+# shift and lunch are slower
+HOUR_FACTORS = {6: 0.8, 12: 0.7, 17: 0.85}
+
+# Fruit that still has to be wrapped or labelled slows packing down
+INVENTORY_FACTORS = {
+    "Wrapped": 1.0,
+    "Labelled": 0.95,
+    "Wrapped and Labelled": 1.0,
+    "Unlabelled": 0.85,
+    "Other": 0.75
+}
+
+# Chance per machine and hour of a carton type change, an inventory status
+# change and a stop
+CHANGEOVER_RATE = 0.05
+INVENTORY_CHANGE_RATE = 0.15
+STOP_RATE = 0.03
+
+# Packers per machine type while running
+PACKER_RANGES = {"Speed Packer": (2, 4), "Jumble Filler": (1, 2)}
+
+
+def new_machine_states(rng):
+    """
+    Initial state of every machine, for generate_record.
+
+    Args:
+        rng (random.Random): Random source
+
+    Returns:
+        dict: Machine number -> state (carton type, inventory status,
+              efficiency and hours left of a stop)
+    """
+    return {
+        machine_number: {
+            'carton_type': rng.choice(CARTON_TYPES),
+            'inventory': rng.choice(INVENTORY_TYPES),
+            'efficiency': rng.uniform(0.7, 0.95),
+            'stopped_hours': 0
+        }
+        for machine_number in MACHINE_NUMBERS
+    }
+
+
+def _next_hour(state, rng):
+    # Advance a machine's state by one hour
+    if rng.random() < CHANGEOVER_RATE:
+        state['carton_type'] = rng.choice(CARTON_TYPES)
+    if rng.random() < INVENTORY_CHANGE_RATE:
+        state['inventory'] = rng.choice(INVENTORY_TYPES)
+
+    if state['stopped_hours'] > 0:
+        state['stopped_hours'] -= 1
+    elif rng.random() < STOP_RATE:
+        state['stopped_hours'] = rng.randint(1, 3)
+    return state
+
+
+def generate_record(date_str, hour, rng=None, states=None):
+    """
+    Generate one plausible hourly record.
+
+    Args:
+        date_str (str): Date string (format: "YYYY-MM-DD")
+        hour (int): Hour of the day (0-23)
+        rng (random.Random): Random source, for reproducible output
+        states (dict): Machine states from new_machine_states, advanced in
+            place; None generates an hour unrelated to any other
+
+    Returns:
+        dict: Hourly record in the stored format
+    """
+    rng = rng or random.Random()
+    states = states if states is not None else new_machine_states(rng)
+    hour_factor = HOUR_FACTORS.get(hour, 1.0)
+
+    machines = {}
+    for machine_number in MACHINE_NUMBERS:
+        state = _next_hour(states[machine_number], rng)
+        carton_type = state['carton_type']
+        capacity = get_machine_capacity(machine_number, carton_type)
+
+        if state['stopped_hours'] > 0:
+            packers, cartons_packed = 0, 0
+        else:
+            packers = rng.randint(*PACKER_RANGES.get(get_machine_type(machine_number), (1, 4)))
+            share = state['efficiency'] * hour_factor * INVENTORY_FACTORS.get(state['inventory'], 1.0)
+            cartons_packed = int(capacity * min(max(rng.gauss(share, 0.08), 0.0), 1.0))
+
+        machines[f"Machine {machine_number}"] = {
+            'carton_type': carton_type,
+            'packers': packers,
+            'cartons_packed': cartons_packed,
+            'inventory': state['inventory'],
+            'capacity': capacity,
+            'utilization': calculate_utilization(cartons_packed, capacity),
+            'cartons_per_packer': calculate_cartons_per_packer(cartons_packed, packers)
+        }
+
+    return {
+        'timestamp': f"{date_str}_{hour}",
+        'date': date_str,
+        'hour': hour,
+        'username': rng.choice(USERNAMES),
+        'machines': machines
+    }
+
+
+def generate_records(start_date_str, days, hours=None, seed=0):
+    """
+    Generate hourly records for a run of consecutive days.
+
+    Args:
+        start_date_str (str): First date (format: "YYYY-MM-DD")
+        days (int): Number of days
+        hours (list): Hours recorded each day (defaults to SHIFT_HOURS)
+        seed (int): Random seed
+
+    Yields:
+        dict: Hourly records in date and hour order
+    """
+    rng = random.Random(seed)
+    states = new_machine_states(rng)
+    start = datetime.date.fromisoformat(start_date_str)
+    for offset in range(days):
+        date_str = str(start + datetime.timedelta(days=offset))
+        for hour in hours or SHIFT_HOURS:
+            yield generate_record(date_str, hour, rng, states)
+
+
+def generate_record_count(start_date_str, count, hours=None, seed=0):
+    """
+    Generate a given number of hourly records, e.g. for benchmarks by size.
+
+    Args:
+        start_date_str (str): First date (format: "YYYY-MM-DD")
+        count (int): Number of records
+        hours (list): Hours recorded each day (defaults to SHIFT_HOURS)
+        seed (int): Random seed
+
+    Returns:
+        list: Hourly records in date and hour order
+    """
+    days = math.ceil(count / len(hours or SHIFT_HOURS))
+    return list(itertools.islice(generate_records(start_date_str, days, hours, seed), count))
+
+
+def main(argv=None):
+    """
+    Command-line entry point: fill a data directory with synthetic history.
+
+    Args:
+        argv (list): Arguments (default: sys.argv[1:])
+    """
+    from NaranjaMachineTracker.data_handler import create_data_handler
+
+    parser = argparse.ArgumentParser(description="Write synthetic hourly records.")
+    parser.add_argument("--data-dir", default="data", help="Data directory (default: data)")
+    parser.add_argument("--backend", default="json", help="Storage backend (default: json)")
+    parser.add_argument("--start", default="2024-01-01", help="First date (default: 2024-01-01)")
+    parser.add_argument("--days", type=int, default=365, help="Number of days (default: 365)")
+    parser.add_argument("--all-hours", action="store_true", help="Record all 24 hours instead of the shift")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0)")
+    args = parser.parse_args(argv)
+
+    data_handler = create_data_handler(args.backend, args.data_dir)
+    hours = list(range(24)) if args.all_hours else SHIFT_HOURS
+
+    started = time.perf_counter()
+    written = 0
+    records = generate_records(args.start, args.days, hours, args.seed)
+    # A month per save_many call keeps memory flat for long histories
+    while True:
+        batch = list(itertools.islice(records, len(hours) * 30))
+        if not batch:
+            break
+        written += data_handler.save_many(batch)
+
+    print(f"Wrote {written} hourly records to {args.data_dir} in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,138 @@
+import os
+import json
+from functools import cached_property
+
+# Machine registry: which machines exist, their type, line and hourly capacity
+# per carton type. Point NARANJA_MACHINE_CONFIG at another file to add lines.
+MACHINE_CONFIG_PATH = os.environ.get(
+    "NARANJA_MACHINE_CONFIG",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "machines.json")
+)
+
+
+class MachineRegistry:
+    """
+    Machine configuration compiled into O(1) lookup tables.
+
+    The configuration lists groups of machines sharing a type, a line and either
+    a capacity per carton type or a default capacity for every carton type.
+    """
+    
+    def __init__(self, config):
+        """
+        Compile a machine configuration.
+        
+        Args:
+            config (dict): Parsed machine configuration (see machines.json)
+        """
+        self.carton_types = list(config['carton_types'])
+        self.carton_codes = {carton_type: code for code, carton_type in enumerate(self.carton_types)}
+        
+        self.machine_types = {}
+        self.machine_lines = {}
+        self.capacity_lookup = {}
+        default_capacities = {}
+        
+        for group in config['machine_groups']:
+            for machine_number in group['machines']:
+                self.machine_types[machine_number] = group['type']
+                self.machine_lines[machine_number] = group.get('line')
+                default_capacities[machine_number] = group.get('default_capacity', 0)
+                for carton_type in self.carton_types:
+                    self.capacity_lookup[(machine_number, carton_type)] = group.get('capacity', {}).get(
+                        carton_type, default_capacities[machine_number])
+        
+        self.machine_numbers = sorted(self.machine_types)
+        self.default_capacities = default_capacities
+    
+    @cached_property
+    def capacity_table(self):
+        """
+        Dense capacity table indexed by [machine number, carton code]; the last
+        column holds the capacity for carton types not in the configuration.
+        
+        Built on first use, so that importing this module does not import numpy.
+        
+        Returns:
+            numpy.ndarray: Hourly capacities (int64)
+        """
+        import numpy as np
+        
+        max_machine = max(self.machine_numbers, default=0)
+        table = np.zeros((max_machine + 1, len(self.carton_types) + 1), dtype=np.int64)
+        for (machine_number, carton_type), capacity in self.capacity_lookup.items():
+            table[machine_number, self.carton_codes[carton_type]] = capacity
+        for machine_number, capacity in self.default_capacities.items():
+            table[machine_number, -1] = capacity
+        return table
+    
+    @classmethod
+    def from_file(cls, path):
+        """
+        Load and compile a machine configuration file.
+        
+        Args:
+            path (str): Path of a JSON machine configuration
+            
+        Returns:
+            MachineRegistry: The compiled registry
+        """
+        with open(path, 'r') as f:
+            return cls(json.load(f))
+    
+    def capacity(self, machine_number, carton_type):
+        """
+        Look up the hourly capacity of one machine for one carton type.
+        
+        Args:
+            machine_number (int): The machine number
+            carton_type (str): The type of carton being processed
+            
+        Returns:
+            int: The hourly capacity, 0 for unknown machines
+        """
+        capacity = self.capacity_lookup.get((machine_number, carton_type))
+        if capacity is None:
+            return self.default_capacities.get(machine_number, 0)
+        return capacity
+    
+    def capacities(self, machine_numbers, carton_types):
+        """
+        Look up hourly capacities for whole columns of machines and carton types.
+        
+        Args:
+            machine_numbers (array-like): Machine numbers
+            carton_types (array-like): Carton types, same length as machine_numbers
+            
+        Returns:
+            numpy.ndarray: Hourly capacities (int64), 0 for unknown machines
+        """
+        import numpy as np
+        
+        machine_numbers = np.asarray(machine_numbers, dtype=np.int64)
+        carton_types = np.asarray(carton_types, dtype=object)
+        
+        # Encode carton types once per distinct value rather than once per row
+        unique_cartons, inverse = np.unique(carton_types, return_inverse=True)
+        unique_codes = np.array(
+            [self.carton_codes.get(carton_type, len(self.carton_types)) for carton_type in unique_cartons],
+            dtype=np.int64
+        )
+        carton_codes = unique_codes[inverse.reshape(-1)] if len(unique_cartons) else np.zeros(0, dtype=np.int64)
+        
+        known = (machine_numbers >= 0) & (machine_numbers < self.capacity_table.shape[0])
+        result = np.zeros(machine_numbers.shape, dtype=np.int64)
+        result[known] = self.capacity_table[machine_numbers[known], carton_codes[known]]
+        return result
+
+
+MACHINE_REGISTRY = MachineRegistry.from_file(MACHINE_CONFIG_PATH)
+
+# Machines and carton types in display order
+MACHINE_NUMBERS = MACHINE_REGISTRY.machine_numbers
+CARTON_TYPES = MACHINE_REGISTRY.carton_types
+INVENTORY_TYPES = ["Wrapped", "Labelled", "Wrapped and Labelled", "Unlabelled", "Other"]
+
 def get_machine_type(machine_number):
     """
     Returns the type of machine based on its number.
@@ -8,12 +143,7 @@ def get_machine_type(machine_number):
     Returns:
         str: The machine type (Speed Packer or Jumble Filler)
     """
-    if 9 <= machine_number <= 14:
-        return "Speed Packer"
-    elif 15 <= machine_number <= 20:
-        return "Jumble Filler"
-    else:
-        return "Unknown"
+    return MACHINE_REGISTRY.machine_types.get(machine_number, "Unknown")
 
 def get_machine_capacity(machine_number, carton_type):
     """
@@ -26,34 +156,20 @@ def get_machine_capacity(machine_number, carton_type):
     Returns:
         int: The machine's hourly capacity for the specified carton type
     """
-    # Speed Packers 9-10
-    if machine_number in [9, 10]:
-        if carton_type == "A02D":
-            return 300
-        elif carton_type in ["A07D", "A11D", "E15D"]:
-            return 300
-        elif carton_type == "E10D":
-            return 200
-        elif carton_type == "A15C":
-            return 216
-    
-    # Speed Packers 11-14
-    elif 11 <= machine_number <= 14:
-        if carton_type == "A02D":
-            return 360
-        elif carton_type in ["A07D", "A11D", "E15D"]:
-            return 360
-        elif carton_type == "E10D":
-            return 240
-        elif carton_type == "A15C":
-            return 264
-    
-    # Jumble Fillers 15-20
-    elif 15 <= machine_number <= 20:
-        return 210
-    
-    # Default fallback
-    return 0
+    return MACHINE_REGISTRY.capacity(machine_number, carton_type)
+
+def capacities(machine_ids, carton_types):
+    """
+    Returns the hourly capacities for arrays of machine numbers and carton types.
+    
+    Args:
+        machine_ids (array-like): Machine numbers
+        carton_types (array-like): Carton types, same length as machine_ids
+        
+    Returns:
+        numpy.ndarray: Hourly capacities, matching get_machine_capacity element-wise
+    """
+    return MACHINE_REGISTRY.capacities(machine_ids, carton_types)
 
 def calculate_utilization(cartons_packed, capacity):
     """
@@ -70,3 +186,78 @@ def calculate_utilization(cartons_packed, capacity):
         utilization = (cartons_packed / capacity) * 100
         return min(utilization, 100)  # Cap at 100%
     return 0
+
+def calculate_cartons_per_packer(cartons_packed, packers):
+    """
+    Calculates the number of cartons packed per packer.
+    
+    Args:
+        cartons_packed (int): The number of cartons packed in an hour
+        packers (int): The number of packers on the machine
+        
+    Returns:
+        float: Cartons per packer, 0 when there are no packers
+    """
+    return cartons_packed / packers if packers > 0 else 0
+
+def calculate_utilization_batch(cartons_packed, capacity):
+    """
+    Calculates utilization percentages for whole arrays of readings.
+    
+    Same results as calculate_utilization, bit for bit: divided before scaling
+    to a percentage, capped at 100%, and 0 wherever the capacity is 0.
+    
+    Args:
+        cartons_packed (array-like): Cartons packed per reading
+        capacity (array-like): Machine capacity per reading
+        
+    Returns:
+        numpy.ndarray: Utilization percentages (float64)
+    """
+    import numpy as np
+    
+    cartons_packed = np.asarray(cartons_packed, dtype=np.float64)
+    capacity = np.asarray(capacity, dtype=np.float64)
+    
+    utilization = np.zeros(np.broadcast(cartons_packed, capacity).shape, dtype=np.float64)
+    np.divide(cartons_packed, capacity, out=utilization, where=capacity > 0)
+    utilization *= 100
+    return np.minimum(utilization, 100, out=utilization)
+
+def calculate_cartons_per_packer_batch(cartons_packed, packers):
+    """
+    Calculates cartons per packer for whole arrays of readings.
+    
+    Args:
+        cartons_packed (array-like): Cartons packed per reading
+        packers (array-like): Number of packers per reading
+        
+    Returns:
+        numpy.ndarray: Cartons per packer (float64), 0 wherever there are no packers
+    """
+    import numpy as np
+    
+    cartons_packed = np.asarray(cartons_packed, dtype=np.float64)
+    packers = np.asarray(packers, dtype=np.float64)
+    
+    cartons_per_packer = np.zeros(np.broadcast(cartons_packed, packers).shape, dtype=np.float64)
+    np.divide(cartons_packed, packers, out=cartons_per_packer, where=packers > 0)
+    return cartons_per_packer
+
+def calculate_metrics_batch(cartons_packed, capacity, packers):
+    """
+    Calculates the derived metrics stored with every reading, for whole arrays.
+    
+    Args:
+        cartons_packed (array-like): Cartons packed per reading
+        capacity (array-like): Machine capacity per reading
+        packers (array-like): Number of packers per reading
+        
+    Returns:
+        tuple: (utilization, cartons_per_packer) as float64 numpy arrays, with
+               utilization capped at 100%
+    """
+    return (
+        calculate_utilization_batch(cartons_packed, capacity),
+        calculate_cartons_per_packer_batch(cartons_packed, packers)
+    )
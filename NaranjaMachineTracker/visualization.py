@@ -1,60 +1,100 @@
 import plotly.graph_objects as go
-import plotly.express as px
 import pandas as pd
 import numpy as np
 
+from NaranjaMachineTracker.downsample import downsample
+from NaranjaMachineTracker.instrumentation import timed
+from NaranjaMachineTracker.utils import INVENTORY_TYPES, MACHINE_NUMBERS
+
+# Above this many points, line traces are drawn with WebGL (Scattergl)
+WEBGL_POINT_THRESHOLD = 1000
+
+@timed("visualization.plot_daily_utilization")
 def plot_daily_utilization(daily_data):
     """
     Create a visualization of machine utilization throughout a day.
     
     Args:
-        daily_data (list): List of hourly data entries for a day
+        daily_data (list): List of hourly data entries for a day (not modified)
         
     Returns:
         plotly.graph_objects.Figure: The plotly figure object
     """
-    # Sort data by hour
-    daily_data.sort(key=lambda x: x['hour'])
+    # Only the columns the chart needs, without copying or sorting the records
+    df = pd.DataFrame(
+        [
+            (data['date'], data['hour'], int(machine_name.split(' ')[-1]), machine_data['utilization'])
+            for data in daily_data
+            for machine_name, machine_data in data['machines'].items()
+        ],
+        columns=['date', 'hour', 'machine', 'utilization']
+    )
+    return plot_utilization_frame(df)
+
+@timed("visualization.plot_utilization_frame")
+def plot_utilization_frame(df):
+    """
+    Create a machine utilization line chart from a long-format frame.
     
-    # Prepare data for plotting
-    hours = []
-    machine_utilization = {f"Machine {i}": [] for i in range(9, 21)}
+    A single day is plotted against the hour, as in the Daily Report; longer
+    ranges against date and time. Large charts use WebGL traces.
     
-    for data in daily_data:
-        hour = data['hour']
-        hours.append(f"{hour}:00")
+    Args:
+        df (pandas.DataFrame): Frame from analytics.records_to_frame, or any
+            frame with its date, hour, machine and utilization columns (not modified)
         
-        # Add utilization data for each machine
-        for machine_number in range(9, 21):
-            machine_name = f"Machine {machine_number}"
-            
-            if machine_name in data['machines']:
-                machine_utilization[machine_name].append(data['machines'][machine_name]['utilization'])
-            else:
-                machine_utilization[machine_name].append(None)
+    Returns:
+        plotly.graph_objects.Figure: The plotly figure object
+    """
+    single_day = df['date'].nunique() <= 1
     
-    # Create figure
-    fig = go.Figure()
+    # Pivot hour x machine in one step
+    if df.empty:
+        utilization = pd.DataFrame()
+    else:
+        if single_day:
+            x = df['hour']
+        else:
+            x = pd.to_datetime(df['date']) + pd.to_timedelta(df['hour'], unit='h')
+        # (date, hour, machine) is unique, so a plain pivot is enough
+        utilization = df.assign(x=x).pivot(index='x', columns='machine', values='utilization').sort_index()
+    
+    if single_day:
+        hours = np.array([f"{hour}:00" for hour in utilization.index], dtype=object)
+    else:
+        hours = utilization.index.to_numpy()
+    
+    # Large charts are drawn with WebGL, and their columns are handed to
+    # plotly as arrays; for small ones plain lists validate faster
+    values = utilization.to_numpy(dtype=float)
+    webgl = np.count_nonzero(~np.isnan(values)) > WEBGL_POINT_THRESHOLD
+    trace_type = 'scattergl' if webgl else 'scatter'
     
-    # Add traces for each machine
-    for machine_number in range(9, 21):
-        machine_name = f"Machine {machine_number}"
+    # Add traces for each machine, skipping hours without a reading
+    traces = []
+    columns = list(utilization.columns)
+    for machine_number in MACHINE_NUMBERS:
+        if machine_number not in columns:
+            continue
         
-        # Filter out None values
-        valid_indices = [i for i, val in enumerate(machine_utilization[machine_name]) if val is not None]
-        valid_hours = [hours[i] for i in valid_indices]
-        valid_utilization = [machine_utilization[machine_name][i] for i in valid_indices]
+        machine_values = values[:, columns.index(machine_number)]
+        valid = ~np.isnan(machine_values)
         
-        if valid_utilization:
-            fig.add_trace(go.Scatter(
-                x=valid_hours,
-                y=valid_utilization,
+        if valid.any():
+            traces.append(dict(
+                type=trace_type,
+                x=hours[valid] if webgl else hours[valid].tolist(),
+                y=machine_values[valid] if webgl else machine_values[valid].tolist(),
                 mode='lines+markers',
-                name=machine_name
+                name=f"Machine {machine_number}"
             ))
     
+    # Create figure
+    fig = go.Figure()
+    fig.add_traces(traces)
+    
     # Add reference line at 70%
-    if hours:
+    if len(hours):
         fig.add_shape(
             type="line",
             x0=hours[0],
@@ -81,7 +121,7 @@ def plot_daily_utilization(daily_data):
     # Update layout
     fig.update_layout(
         title="Hourly Machine Utilization",
-        xaxis_title="Hour",
+        xaxis_title="Hour" if single_day else "Time",
         yaxis_title="Utilization (%)",
         yaxis=dict(range=[0, 100]),
         showlegend=True,
@@ -96,6 +136,7 @@ def plot_daily_utilization(daily_data):
     
     return fig
 
+@timed("visualization.plot_inventory_impact")
 def plot_inventory_impact(daily_data):
     """
     Create a visualization showing the impact of inventory status on machine utilization.
@@ -107,7 +148,7 @@ def plot_inventory_impact(daily_data):
         plotly.graph_objects.Figure: The plotly figure object
     """
     # Prepare data for plotting
-    inventory_types = ["Wrapped", "Labelled", "Wrapped and Labelled", "Unlabelled", "Other"]
+    inventory_types = INVENTORY_TYPES
     inventory_data = {inv_type: [] for inv_type in inventory_types}
     
     # Collect utilization percentages for each inventory type
@@ -179,3 +220,77 @@ def plot_inventory_impact(daily_data):
     )
     
     return fig
+
+@timed("visualization.plot_utilization_trend")
+def plot_utilization_trend(trend, title, xaxis_title="Date", max_points=None, method='lttb', reference_line=True):
+    """
+    Create a utilization trend chart with one line per column.
+    
+    Each line is downsampled to at most max_points points, so the figure
+    stays the same size however long the range is. Large charts use WebGL
+    traces.
+    
+    Args:
+        trend (pandas.DataFrame): Indexed by date or datetime, one column per
+            line; NaN where a line has no value (not modified)
+        title (str): Chart title
+        xaxis_title (str): X axis title
+        max_points (int): Point budget per line, or None to keep every point
+        method (str): Downsampling method, "lttb" or "minmax"
+        reference_line (bool): Whether to draw the 70% target line
+        
+    Returns:
+        plotly.graph_objects.Figure: The plotly figure object
+    """
+    x = pd.to_datetime(trend.index).to_numpy()
+    
+    lines = []
+    for column in trend.columns:
+        values = trend[column].to_numpy(dtype=float)
+        if max_points:
+            line_x, line_y = downsample(x, values, max_points, method)
+        else:
+            valid = ~np.isnan(values)
+            line_x, line_y = x[valid], values[valid]
+        if len(line_y):
+            lines.append((column, line_x, line_y))
+    
+    trace_type = 'scattergl' if sum(len(line_y) for _, _, line_y in lines) > WEBGL_POINT_THRESHOLD else 'scatter'
+    
+    fig = go.Figure()
+    fig.add_traces([
+        dict(type=trace_type, x=line_x, y=line_y, mode='lines+markers', name=str(column))
+        for column, line_x, line_y in lines
+    ])
+    
+    # Add reference line at 70%
+    if reference_line and len(x):
+        fig.add_shape(
+            type="line",
+            x0=x.min(),
+            y0=70,
+            x1=x.max(),
+            y1=70,
+            line=dict(
+                color="red",
+                width=2,
+                dash="dash",
+            )
+        )
+    
+    fig.update_layout(
+        title=title,
+        xaxis_title=xaxis_title,
+        yaxis_title="Utilization (%)",
+        yaxis=dict(range=[0, 100]),
+        showlegend=True
+    )
+    
+    return fig
+
+
+# Figures of the Daily Report, by figure cache kind
+DAILY_FIGURES = {
+    'daily_utilization': plot_daily_utilization,
+    'inventory_impact': plot_inventory_impact
+}
@@ -1,13 +1,22 @@
 import streamlit as st
-import pandas as pd
 import datetime
-import os
 import io
-import base64
-from PIL import Image
-from NaranjaMachineTracker.data_handler import DataHandler
-from utils import calculate_utilization, get_machine_capacity, get_machine_type
-from visualization import plot_daily_utilization, plot_inventory_impact
+import os
+import threading
+from contextlib import nullcontext
+from NaranjaMachineTracker.cache import CachedDataHandler
+from NaranjaMachineTracker.data_handler import create_data_handler
+from NaranjaMachineTracker.storage import ConflictError
+from NaranjaMachineTracker.utils import (
+    CARTON_TYPES, INVENTORY_TYPES, MACHINE_NUMBERS,
+    calculate_cartons_per_packer, calculate_utilization, get_machine_capacity, get_machine_type
+)
+from NaranjaMachineTracker import instrumentation
+from NaranjaMachineTracker.instrumentation import timer
+from NaranjaMachineTracker import profiling
+
+# pandas, numpy, plotly and PIL are imported by the views that use them, so
+# a cold server paints the login form without loading them
 
 # Page configuration
 st.set_page_config(
@@ -16,11 +25,63 @@ st.set_page_config(
     layout="centered" # Changed to centered for better mobile view
 )
 
-# Initialize data handler
-data_handler = DataHandler()
+# Initialize the data handler once per process so every session shares its cache
+# (NARANJA_STORAGE_BACKEND selects "json", "binary", "parquet", "history" or "sqlite";
+# NARANJA_LOAD_WORKERS sets how many files the json and binary backends read at once)
+@st.cache_resource
+def get_data_handler():
+    return CachedDataHandler(
+        create_data_handler(os.environ.get("NARANJA_STORAGE_BACKEND", "json")),
+        max_bytes=int(os.environ.get("NARANJA_CACHE_MB", "64")) * 1024 * 1024
+    )
+
+data_handler = get_data_handler()
+
+# Daily Report figures, kept across reruns and restarts in data/.figures
+# (NARANJA_PREWARM_DAYS recent days are built in the background once the
+# first user has logged in)
+@st.cache_resource
+def get_figure_cache():
+    from NaranjaMachineTracker.figure_cache import FigureCache
+    
+    figure_cache = FigureCache(
+        os.path.join(data_handler.data_dir, ".figures"),
+        max_bytes=int(os.environ.get("NARANJA_FIGURE_CACHE_MB", "16")) * 1024 * 1024
+    )
+    threading.Thread(
+        target=prewarm_figures,
+        args=(figure_cache, int(os.environ.get("NARANJA_PREWARM_DAYS", "7"))),
+        daemon=True
+    ).start()
+    return figure_cache
+
+def prewarm_figures(figure_cache, days):
+    # Runs in the background thread, which also pays for importing plotly
+    from NaranjaMachineTracker.visualization import DAILY_FIGURES
+    
+    figure_cache.prewarm(data_handler, days, DAILY_FIGURES)
+
+# Width trend charts are drawn at in the centered layout, in pixels
+TREND_CHART_WIDTH_PX = 700
+
+# Users who see the timing panel (comma-separated NARANJA_ADMIN_USERS)
+ADMIN_USERS = {name.strip() for name in os.environ.get("NARANJA_ADMIN_USERS", "").split(",") if name.strip()}
+
+# Where stage timings are written while timing is on; a ".json" path writes
+# JSON, anything else the Prometheus text format. The default is a subdirectory
+# so that rewriting it does not touch the data directory's mtime.
+TIMINGS_DUMP_PATH = os.environ.get(
+    "NARANJA_TIMINGS_DUMP", os.path.join(data_handler.data_dir, ".metrics", "timings.prom"))
+
+# Profiles of single reruns (.pstats and collapsed stacks) are saved here.
+# Admins can turn profiling on from the sidebar; with NARANJA_PROFILE_QUERY=1
+# any session can also ask for it with ?profile=once, ?profile=session or
+# ?profile=off.
+PROFILE_DIR = os.environ.get("NARANJA_PROFILE_DIR", os.path.join(data_handler.data_dir, ".profiles"))
+PROFILE_QUERY_ENABLED = os.environ.get("NARANJA_PROFILE_QUERY", "0") == "1"
 
 # Add custom CSS for mobile responsiveness (especially for Samsung devices)
-st.markdown("""
+MOBILE_CSS = """
 <style>
     /* Mobile-optimized styles */
     @media screen and (max-width: 640px) {
@@ -95,159 +156,31 @@ st.markdown("""
         transform: scale(0.97);
     }
 </style>
-""", unsafe_allow_html=True)
+"""
 
-# Helper function to create a downloadable image
-def get_image_download_link(img, filename, text):
+def inject_css():
     """
-    Generate a link to download an image, optimized for mobile devices.
-    
-    Args:
-        img: PIL Image object
-        filename: Name of the download file
-        text: Text to display in the download link
-        
-    Returns:
-        str: HTML link for download
-    """
-    buffered = io.BytesIO()
-    img.save(buffered, format="PNG")
-    img_str = base64.b64encode(buffered.getvalue()).decode()
-    
-    # Create a mobile-friendly download link with styling
-    href = f'''
-    <a href="data:image/png;base64,{img_str}" 
-       download="{filename}" 
-       style="display: inline-block; 
-              padding: 0.75em 1.5em; 
-              background-color: #4CAF50; 
-              color: white; 
-              text-decoration: none; 
-              border-radius: 8px; 
-              margin-top: 12px; 
-              font-weight: bold; 
-              font-size: 16px;
-              text-align: center;">
-        {text}
-    </a>
-    '''
-    return href
-
-# Function to create a summary image of hourly data
-def create_hourly_data_image(machine_data, date, hour, username):
+    Add custom CSS for mobile responsiveness (especially for Samsung devices).
     """
-    Create an image showing the hourly data summary.
-    
-    Args:
-        machine_data: Dictionary of machine data
-        date: Date of data collection
-        hour: Hour of data collection
-        username: Username of the data collector
-        
-    Returns:
-        PIL.Image: Image with summary data
-    """
-    # Create a white image with text
-    width, height = 800, 1000  # Good size for mobile screens
-    img = Image.new('RGB', (width, height), color='white')
-    
-    # Import ImageDraw for text
-    from PIL import ImageDraw, ImageFont
-    
-    # Create a drawing context
-    draw = ImageDraw.Draw(img)
-    
-    # Try to use a default font
-    try:
-        font_title = ImageFont.truetype("DejaVuSans.ttf", 32)
-        font_subtitle = ImageFont.truetype("DejaVuSans.ttf", 24)
-        font_text = ImageFont.truetype("DejaVuSans.ttf", 20)
-    except IOError:
-        # If font file not found, use default font
-        font_title = ImageFont.load_default()
-        font_subtitle = ImageFont.load_default()
-        font_text = ImageFont.load_default()
-    
-    # Draw title
-    draw.text((20, 20), f"Naranja Automation", fill="black", font=font_title)
-    draw.text((20, 60), f"Machine Utilization Report", fill="black", font=font_subtitle)
-    draw.text((20, 100), f"Date: {date} | Hour: {hour}:00", fill="black", font=font_text)
-    draw.text((20, 130), f"Recorded by: {username}", fill="black", font=font_text)
-    
-    # Draw separator line
-    draw.line([(20, 160), (width-20, 160)], fill="black", width=2)
-    
-    # Draw data table headers
-    headers = ["Machine", "Type", "Carton", "Packers", "Cartons", "Util%", "Cartons/Packer"]
-    header_positions = [20, 110, 200, 290, 370, 470, 580]
-    
-    for i, header in enumerate(headers):
-        draw.text((header_positions[i], 180), header, fill="black", font=font_text)
-    
-    # Draw separator line
-    draw.line([(20, 210), (width-20, 210)], fill="black", width=2)
-    
-    # Draw data rows
-    y_position = 230
-    for machine_number in range(9, 21):
-        machine_name = f"Machine {machine_number}"
-        if machine_name in machine_data:
-            data = machine_data[machine_name]
-            machine_type = "SpeedPacker" if machine_number <= 14 else "JumbleFiller"
-            
-            # Set text color based on utilization
-            text_color = "red" if data['utilization'] < 70 else "black"
-            
-            # Draw machine data
-            draw.text((header_positions[0], y_position), machine_name, fill=text_color, font=font_text)
-            draw.text((header_positions[1], y_position), machine_type, fill=text_color, font=font_text)
-            draw.text((header_positions[2], y_position), data['carton_type'], fill=text_color, font=font_text)
-            draw.text((header_positions[3], y_position), str(data['packers']), fill=text_color, font=font_text)
-            draw.text((header_positions[4], y_position), str(data['cartons_packed']), fill=text_color, font=font_text)
-            draw.text((header_positions[5], y_position), f"{data['utilization']:.1f}%", fill=text_color, font=font_text)
-            
-            # Draw cartons per packer
-            per_packer_color = "red" if data['cartons_per_packer'] < 11 and data['packers'] > 0 else "black"
-            draw.text((header_positions[6], y_position), f"{data['cartons_per_packer']:.1f}", fill=per_packer_color, font=font_text)
-            
-            y_position += 40
-    
-    # Draw separator line
-    draw.line([(20, y_position+10), (width-20, y_position+10)], fill="black", width=2)
-    
-    # Add inventory status summary
-    draw.text((20, y_position+30), "Inventory Status Summary:", fill="black", font=font_subtitle)
-    
-    # Count machines by inventory status
-    inventory_counts = {}
-    for machine, data in machine_data.items():
-        if data['inventory'] not in inventory_counts:
-            inventory_counts[data['inventory']] = 0
-        inventory_counts[data['inventory']] += 1
-    
-    # Draw inventory summary
-    y_pos = y_position + 70
-    for status, count in inventory_counts.items():
-        draw.text((40, y_pos), f"{status}: {count} machines", fill="black", font=font_text)
-        y_pos += 30
-    
-    # Add current date/time stamp
-    current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    draw.text((20, height-40), f"Report generated: {current_time}", fill="gray", font=ImageFont.load_default())
-    
-    return img
+    st.markdown(MOBILE_CSS, unsafe_allow_html=True)
 
 # Session state initialization
-if 'authenticated' not in st.session_state:
-    st.session_state.authenticated = False
-if 'username' not in st.session_state:
-    st.session_state.username = ""
-if 'current_data' not in st.session_state:
-    st.session_state.current_data = None
-if 'view_mode' not in st.session_state:
-    st.session_state.view_mode = "data_entry"
-if 'last_saved_data' not in st.session_state:
-    st.session_state.last_saved_data = None
+def init_session_state():
+    """
+    Set the session state defaults on the first run of a session.
+    """
+    if 'authenticated' not in st.session_state:
+        st.session_state.authenticated = False
+    if 'username' not in st.session_state:
+        st.session_state.username = ""
+    if 'current_data' not in st.session_state:
+        st.session_state.current_data = None
+    if 'view_mode' not in st.session_state:
+        st.session_state.view_mode = "data_entry"
+    if 'last_saved_data' not in st.session_state:
+        st.session_state.last_saved_data = None
+    if 'form_versions' not in st.session_state:
+        st.session_state.form_versions = {}
 
 # Password hashing function
 def verify_password(password, hashed_passwords):
@@ -262,7 +195,10 @@ def verify_password(password, hashed_passwords):
 APPROVED_PASSWORDS = ["naranja2025", "automation123", "packingUnit5"] 
 
 # Login screen
-if not st.session_state.authenticated:
+def login_view():
+    """
+    Render the login form.
+    """
     st.title("Welcome to Naranja Automation")
     st.subheader("Machine Utilization Tracker")
     
@@ -279,9 +215,17 @@ if not st.session_state.authenticated:
             else:
                 st.error("Invalid username or password. Please try again.")
 
-# Main application
-else:
-    # Sidebar navigation
+# Sidebar navigation
+def sidebar():
+    """
+    Render the sidebar navigation.
+    
+    The date, hour and view decide what the whole page shows, so changing
+    them reruns the full script.
+    
+    Returns:
+        tuple: (selected date, selected hour, selected view name)
+    """
     st.sidebar.title(f"Welcome, {st.session_state.username}")
     
     # Add link to install as app on Samsung
@@ -308,201 +252,379 @@ else:
     view_options = ["Data Entry", "Daily Report", "Trend Analysis"]
     selected_view = st.sidebar.radio("View", view_options)
     
-    if selected_view == "Data Entry":
-        st.session_state.view_mode = "data_entry"
-    elif selected_view == "Daily Report":
-        st.session_state.view_mode = "daily_report"
-    else:
-        st.session_state.view_mode = "trend_analysis"
+    return selected_date, selected_hour, selected_view
+
+# Logout button
+def logout_button():
+    """
+    Render the logout button at the bottom of the sidebar.
+    """
+    if st.sidebar.button("Logout"):
+        st.session_state.authenticated = False
+        st.session_state.username = ""
+        st.rerun()
+
+def machine_entry(machine_number, carton_type, packers, cartons_packed, inventory):
+    """
+    Build the stored values for one machine from the data entry inputs.
     
-    # Load existing data for the selected date and hour if available
-    timestamp = f"{selected_date}_{selected_hour}"
-    existing_data = data_handler.load_data(timestamp)
+    Args:
+        machine_number (int): The machine number
+        carton_type (str): Carton type being packed
+        packers (int): Number of packers
+        cartons_packed (int): Cartons packed this hour
+        inventory (str): Inventory status
+        
+    Returns:
+        dict: Machine values including capacity, utilization and cartons per packer
+    """
+    capacity = get_machine_capacity(machine_number, carton_type)
+    return {
+        'carton_type': carton_type,
+        'packers': packers,
+        'cartons_packed': cartons_packed,
+        'inventory': inventory,
+        'capacity': capacity,
+        'utilization': calculate_utilization(cartons_packed, capacity),
+        'cartons_per_packer': calculate_cartons_per_packer(cartons_packed, packers)
+    }
+
+@st.fragment
+def machine_panel(machine_number, defaults):
+    """
+    Inputs and live metrics for one machine.
     
-    if st.session_state.view_mode == "data_entry":
-        st.title("Machine Utilization Data Entry")
-        st.subheader(f"Date: {selected_date} | Hour: {selected_hour}:00")
+    Runs as a fragment: editing a machine reruns only its own panel.
+    
+    Args:
+        machine_number (int): The machine number
+        defaults (dict): Stored values for the machine, empty for a new record
+    """
+    machine_name = f"Machine {machine_number}"
+    machine_type = get_machine_type(machine_number)
+    
+    with st.expander(f"{machine_name} ({machine_type})"):
+        # Default values from existing data if available
+        default_carton_type = defaults.get('carton_type', 'A02D')
+        default_packers = defaults.get('packers', 1)
+        default_cartons_packed = defaults.get('cartons_packed', 0)
+        default_inventory = defaults.get('inventory', 'Wrapped')
         
-        # Initialize form data with existing data or empty values
-        form_data = {}
-        if existing_data is not None:
-            form_data = existing_data
+        # Input fields
+        carton_type = st.selectbox(
+            "Carton Type", 
+            CARTON_TYPES,
+            key=f"{machine_name}_carton_type",
+            index=CARTON_TYPES.index(default_carton_type) if default_carton_type in CARTON_TYPES else 0
+        )
         
-        with st.form("data_entry_form", clear_on_submit=False):
-            # Create columns for better layout
-            col1, col2, col3 = st.columns(3)
-            
-            # Container for machine data inputs
-            machine_data = {}
-            
-            # Create input fields for each machine
-            for machine_number in range(9, 21):
-                machine_name = f"Machine {machine_number}"
-                machine_type = get_machine_type(machine_number)
-                
-                with st.expander(f"{machine_name} ({machine_type})"):
-                    # Default values from existing data if available
-                    default_carton_type = form_data.get(machine_name, {}).get('carton_type', 'A02D')
-                    default_packers = form_data.get(machine_name, {}).get('packers', 1)
-                    default_cartons_packed = form_data.get(machine_name, {}).get('cartons_packed', 0)
-                    default_inventory = form_data.get(machine_name, {}).get('inventory', 'Wrapped')
-                    
-                    # Input fields
-                    carton_type = st.selectbox(
-                        "Carton Type", 
-                        ["A02D", "A07D", "E10D", "A11D", "E15D", "A15C"],
-                        key=f"{machine_name}_carton_type",
-                        index=["A02D", "A07D", "E10D", "A11D", "E15D", "A15C"].index(default_carton_type)
-                    )
-                    
-                    packers = st.number_input(
-                        "Number of Packers", 
-                        min_value=0, 
-                        max_value=10, 
-                        value=default_packers,
-                        key=f"{machine_name}_packers"
-                    )
-                    
-                    cartons_packed = st.number_input(
-                        "Cartons Packed This Hour", 
-                        min_value=0, 
-                        value=default_cartons_packed,
-                        key=f"{machine_name}_cartons_packed"
-                    )
-                    
-                    inventory = st.selectbox(
-                        "Inventory Status", 
-                        ["Wrapped", "Labelled", "Wrapped and Labelled", "Unlabelled", "Other"],
-                        key=f"{machine_name}_inventory",
-                        index=["Wrapped", "Labelled", "Wrapped and Labelled", "Unlabelled", "Other"].index(default_inventory)
-                    )
-                    
-                    # Calculate utilization metrics
-                    capacity = get_machine_capacity(machine_number, carton_type)
-                    utilization = calculate_utilization(cartons_packed, capacity)
-                    cartons_per_packer = cartons_packed / packers if packers > 0 else 0
-                    
-                    # Display metrics with color coding
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        if utilization < 70:
-                            st.markdown(f"<div class='red-highlight'>Utilization: {utilization:.1f}%</div>", unsafe_allow_html=True)
-                        else:
-                            st.markdown(f"Utilization: {utilization:.1f}%")
-                    
-                    with col2:
-                        if cartons_per_packer < 11 and packers > 0:
-                            st.markdown(f"<div class='red-highlight'>Cartons per Packer: {cartons_per_packer:.1f}</div>", unsafe_allow_html=True)
-                        else:
-                            st.markdown(f"Cartons per Packer: {cartons_per_packer:.1f}")
-                    
-                    # Store machine data
-                    machine_data[machine_name] = {
-                        'carton_type': carton_type,
-                        'packers': packers,
-                        'cartons_packed': cartons_packed,
-                        'inventory': inventory,
-                        'capacity': capacity,
-                        'utilization': utilization,
-                        'cartons_per_packer': cartons_per_packer
-                    }
+        packers = st.number_input(
+            "Number of Packers", 
+            min_value=0, 
+            max_value=10, 
+            value=default_packers,
+            key=f"{machine_name}_packers"
+        )
+        
+        cartons_packed = st.number_input(
+            "Cartons Packed This Hour", 
+            min_value=0, 
+            value=default_cartons_packed,
+            key=f"{machine_name}_cartons_packed"
+        )
+        
+        inventory = st.selectbox(
+            "Inventory Status", 
+            INVENTORY_TYPES,
+            key=f"{machine_name}_inventory",
+            index=INVENTORY_TYPES.index(default_inventory) if default_inventory in INVENTORY_TYPES else 0
+        )
+        
+        # Calculate utilization metrics
+        entry = machine_entry(machine_number, carton_type, packers, cartons_packed, inventory)
+        utilization = entry['utilization']
+        cartons_per_packer = entry['cartons_per_packer']
+        
+        # Display metrics with color coding
+        col1, col2 = st.columns(2)
+        with col1:
+            if utilization < 70:
+                st.markdown(f"<div class='red-highlight'>Utilization: {utilization:.1f}%</div>", unsafe_allow_html=True)
+            else:
+                st.markdown(f"Utilization: {utilization:.1f}%")
+        
+        with col2:
+            if cartons_per_packer < 11 and packers > 0:
+                st.markdown(f"<div class='red-highlight'>Cartons per Packer: {cartons_per_packer:.1f}</div>", unsafe_allow_html=True)
+            else:
+                st.markdown(f"Cartons per Packer: {cartons_per_packer:.1f}")
+
+def entered_machine_data():
+    """
+    Collect the values of every machine panel from the session state.
+    
+    Returns:
+        dict: Machine name -> machine values, as saved with the hourly record
+    """
+    machine_data = {}
+    for machine_number in MACHINE_NUMBERS:
+        machine_name = f"Machine {machine_number}"
+        machine_data[machine_name] = machine_entry(
+            machine_number,
+            st.session_state[f"{machine_name}_carton_type"],
+            st.session_state[f"{machine_name}_packers"],
+            st.session_state[f"{machine_name}_cartons_packed"],
+            st.session_state[f"{machine_name}_inventory"]
+        )
+    return machine_data
+
+@st.fragment
+def save_section(timestamp, selected_date, selected_hour):
+    """
+    Save button for the data entry form, followed by the image export.
+    
+    Runs as a fragment so saving does not rebuild the machine panels.
+    
+    Args:
+        timestamp (str): Timestamp identifier (format: "YYYY-MM-DD_HH")
+        selected_date (datetime.date): Date being entered
+        selected_hour (int): Hour being entered
+    """
+    if st.button("Save Data"):
+        machine_data = entered_machine_data()
+        
+        # Add metadata to the data
+        data_to_save = {
+            'timestamp': timestamp,
+            'date': str(selected_date),
+            'hour': selected_hour,
+            'username': st.session_state.username,
+            'machines': machine_data
+        }
+        
+        # Version of the record the form was filled in from, so a save made by
+        # someone else in between is detected instead of overwritten
+        expected_version = st.session_state.form_versions.get(timestamp)
+        
+        # Save the data
+        try:
+            saved = data_handler.save_data(timestamp, data_to_save, expected_version=expected_version)
+        except ConflictError:
+            saved = None
+            st.session_state.form_versions[timestamp] = data_handler.load_data(timestamp, with_version=True)[1]
+            st.error(
+                f"Data for {selected_date} at {selected_hour}:00 was saved by someone else "
+                "after you opened it. Check the values and press Save again to overwrite."
+            )
+        
+        if saved:
+            # Re-read rather than hash data_to_save: backends may normalize
+            # values (e.g. 0 -> 0.0), which changes the version
+            st.session_state.form_versions[timestamp] = data_handler.load_data(timestamp, with_version=True)[1]
+            st.success(f"Data saved successfully for {selected_date} at {selected_hour}:00")
             
-            # Submit button
-            submitted = st.form_submit_button("Save Data")
+            # Store the saved data in session state for export
+            st.session_state.last_saved_data = {
+                'machine_data': machine_data,
+                'date': str(selected_date),
+                'hour': selected_hour,
+                'username': st.session_state.username
+            }
+        elif saved is not None:
+            st.error("Data could not be saved. Please try again.")
+    
+    export_image_section()
+
+@st.fragment
+def export_image_section():
+    """
+    Image export of the last saved hour. Runs as a fragment.
+    """
+    if st.session_state.last_saved_data is None:
+        return
+    
+    st.subheader("Export Data as Image")
+    st.write("Create a downloadable image snapshot of the current hour's data:")
+    
+    if st.button("Generate Image for Download"):
+        from NaranjaMachineTracker.report_image import hourly_data_png, image_filename
+        
+        # Rendered once per content of the hour, then served from the image cache
+        saved_data = st.session_state.last_saved_data
+        png = hourly_data_png(
+            saved_data['machine_data'], 
+            saved_data['date'], 
+            saved_data['hour'], 
+            saved_data['username']
+        )
+        
+        # The bytes are fetched by the browser on click, not sent with the page
+        st.download_button(
+            "📥 Download Image",
+            data=png,
+            file_name=image_filename(saved_data['date'], saved_data['hour']),
+            mime="image/png",
+            on_click="ignore"
+        )
+        st.info("Tap the download button above to save the image to your device.")
+
+def data_entry_view(selected_date, selected_hour):
+    """
+    Render the data entry page for one hour.
+    
+    Args:
+        selected_date (datetime.date): Date being entered
+        selected_hour (int): Hour being entered
+    """
+    st.title("Machine Utilization Data Entry")
+    st.subheader(f"Date: {selected_date} | Hour: {selected_hour}:00")
+    
+    # Load existing data for the selected date and hour if available
+    timestamp = f"{selected_date}_{selected_hour}"
+    existing_data, existing_version = data_handler.load_data(timestamp, with_version=True)
+    
+    # The panels are filled in from this version; edits and saves rerun only
+    # their fragments, so it stays the expected version until the next full run
+    st.session_state.form_versions[timestamp] = existing_version
+    
+    # Initialize form data with existing data or empty values
+    form_data = {}
+    if existing_data is not None:
+        form_data = existing_data['machines']
+    
+    # Create input fields for each machine
+    for machine_number in MACHINE_NUMBERS:
+        machine_panel(machine_number, form_data.get(f"Machine {machine_number}", {}))
+    
+    save_section(timestamp, selected_date, selected_hour)
+
+@st.fragment
+def hour_export_section(daily_data, selected_date):
+    """
+    Image export of one hour of the Daily Report. Runs as a fragment.
+    
+    Args:
+        daily_data (list): Hourly records of the day
+        selected_date (datetime.date): Date of the report
+    """
+    st.subheader("Export Hourly Data as Image")
+    
+    # Select which hour to export
+    hours_with_data = sorted(list(set([d['hour'] for d in daily_data])))
+    if hours_with_data:
+        selected_export_hour = st.selectbox(
+            "Select hour to export:", 
+            hours_with_data,
+            format_func=lambda h: f"{h}:00"
+        )
+        
+        if st.button("Generate Image for Selected Hour"):
+            # Find the data for the selected hour
+            hour_data = next((d for d in daily_data if d['hour'] == selected_export_hour), None)
             
-            if submitted:
-                # Add metadata to the data
-                data_to_save = {
-                    'timestamp': timestamp,
-                    'date': str(selected_date),
-                    'hour': selected_hour,
-                    'username': st.session_state.username,
-                    'machines': machine_data
-                }
+            if hour_data:
+                from NaranjaMachineTracker.report_image import hourly_data_png, image_filename
                 
-                # Save the data
-                data_handler.save_data(timestamp, data_to_save)
-                st.success(f"Data saved successfully for {selected_date} at {selected_hour}:00")
+                png = hourly_data_png(
+                    hour_data['machines'], 
+                    str(selected_date), 
+                    selected_export_hour, 
+                    hour_data['username']
+                )
                 
-                # Store the saved data in session state for export
-                st.session_state.last_saved_data = {
-                    'machine_data': machine_data,
-                    'date': str(selected_date),
-                    'hour': selected_hour,
-                    'username': st.session_state.username
-                }
+                st.download_button(
+                    "📥 Download Image",
+                    data=png,
+                    file_name=image_filename(selected_date, selected_export_hour),
+                    mime="image/png",
+                    on_click="ignore"
+                )
+                st.info("Tap the download button above to save the image to your device.")
         
-        # Export image section (outside of form)
-        if st.session_state.last_saved_data is not None:
-            st.subheader("Export Data as Image")
-            st.write("Create a downloadable image snapshot of the current hour's data:")
+        # Batch export: one image per hour of a day or shift, in a ZIP file
+        if len(hours_with_data) > 1:
+            first_hour, last_hour = st.select_slider(
+                "Hours to export together:",
+                options=hours_with_data,
+                value=(hours_with_data[0], hours_with_data[-1]),
+                format_func=lambda h: f"{h}:00"
+            )
             
-            if st.button("Generate Image for Download"):
-                # Create an image with the hourly data
-                saved_data = st.session_state.last_saved_data
-                img = create_hourly_data_image(
-                    saved_data['machine_data'], 
-                    saved_data['date'], 
-                    saved_data['hour'], 
-                    saved_data['username']
-                )
+            if st.button("Generate Images for Hours"):
+                from NaranjaMachineTracker.report_image import hourly_data_zip
                 
-                # Generate download link
-                filename = f"machine_data_{saved_data['date']}_{saved_data['hour']}.png"
-                download_link = get_image_download_link(img, filename, "📥 Download Image")
+                batch = [d for d in daily_data if first_hour <= d['hour'] <= last_hour]
+                with st.spinner(f"Rendering {len(batch)} images..."):
+                    archive = hourly_data_zip(batch)
                 
-                # Display download link
-                st.markdown(download_link, unsafe_allow_html=True)
-                st.info("Tap the green download button above to save the image to your device.")
+                st.download_button(
+                    "📥 Download Images (ZIP)",
+                    data=archive,
+                    file_name=f"machine_data_{selected_date}_{first_hour}-{last_hour}.zip",
+                    mime="application/zip",
+                    on_click="ignore"
+                )
+        else:
+            first_hour = last_hour = hours_with_data[0]
+        
+        pdf_report_section(selected_date, selected_date, first_hour, last_hour)
+
+def pdf_report_section(start_date, end_date, first_hour=0, last_hour=23):
+    """
+    Button that builds the multi-page PDF report of a date range and offers it
+    for download.
     
-    elif st.session_state.view_mode == "daily_report":
-        st.title("Daily Machine Utilization Report")
-        st.subheader(f"Date: {selected_date}")
+    Args:
+        start_date (datetime.date): First day of the report
+        end_date (datetime.date): Last day of the report
+        first_hour (int): First hour of the shift
+        last_hour (int): Last hour of the shift
+    """
+    if st.button("Generate PDF Report", key=f"pdf_report_{start_date}_{end_date}"):
+        from NaranjaMachineTracker.pdf_report import generate_report
         
-        # Load all data for the selected date
-        daily_data = data_handler.load_daily_data(str(selected_date))
+        buffered = io.BytesIO()
+        with st.spinner("Rendering report pages..."):
+            pages = generate_report(data_handler, str(start_date), str(end_date), buffered, first_hour, last_hour)
         
-        if not daily_data:
-            st.warning(f"No data available for {selected_date}")
-        else:
-            # Display summary statistics
-            st.subheader("Summary Statistics")
-            
+        period = f"{start_date}" if start_date == end_date else f"{start_date}_{end_date}"
+        hours = "" if (first_hour, last_hour) == (0, 23) else f"_{first_hour}-{last_hour}"
+        st.download_button(
+            f"📥 Download PDF Report ({pages} pages)",
+            data=buffered.getvalue(),
+            file_name=f"machine_report_{period}{hours}.pdf",
+            mime="application/pdf",
+            on_click="ignore"
+        )
+
+def daily_report_view(selected_date):
+    """
+    Render the Daily Report for one date.
+    
+    Args:
+        selected_date (datetime.date): Date of the report
+    """
+    import pandas as pd
+    from NaranjaMachineTracker.visualization import plot_daily_utilization, plot_inventory_impact
+    
+    st.title("Daily Machine Utilization Report")
+    st.subheader(f"Date: {selected_date}")
+    
+    # Load all data for the selected date
+    daily_data = data_handler.load_daily_data(str(selected_date))
+    
+    if not daily_data:
+        st.warning(f"No data available for {selected_date}")
+    else:
+        # Display summary statistics
+        st.subheader("Summary Statistics")
+        
+        with timer("app.daily_report.summary"):
             # Calculate daily averages per machine
-            machine_averages = {}
-            for machine_number in range(9, 21):
-                machine_name = f"Machine {machine_number}"
-                machine_type = get_machine_type(machine_number)
-                
-                # Initialize counters
-                total_utilization = 0
-                total_cartons_per_packer = 0
-                total_cartons = 0
-                data_points = 0
-                
-                # Collect data from all hours
-                for data in daily_data:
-                    if machine_name in data['machines']:
-                        machine_data = data['machines'][machine_name]
-                        total_utilization += machine_data['utilization']
-                        total_cartons += machine_data['cartons_packed']
-                        if machine_data['packers'] > 0:
-                            total_cartons_per_packer += machine_data['cartons_per_packer']
-                        data_points += 1
-                
-                # Calculate averages
-                if data_points > 0:
-                    avg_utilization = total_utilization / data_points
-                    avg_cartons_per_packer = total_cartons_per_packer / data_points
-                    
-                    machine_averages[machine_name] = {
-                        'type': machine_type,
-                        'avg_utilization': avg_utilization,
-                        'avg_cartons_per_packer': avg_cartons_per_packer,
-                        'total_cartons': total_cartons
-                    }
+            machine_averages = data_handler.machine_averages(str(selected_date))
             
             # Display machine averages in a table
+            df_averages = None
             if machine_averages:
                 df_averages = pd.DataFrame.from_dict(machine_averages, orient='index')
                 df_averages = df_averages.reset_index().rename(columns={'index': 'Machine'})
@@ -513,200 +635,361 @@ else:
                 
                 # Rename columns for display
                 df_averages.columns = ['Machine', 'Type', 'Avg. Utilization', 'Avg. Cartons per Packer', 'Total Cartons']
-                
-                st.dataframe(df_averages)
-            
-            # Visualize daily utilization
-            st.subheader("Hourly Utilization")
-            fig = plot_daily_utilization(daily_data)
+        
+        if df_averages is not None:
+            st.dataframe(df_averages)
+        
+        # Visualize daily utilization
+        st.subheader("Hourly Utilization")
+        with timer("app.daily_report.figures"):
+            figure_cache = get_figure_cache()
+            fig = figure_cache.get('daily_utilization', str(selected_date), daily_data, plot_daily_utilization)
+            fig_inventory = figure_cache.get('inventory_impact', str(selected_date), daily_data, plot_inventory_impact)
+        st.plotly_chart(fig, use_container_width=True)
+        
+        # Visualize inventory impact
+        st.subheader("Inventory Impact Analysis")
+        st.plotly_chart(fig_inventory, use_container_width=True)
+        
+        # Add option to export hourly data as image
+        hour_export_section(daily_data, selected_date)
+
+def trend_analysis_view():
+    """
+    Render the Trend Analysis page.
+    """
+    import pandas as pd
+    from NaranjaMachineTracker.visualization import plot_utilization_trend
+    
+    current_date = datetime.date.today()
+    
+    st.title("Trend Analysis")
+    
+    # Date range selection
+    col1, col2 = st.columns(2)
+    with col1:
+        start_date = st.date_input("Start Date", value=current_date - datetime.timedelta(days=7))
+    with col2:
+        end_date = st.date_input("End Date", value=current_date)
+    
+    # Longer ranges read better as weekly or monthly buckets from the rollups;
+    # Hour plots every recorded hour and is downsampled to the chart width
+    group_by = st.selectbox("Group by", ["Day", "Week", "Month", "Hour"])
+    
+    if start_date > end_date:
+        st.error("Start date cannot be after end date")
+        return
+    
+    if group_by == "Hour":
+        hourly_trend_section(start_date, end_date)
+    else:
+        # Aggregate data by date
+        with timer("app.trend.aggregate"):
+            if group_by == "Day":
+                daily_avg = data_handler.daily_average_utilization(str(start_date), str(end_date))
+                daily_inventory = data_handler.daily_inventory_utilization(str(start_date), str(end_date))
+            else:
+                period = "weekly" if group_by == "Week" else "monthly"
+                trend = data_handler.utilization_trend(str(start_date), str(end_date), period, "all")
+                daily_avg = {bucket: averages['all'] for bucket, averages in trend.items()}
+                daily_inventory = data_handler.utilization_trend(str(start_date), str(end_date), period, "inventory")
+        
+        if not daily_avg:
+            st.warning(f"No data available for the selected date range")
+        else:
+            # Plot trend
+            average_trend = pd.DataFrame({'Average Utilization': pd.Series(daily_avg)})
+            fig = plot_utilization_trend(
+                average_trend,
+                "Average Daily Machine Utilization" if group_by == "Day" else f"Average Machine Utilization by {group_by}",
+                max_points=trend_point_budget()
+            )
             st.plotly_chart(fig, use_container_width=True)
             
-            # Visualize inventory impact
-            st.subheader("Inventory Impact Analysis")
-            fig_inventory = plot_inventory_impact(daily_data)
-            st.plotly_chart(fig_inventory, use_container_width=True)
+            # Inventory impact over time
+            st.subheader("Inventory Impact Over Time")
             
-            # Add option to export hourly data as image
-            st.subheader("Export Hourly Data as Image")
+            # One column per inventory status, in the usual order
+            inventory_trend = pd.DataFrame.from_dict(daily_inventory, orient='index')
+            inventory_trend = inventory_trend[[inv_type for inv_type in INVENTORY_TYPES if inv_type in inventory_trend.columns]]
             
-            # Select which hour to export
-            hours_with_data = sorted(list(set([d['hour'] for d in daily_data])))
-            if hours_with_data:
-                selected_export_hour = st.selectbox(
-                    "Select hour to export:", 
-                    hours_with_data,
-                    format_func=lambda h: f"{h}:00"
+            # Plot inventory impact trend
+            if not inventory_trend.empty:
+                fig = plot_utilization_trend(
+                    inventory_trend,
+                    "Inventory Impact on Machine Utilization",
+                    max_points=trend_point_budget(),
+                    reference_line=False
                 )
-                
-                if st.button("Generate Image for Selected Hour"):
-                    # Find the data for the selected hour
-                    hour_data = next((d for d in daily_data if d['hour'] == selected_export_hour), None)
-                    
-                    if hour_data:
-                        # Create an image with the hourly data
-                        img = create_hourly_data_image(
-                            hour_data['machines'], 
-                            str(selected_date), 
-                            selected_export_hour, 
-                            hour_data['username']
-                        )
-                        
-                        # Generate download link
-                        filename = f"machine_data_{selected_date}_{selected_export_hour}.png"
-                        download_link = get_image_download_link(img, filename, "📥 Download Image")
-                        
-                        # Display download link
-                        st.markdown(download_link, unsafe_allow_html=True)
-                        st.info("Tap the green download button above to save the image to your device.")
-    
-    elif st.session_state.view_mode == "trend_analysis":
-        st.title("Trend Analysis")
-        
-        # Date range selection
-        col1, col2 = st.columns(2)
-        with col1:
-            start_date = st.date_input("Start Date", value=current_date - datetime.timedelta(days=7))
-        with col2:
-            end_date = st.date_input("End Date", value=current_date)
-        
-        if start_date > end_date:
-            st.error("Start date cannot be after end date")
+                st.plotly_chart(fig, use_container_width=True)
+    
+    # Summary, charts and hourly tables of the whole range
+    st.subheader("PDF Report")
+    pdf_report_section(start_date, end_date)
+
+def trend_point_budget():
+    """
+    Points per line that trend charts are downsampled to.
+    
+    Streamlit does not report the width a chart is drawn at, so the width is
+    a setting (NARANJA_TREND_WIDTH_PX, default: the width of the centered layout).
+    
+    Returns:
+        int: Point budget per line
+    """
+    from NaranjaMachineTracker.downsample import point_budget
+    
+    return point_budget(int(os.environ.get("NARANJA_TREND_WIDTH_PX", str(TREND_CHART_WIDTH_PX))))
+
+def hourly_trend_section(start_date, end_date):
+    """
+    Render the hourly trend charts for a date range.
+    
+    The whole range is shown downsampled to the point budget. Narrowing the
+    visible window re-queries that window, so zooming in shows the hours at
+    full resolution once they fit the budget.
+    
+    Args:
+        start_date (datetime.date): First day of the range
+        end_date (datetime.date): Last day of the range
+    """
+    from NaranjaMachineTracker.visualization import plot_utilization_trend
+    
+    with timer("app.hourly_trend.aggregate"):
+        overview = data_handler.hourly_utilization_trend(str(start_date), str(end_date), "all")
+    
+    if overview.empty:
+        st.warning(f"No data available for the selected date range")
+        return
+    
+    first_hour = overview.index[0].to_pydatetime()
+    last_hour = overview.index[-1].to_pydatetime()
+    
+    window_start, window_end = first_hour, last_hour
+    if last_hour > first_hour:
+        # Keyed by the range so that a new range starts fully zoomed out
+        window_start, window_end = st.slider(
+            "Visible window",
+            min_value=first_hour,
+            max_value=last_hour,
+            value=(first_hour, last_hour),
+            step=datetime.timedelta(hours=1),
+            format="YYYY-MM-DD HH:00",
+            key=f"hourly_window_{start_date}_{end_date}"
+        )
+    
+    with timer("app.hourly_trend.aggregate"):
+        if (window_start, window_end) == (first_hour, last_hour):
+            average_trend = overview
+            inventory_trend = data_handler.hourly_utilization_trend(str(start_date), str(end_date), "inventory")
         else:
-            # Load data for the selected date range
-            all_data = data_handler.load_date_range_data(str(start_date), str(end_date))
-            
-            if not all_data:
-                st.warning(f"No data available for the selected date range")
-            else:
-                # Aggregate data by date
-                dates = []
-                daily_avg_utilization = []
-                
-                current = start_date
-                while current <= end_date:
-                    daily_data = [d for d in all_data if d['date'] == str(current)]
-                    
-                    if daily_data:
-                        # Calculate average utilization across all machines for this day
-                        total_utilization = 0
-                        data_points = 0
-                        
-                        for data in daily_data:
-                            for machine_name, machine_data in data['machines'].items():
-                                total_utilization += machine_data['utilization']
-                                data_points += 1
-                        
-                        if data_points > 0:
-                            avg_utilization = total_utilization / data_points
-                            dates.append(current)
-                            daily_avg_utilization.append(avg_utilization)
-                    
-                    current += datetime.timedelta(days=1)
-                
-                # Plot trend
-                if dates:
-                    import plotly.graph_objects as go
-                    
-                    fig = go.Figure()
-                    fig.add_trace(go.Scatter(
-                        x=dates, 
-                        y=daily_avg_utilization,
-                        mode='lines+markers',
-                        name='Average Utilization'
-                    ))
-                    
-                    # Add reference line at 70%
-                    fig.add_shape(
-                        type="line",
-                        x0=min(dates),
-                        y0=70,
-                        x1=max(dates),
-                        y1=70,
-                        line=dict(
-                            color="red",
-                            width=2,
-                            dash="dash",
-                        )
-                    )
-                    
-                    fig.update_layout(
-                        title="Average Daily Machine Utilization",
-                        xaxis_title="Date",
-                        yaxis_title="Utilization (%)",
-                        yaxis=dict(range=[0, 100]),
-                        showlegend=True
-                    )
-                    
-                    st.plotly_chart(fig, use_container_width=True)
-                    
-                    # Inventory impact over time
-                    st.subheader("Inventory Impact Over Time")
-                    
-                    # Collect data for inventory analysis
-                    inventory_types = ["Wrapped", "Labelled", "Wrapped and Labelled", "Unlabelled", "Other"]
-                    inventory_data = {inv_type: [] for inv_type in inventory_types}
-                    inventory_dates = []
-                    
-                    current = start_date
-                    while current <= end_date:
-                        daily_data = [d for d in all_data if d['date'] == str(current)]
-                        
-                        if daily_data:
-                            inventory_dates.append(current)
-                            
-                            # Initialize counters for this date
-                            inv_utilization = {inv_type: {'total': 0, 'count': 0} for inv_type in inventory_types}
-                            
-                            # Collect data for each inventory type
-                            for data in daily_data:
-                                for machine_name, machine_data in data['machines'].items():
-                                    inv_type = machine_data['inventory']
-                                    inv_utilization[inv_type]['total'] += machine_data['utilization']
-                                    inv_utilization[inv_type]['count'] += 1
-                            
-                            # Calculate averages and append to data
-                            for inv_type in inventory_types:
-                                if inv_utilization[inv_type]['count'] > 0:
-                                    avg = inv_utilization[inv_type]['total'] / inv_utilization[inv_type]['count']
-                                else:
-                                    avg = None
-                                inventory_data[inv_type].append(avg)
-                        
-                        current += datetime.timedelta(days=1)
-                    
-                    # Plot inventory impact trend
-                    if inventory_dates:
-                        fig = go.Figure()
-                        
-                        for inv_type in inventory_types:
-                            # Filter out None values
-                            valid_indices = [i for i, val in enumerate(inventory_data[inv_type]) if val is not None]
-                            valid_dates = [inventory_dates[i] for i in valid_indices]
-                            valid_data = [inventory_data[inv_type][i] for i in valid_indices]
-                            
-                            if valid_data:
-                                fig.add_trace(go.Scatter(
-                                    x=valid_dates, 
-                                    y=valid_data,
-                                    mode='lines+markers',
-                                    name=inv_type
-                                ))
-                        
-                        fig.update_layout(
-                            title="Inventory Impact on Machine Utilization",
-                            xaxis_title="Date",
-                            yaxis_title="Utilization (%)",
-                            yaxis=dict(range=[0, 100]),
-                            showlegend=True
-                        )
-                        
-                        st.plotly_chart(fig, use_container_width=True)
-                else:
-                    st.warning("Insufficient data to generate trend analysis")
+            # Re-query only the days in the window, then trim to its hours
+            window_dates = (str(window_start.date()), str(window_end.date()))
+            average_trend = data_handler.hourly_utilization_trend(*window_dates, "all").loc[window_start:window_end]
+            inventory_trend = data_handler.hourly_utilization_trend(*window_dates, "inventory").loc[window_start:window_end]
+    
+    budget = trend_point_budget()
+    
+    fig = plot_utilization_trend(
+        average_trend.rename(columns={'all': 'Average Utilization'}),
+        "Average Hourly Machine Utilization",
+        xaxis_title="Time",
+        max_points=budget
+    )
+    st.plotly_chart(fig, use_container_width=True)
+    
+    total_points = len(average_trend)
+    if total_points > budget:
+        st.caption(f"Showing {budget:,} of {total_points:,} hours; narrow the visible window for full resolution.")
+    
+    st.subheader("Inventory Impact Over Time")
+    
+    inventory_trend = inventory_trend[[inv_type for inv_type in INVENTORY_TYPES if inv_type in inventory_trend.columns]]
+    if not inventory_trend.empty:
+        fig = plot_utilization_trend(
+            inventory_trend,
+            "Inventory Impact on Machine Utilization",
+            xaxis_title="Time",
+            max_points=budget,
+            reference_line=False
+        )
+        st.plotly_chart(fig, use_container_width=True)
 
-# Logout button
-if st.session_state.authenticated:
-    if st.sidebar.button("Logout"):
-        st.session_state.authenticated = False
-        st.session_state.username = ""
-        st.rerun()
+def is_admin():
+    """
+    Whether the logged-in user may see the admin panels.
+    
+    Returns:
+        bool: True for users listed in NARANJA_ADMIN_USERS
+    """
+    return st.session_state.get('authenticated', False) and st.session_state.get('username') in ADMIN_USERS
+
+def timing_panel():
+    """
+    Render the admin-only sidebar panel with stage timings: the stages of
+    the rerun that just finished and p50/p95 per stage over recent reruns.
+    """
+    import pandas as pd
+    
+    with st.sidebar.expander("Timings"):
+        recording = st.toggle("Record timings", value=instrumentation.enabled())
+        if recording != instrumentation.enabled():
+            # Takes effect from the next rerun, which the toggle just started
+            instrumentation.set_enabled(recording)
+            st.rerun()
+        
+        if not recording:
+            st.caption("Timing is off; timed functions run with no measurement.")
+            return
+        
+        stages = instrumentation.rerun_stages()
+        if stages:
+            st.markdown("**This rerun**")
+            st.dataframe(
+                pd.DataFrame([(stage, seconds * 1000) for stage, seconds in stages], columns=['Stage', 'ms']),
+                hide_index=True,
+                column_config={'ms': st.column_config.NumberColumn(format="%.1f")}
+            )
+        
+        summary = instrumentation.snapshot()
+        if summary:
+            st.markdown("**Recent reruns**")
+            st.dataframe(
+                pd.DataFrame.from_dict(summary, orient='index')[['count', 'p50_ms', 'p95_ms', 'max_ms']],
+                column_config={
+                    column: st.column_config.NumberColumn(format="%.1f")
+                    for column in ('p50_ms', 'p95_ms', 'max_ms')
+                }
+            )
+            st.caption(f"Written to {TIMINGS_DUMP_PATH} every {instrumentation.DUMP_INTERVAL}s")
+            st.download_button(
+                "Download (Prometheus)",
+                data=instrumentation.prometheus_text(),
+                file_name="timings.prom",
+                mime="text/plain",
+                on_click="ignore"
+            )
+        
+        if st.button("Reset timings"):
+            instrumentation.reset()
+            st.rerun()
+
+def profiling_panel():
+    """
+    Render the admin-only sidebar panel to profile this session or the next
+    rerun, with a summary and downloads of the latest capture.
+    """
+    import pandas as pd
+    
+    with st.sidebar.expander("Profiling"):
+        profile_session = st.toggle("Profile this session", value=st.session_state.get('profile_session', False))
+        if profile_session != st.session_state.get('profile_session', False):
+            st.session_state.profile_session = profile_session
+            st.rerun()
+        
+        if st.button("Profile next rerun"):
+            st.session_state.profile_next_rerun = True
+            st.rerun()
+        
+        last_profile = st.session_state.get('last_profile')
+        if not last_profile or not os.path.exists(last_profile['pstats']):
+            st.caption(f"Captures are saved to {PROFILE_DIR}")
+            return
+        
+        st.markdown(f"**Last capture** ({last_profile['seconds'] * 1000:.0f} ms, {last_profile['samples']} samples)")
+        st.dataframe(
+            pd.DataFrame(profiling.top_functions(last_profile['pstats'], limit=10)),
+            hide_index=True,
+            column_config={
+                column: st.column_config.NumberColumn(format="%.4f")
+                for column in ('tottime', 'cumtime')
+            }
+        )
+        for key, label in (('pstats', "Download .pstats"), ('collapsed', "Download collapsed stacks")):
+            with open(last_profile[key], 'rb') as f:
+                st.download_button(
+                    label,
+                    data=f.read(),
+                    file_name=os.path.basename(last_profile[key]),
+                    on_click="ignore"
+                )
+        st.caption(f"{len(profiling.list_captures(PROFILE_DIR))} captures in {PROFILE_DIR}")
+
+def profiling_requested():
+    """
+    Decide whether to profile this rerun, from the admin panel's settings
+    and, where allowed, the profile query parameter.
+    
+    Returns:
+        bool: True to profile this rerun
+    """
+    mode = st.query_params.get("profile") if PROFILE_QUERY_ENABLED else None
+    if mode == "session":
+        st.session_state.profile_session = True
+    elif mode == "off":
+        st.session_state.profile_session = False
+    elif mode == "once":
+        # Drop the parameter so that only this rerun is profiled
+        del st.query_params["profile"]
+        return True
+    
+    if st.session_state.pop('profile_next_rerun', False):
+        return True
+    return st.session_state.get('profile_session', False)
+
+def render_page():
+    """
+    Render the login form or the selected view.
+    """
+    init_session_state()
+    inject_css()
+    
+    if not st.session_state.authenticated:
+        login_view()
+        return
+    
+    # Start building recent Daily Report figures in the background
+    get_figure_cache()
+    
+    selected_date, selected_hour, selected_view = sidebar()
+    
+    if selected_view == "Data Entry":
+        st.session_state.view_mode = "data_entry"
+    elif selected_view == "Daily Report":
+        st.session_state.view_mode = "daily_report"
+    else:
+        st.session_state.view_mode = "trend_analysis"
+    
+    if st.session_state.view_mode == "data_entry":
+        data_entry_view(selected_date, selected_hour)
+    elif st.session_state.view_mode == "daily_report":
+        daily_report_view(selected_date)
+    else:
+        trend_analysis_view()
+    
+    logout_button()
+
+def main():
+    instrumentation.begin_rerun()
+    
+    if profiling_requested():
+        label = f"{st.session_state.get('username') or 'anonymous'}_{st.session_state.get('view_mode', 'first_run')}"
+        profiler = profiling.capture(PROFILE_DIR, label)
+    else:
+        profiler = nullcontext({})
+    
+    with profiler as profile:
+        with timer("app.rerun"):
+            render_page()
+    if profile:
+        st.session_state.last_profile = profile
+    
+    if is_admin():
+        timing_panel()
+        profiling_panel()
+    instrumentation.maybe_dump(TIMINGS_DUMP_PATH)
+
+# Streamlit runs the script as __main__; importing it (e.g. from the
+# benchmarks) only defines the page functions
+if __name__ == "__main__":
+    main()
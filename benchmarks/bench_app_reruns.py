@@ -0,0 +1,129 @@
+"""
+Time the Streamlit reruns behind common data entry interactions.
+
+AppTest always executes the whole script, so the fragment reruns are timed
+by running just the fragment's function as its own script. This measures
+the same work the server does when only that fragment reruns.
+
+Scenarios:
+    full_page     sidebar change: the whole data entry page
+    machine_edit  editing one machine: its machine_panel fragment
+    save          pressing Save: the save_section fragment
+    full_save     pressing Save when it reran the whole page
+
+Usage:
+    python benchmarks/bench_app_reruns.py [--repeat 10]
+"""
+import argparse
+import datetime
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from streamlit.testing.v1 import AppTest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(REPO_DIR, "app.py")
+sys.path.insert(0, REPO_DIR)
+
+from NaranjaMachineTracker.data_handler import DataHandler  # noqa: E402
+from NaranjaMachineTracker.synthetic import generate_record  # noqa: E402
+from NaranjaMachineTracker.utils import MACHINE_NUMBERS  # noqa: E402
+
+DATE = datetime.date.today()
+HOUR = datetime.datetime.now().hour
+
+
+def machine_panel_script(repo_dir):
+    import sys
+    sys.path.insert(0, repo_dir)
+    import app
+    app.init_session_state()
+    app.machine_panel(9, {})
+
+
+def save_section_script(repo_dir, date_str, hour):
+    import sys
+    import datetime
+    sys.path.insert(0, repo_dir)
+    import app
+    app.init_session_state()
+    app.save_section(f"{date_str}_{hour}", datetime.date.fromisoformat(date_str), hour)
+
+
+def logged_in(at):
+    at.session_state.authenticated = True
+    at.session_state.username = "bench"
+    return at
+
+
+def fill_machine_inputs(at, record):
+    # What the machine panels leave in the session state
+    for machine_name, machine_data in record['machines'].items():
+        for field in ('carton_type', 'packers', 'cartons_packed', 'inventory'):
+            at.session_state[f"{machine_name}_{field}"] = machine_data[field]
+
+
+def time_run(at, action=None):
+    if action is not None:
+        action(at)
+    started = time.perf_counter()
+    at.run()
+    elapsed = time.perf_counter() - started
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    return elapsed
+
+
+def measure(name, make_app, repeat, action=None):
+    timings = []
+    for _ in range(repeat):
+        at = make_app()
+        at.run()
+        timings.append(time_run(at, action))
+    return {'scenario': name, 'median_ms': statistics.median(timings) * 1000, 'min_ms': min(timings) * 1000}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time data entry reruns with AppTest.")
+    parser.add_argument("--repeat", type=int, default=10, help="Runs per scenario (default: 10)")
+    args = parser.parse_args(argv)
+
+    # The app reads ./data, so work in a scratch directory with one saved hour
+    os.chdir(tempfile.mkdtemp(prefix="bench_app_"))
+    record = generate_record(str(DATE), HOUR)
+    DataHandler("data").save_data(record['timestamp'], record)
+
+    def full_page():
+        return logged_in(AppTest.from_file(APP_PATH, default_timeout=60))
+
+    def machine_panel():
+        return AppTest.from_function(machine_panel_script, args=(REPO_DIR,), default_timeout=60)
+
+    def save_section():
+        at = logged_in(AppTest.from_function(save_section_script, args=(REPO_DIR, str(DATE), HOUR),
+                                             default_timeout=60))
+        fill_machine_inputs(at, record)
+        return at
+
+    def click_save(at):
+        next(button for button in at.button if button.label == "Save Data").click()
+
+    results = [
+        measure("full_page", full_page, args.repeat),
+        measure("machine_edit", machine_panel, args.repeat,
+                lambda at: at.number_input(key="Machine 9_packers").set_value(2)),
+        measure("save", save_section, args.repeat, click_save),
+        measure("full_save", full_page, args.repeat, click_save)
+    ]
+
+    for result in results:
+        print(f"{result['scenario']:>12}: median {result['median_ms']:.1f} ms, min {result['min_ms']:.1f} ms")
+    print(json.dumps(results))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Measure the cold start of the app: what a fresh server process pays before
+the login form is painted, and what the first report view adds.
+
+Each repetition starts a new Python process (so no module is imported yet),
+imports Streamlit's test harness and then times with AppTest:
+
+    import_app    the module-level imports of app.py, Streamlit excluded
+    login         the first run of the script: the login form
+    first_view    the first logged-in run of a view (--view)
+
+It also lists which heavy libraries were loaded after each step.
+
+Usage:
+    python benchmarks/bench_cold_start.py [--repeat 5] [--view "Daily Report"]
+"""
+import argparse
+import datetime
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(REPO_DIR, "app.py")
+sys.path.insert(0, REPO_DIR)
+
+from NaranjaMachineTracker.data_handler import DataHandler  # noqa: E402
+from NaranjaMachineTracker.synthetic import generate_records  # noqa: E402
+
+HEAVY_MODULES = ['pandas', 'numpy', 'pyarrow', 'plotly.express', 'plotly.graph_objects', 'PIL.Image']
+
+CHILD_SCRIPT = """
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+
+def loaded():
+    return [name for name in HEAVY_MODULES if name in sys.modules]
+
+HEAVY_MODULES = {heavy_modules!r}
+result = {{'preloaded': loaded()}}
+
+at = AppTest.from_file({app_path!r}, default_timeout=120)
+started = time.perf_counter()
+at.run()
+result['login_ms'] = (time.perf_counter() - started) * 1000
+result['after_login'] = loaded()
+
+at.session_state.authenticated = True
+at.session_state.username = "bench"
+at.run()
+at.sidebar.radio[0].set_value({view!r})
+started = time.perf_counter()
+at.run()
+result['first_view_ms'] = (time.perf_counter() - started) * 1000
+result['after_view'] = loaded()
+result['exception'] = [e.message for e in at.exception]
+print(json.dumps(result))
+"""
+
+
+def import_time_ms():
+    # Run the module-level imports of app.py (the lines before its first
+    # Streamlit call) in a fresh process, Streamlit itself excluded
+    with open(APP_PATH, 'r') as f:
+        lines = []
+        for line in f:
+            if line.startswith("st."):
+                break
+            lines.append(line)
+    code = "import streamlit\nimport time\nstarted = time.perf_counter()\n" + "".join(lines) + \
+        "\nprint((time.perf_counter() - started) * 1000)\n"
+    output = subprocess.run([sys.executable, "-c", code], cwd=REPO_DIR, capture_output=True, text=True, check=True)
+    return float(output.stdout.strip().splitlines()[-1])
+
+
+def run_child(view, work_dir):
+    script = CHILD_SCRIPT.format(heavy_modules=HEAVY_MODULES, app_path=APP_PATH, view=view)
+    output = subprocess.run([sys.executable, "-c", script], cwd=work_dir, capture_output=True, text=True, check=True)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure app cold start.")
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh processes per measurement (default: 5)")
+    parser.add_argument("--view", default="Daily Report", help="View opened after logging in (default: Daily Report)")
+    args = parser.parse_args(argv)
+
+    # The app reads ./data; a scratch directory with today's shift gives the
+    # report views something to draw
+    work_dir = tempfile.mkdtemp(prefix="bench_cold_")
+    DataHandler(os.path.join(work_dir, "data")).save_many(list(generate_records(str(datetime.date.today()), 1)))
+
+    imports = [import_time_ms() for _ in range(args.repeat)]
+    runs = [run_child(args.view, work_dir) for _ in range(args.repeat)]
+    if runs[-1]['exception']:
+        raise RuntimeError(runs[-1]['exception'][0])
+
+    result = {
+        'import_app_ms': statistics.median(imports),
+        'login_ms': statistics.median(run['login_ms'] for run in runs),
+        'first_view_ms': statistics.median(run['first_view_ms'] for run in runs),
+        'view': args.view,
+        'loaded_by_harness': runs[-1]['preloaded'],
+        'loaded_after_login': runs[-1]['after_login'],
+        'loaded_after_view': runs[-1]['after_view']
+    }
+
+    print(f"    harness: loaded {', '.join(result['loaded_by_harness']) or '-'}")
+    print(f" import_app: median {result['import_app_ms']:.0f} ms")
+    print(f"      login: median {result['login_ms']:.0f} ms, loaded {', '.join(result['loaded_after_login']) or '-'}")
+    print(f" first_view: median {result['first_view_ms']:.0f} ms ({args.view}), "
+          f"loaded {', '.join(result['loaded_after_view']) or '-'}")
+    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
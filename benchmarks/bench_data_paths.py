@@ -0,0 +1,207 @@
+"""
+Time the storage, aggregation and charting paths at growing history sizes.
+
+For each size, a scratch data directory is filled with that many synthetic
+hourly records, then every operation below is timed through a fresh
+DataHandler (the first run of each also pays for loading indexes):
+
+    save_many                  writing the whole history (once)
+    list_available_dates
+    load_daily_data            the last day
+    load_date_range_data_30d   the last 30 days
+    load_date_range_data_all   the whole history
+    machine_averages           Daily Report summary table
+    daily_average_utilization  Trend Analysis by day, whole history
+    daily_inventory_utilization
+    weekly_trend / monthly_trend
+    hourly_utilization_trend   Trend Analysis by hour, last 30 days
+    plot_daily_utilization / plot_inventory_impact
+    plot_daily_trend           whole history, downsampled to the chart width
+    plot_hourly_trend          last 30 days
+
+Results are written as JSON. Passing an earlier result file with --compare
+prints the ratio of every best time to the earlier one (the best of several
+runs is the least sensitive to a busy machine), so regressions show up run
+to run; the exit status is 1 if any operation got more than 20% slower.
+
+Usage:
+    python benchmarks/bench_data_paths.py [--sizes 1000 10000 100000]
+        [--backend json] [--repeat 3] [--output results.json]
+        [--compare previous.json]
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from NaranjaMachineTracker.data_handler import create_data_handler  # noqa: E402
+from NaranjaMachineTracker.downsample import point_budget  # noqa: E402
+from NaranjaMachineTracker.synthetic import generate_record_count  # noqa: E402
+from NaranjaMachineTracker.utils import INVENTORY_TYPES  # noqa: E402
+from NaranjaMachineTracker.visualization import (  # noqa: E402
+    plot_daily_utilization, plot_inventory_impact, plot_utilization_trend
+)
+
+START_DATE = "2000-01-01"
+
+# Width the app's trend charts are downsampled to (app.TREND_CHART_WIDTH_PX)
+CHART_WIDTH_PX = 700
+
+# Best times this much slower than the compared run are flagged
+REGRESSION_RATIO = 1.2
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def time_operation(operation, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        operation()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def daily_trend_figure(data_handler, start_date, end_date):
+    daily_avg = data_handler.daily_average_utilization(start_date, end_date)
+    trend = pd.DataFrame({'Average Utilization': pd.Series(daily_avg)})
+    return plot_utilization_trend(trend, "Average Daily Machine Utilization",
+                                  max_points=point_budget(CHART_WIDTH_PX))
+
+
+def hourly_trend_figure(data_handler, start_date, end_date):
+    trend = data_handler.hourly_utilization_trend(start_date, end_date, "inventory")
+    trend = trend[[inv_type for inv_type in INVENTORY_TYPES if inv_type in trend.columns]]
+    return plot_utilization_trend(trend, "Inventory Impact on Machine Utilization", xaxis_title="Hour",
+                                  max_points=point_budget(CHART_WIDTH_PX), reference_line=False)
+
+
+def operations(data_handler, first_date, last_date):
+    month_start = str(datetime.date.fromisoformat(last_date) - datetime.timedelta(days=29))
+    daily_data = data_handler.load_daily_data(last_date)
+
+    return {
+        'list_available_dates': lambda: data_handler.list_available_dates(),
+        'load_daily_data': lambda: data_handler.load_daily_data(last_date),
+        'load_date_range_data_30d': lambda: data_handler.load_date_range_data(month_start, last_date),
+        'load_date_range_data_all': lambda: data_handler.load_date_range_data(first_date, last_date),
+        'machine_averages': lambda: data_handler.machine_averages(last_date),
+        'daily_average_utilization': lambda: data_handler.daily_average_utilization(first_date, last_date),
+        'daily_inventory_utilization': lambda: data_handler.daily_inventory_utilization(first_date, last_date),
+        'weekly_trend': lambda: data_handler.utilization_trend(first_date, last_date, "weekly", "all"),
+        'monthly_trend': lambda: data_handler.utilization_trend(first_date, last_date, "monthly", "all"),
+        'hourly_utilization_trend': lambda: data_handler.hourly_utilization_trend(month_start, last_date, "all"),
+        'plot_daily_utilization': lambda: plot_daily_utilization(daily_data),
+        'plot_inventory_impact': lambda: plot_inventory_impact(daily_data),
+        'plot_daily_trend': lambda: daily_trend_figure(data_handler, first_date, last_date),
+        'plot_hourly_trend': lambda: hourly_trend_figure(data_handler, month_start, last_date)
+    }
+
+
+def measure(size, backend, repeat):
+    records = generate_record_count(START_DATE, size)
+    first_date, last_date = records[0]['date'], records[-1]['date']
+
+    data_dir = tempfile.mkdtemp(prefix=f"bench_paths_{size}_")
+    try:
+        started = time.perf_counter()
+        create_data_handler(backend, data_dir).save_many(records)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        results = [{'size': size, 'operation': 'save_many', 'runs': 1,
+                    'first_ms': elapsed_ms, 'median_ms': elapsed_ms, 'min_ms': elapsed_ms}]
+        del records
+
+        # A fresh handler, as after a server restart
+        data_handler = create_data_handler(backend, data_dir)
+        for name, operation in operations(data_handler, first_date, last_date).items():
+            timings = time_operation(operation, repeat)
+            results.append({
+                'size': size,
+                'operation': name,
+                'runs': repeat,
+                'first_ms': timings[0] * 1000,
+                'median_ms': statistics.median(timings) * 1000,
+                'min_ms': min(timings) * 1000
+            })
+        return results
+    finally:
+        shutil.rmtree(data_dir)
+
+
+def compare(results, previous_path):
+    with open(previous_path, 'r') as f:
+        previous = {(row['size'], row['operation']): row for row in json.load(f)['results']}
+
+    regressions = 0
+    for row in results:
+        before = previous.get((row['size'], row['operation']))
+        if before is None or not before['min_ms']:
+            continue
+        ratio = row['min_ms'] / before['min_ms']
+        flag = "  REGRESSION" if ratio > REGRESSION_RATIO else ""
+        regressions += bool(flag)
+        print(f"{row['size']:>7} {row['operation']:>28}: {before['min_ms']:9.1f} -> "
+              f"{row['min_ms']:9.1f} ms ({ratio:.2f}x){flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark storage, aggregation and charting paths.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="History sizes in hourly records (default: 1000 10000 100000)")
+    parser.add_argument("--backend", default="json", help="Storage backend (default: json)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per operation (default: 3)")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Earlier result file to compare against")
+    args = parser.parse_args(argv)
+
+    report = {
+        'meta': {
+            'started': datetime.datetime.now().isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'backend': args.backend,
+            'repeat': args.repeat,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count()
+        },
+        'results': []
+    }
+
+    for size in args.sizes:
+        for row in measure(size, args.backend, args.repeat):
+            report['results'].append(row)
+            print(f"{size:>7} {row['operation']:>28}: median {row['median_ms']:9.1f} ms, "
+                  f"min {row['min_ms']:9.1f} ms")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report))
+
+    if args.compare:
+        if compare(report['results'], args.compare):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
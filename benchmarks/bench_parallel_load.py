@@ -0,0 +1,66 @@
+"""
+Compare sequential and concurrent range loads from the file backend.
+
+Each file read is delayed by a fixed latency to imitate a network-backed
+data directory, then the same range is loaded with different load_workers
+settings.
+
+Usage:
+    python benchmarks/bench_parallel_load.py [--days 30] [--latency-ms 2]
+        [--workers 1 4 8 16]
+"""
+import argparse
+import json
+import shutil
+import tempfile
+import time
+
+from NaranjaMachineTracker.storage import JsonStorage
+from NaranjaMachineTracker.synthetic import generate_records
+
+
+class SlowJsonStorage(JsonStorage):
+    """JsonStorage with a fixed delay added to every file read."""
+
+    def __init__(self, data_dir, latency, **kwargs):
+        super().__init__(data_dir, **kwargs)
+        self.latency = latency
+
+    def _read_file(self, timestamp, entry):
+        time.sleep(self.latency)
+        return super()._read_file(timestamp, entry)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark concurrent range loads.")
+    parser.add_argument("--days", type=int, default=30, help="Days of synthetic data (default: 30)")
+    parser.add_argument("--latency-ms", type=float, default=2.0, help="Delay per file read (default: 2)")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8, 16],
+                        help="load_workers settings to compare (default: 1 4 8 16)")
+    args = parser.parse_args(argv)
+
+    data_dir = tempfile.mkdtemp(prefix="bench_load_")
+    try:
+        records = list(generate_records("2024-01-01", args.days))
+        JsonStorage(data_dir).write_many(records)
+        start_date, end_date = records[0]['date'], records[-1]['date']
+
+        results = []
+        for workers in args.workers:
+            storage = SlowJsonStorage(data_dir, args.latency_ms / 1000, load_workers=workers)
+            started = time.perf_counter()
+            loaded = storage.read_range(start_date, end_date)
+            elapsed = time.perf_counter() - started
+            assert loaded == records, "records out of order"
+
+            results.append({'workers': workers, 'files': len(loaded), 'elapsed_sec': elapsed})
+            print(f"{workers:>3} workers: {len(loaded)} files in {elapsed * 1000:.0f} ms "
+                  f"({results[0]['elapsed_sec'] / elapsed:.1f}x)")
+
+        print(json.dumps(results))
+    finally:
+        shutil.rmtree(data_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Compare the indented JSON and compact binary record formats.
+
+Writes a synthetic year of hourly records in each format, then reports the
+bytes on disk and the time to parse every file back.
+
+Usage:
+    python benchmarks/bench_record_codec.py [--days 365] [--repeat 3]
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from NaranjaMachineTracker.record_codec import decode
+from NaranjaMachineTracker.storage import JsonStorage
+from NaranjaMachineTracker.synthetic import generate_records
+
+
+def measure(record_format, records, repeat):
+    data_dir = tempfile.mkdtemp(prefix=f"bench_{record_format}_")
+    try:
+        storage = JsonStorage(data_dir, record_format=record_format)
+        storage.write_many(records)
+
+        paths = [
+            os.path.join(data_dir, name) for name in os.listdir(data_dir)
+            if name.endswith(storage.extension)
+        ]
+        total_bytes = sum(os.path.getsize(path) for path in paths)
+
+        # Parse time only: read the bytes first so disk caching doesn't skew it
+        payloads = []
+        for path in paths:
+            with open(path, 'rb') as f:
+                payloads.append(f.read())
+
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            for payload in payloads:
+                decode(payload)
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+
+        # End to end through the storage backend, cold index
+        started = time.perf_counter()
+        loaded = JsonStorage(data_dir).read_range("0000-01-01", "9999-12-31")
+        range_elapsed = time.perf_counter() - started
+        assert len(loaded) == len(records)
+
+        return {
+            'format': record_format,
+            'files': len(paths),
+            'bytes': total_bytes,
+            'bytes_per_record': total_bytes / len(paths),
+            'parse_sec': best,
+            'read_range_sec': range_elapsed
+        }
+    finally:
+        shutil.rmtree(data_dir)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark record encodings.")
+    parser.add_argument("--days", type=int, default=365, help="Days of synthetic data (default: 365)")
+    parser.add_argument("--repeat", type=int, default=3, help="Parse repetitions, best is kept (default: 3)")
+    args = parser.parse_args(argv)
+
+    records = list(generate_records("2024-01-01", args.days))
+    results = [measure(record_format, records, args.repeat) for record_format in ('json', 'binary')]
+
+    for result in results:
+        print(f"{result['format']:>7}: {result['files']} files, {result['bytes'] / 1e6:.2f} MB "
+              f"({result['bytes_per_record']:.0f} B/record), parse {result['parse_sec'] * 1000:.0f} ms, "
+              f"read_range {result['read_range_sec'] * 1000:.0f} ms")
+
+    json_result, binary_result = results
+    print(f"binary is {json_result['bytes'] / binary_result['bytes']:.1f}x smaller and parses "
+          f"{json_result['parse_sec'] / binary_result['parse_sec']:.1f}x faster")
+    print(json.dumps(results))
+
+
+if __name__ == "__main__":
+    main()
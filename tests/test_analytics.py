@@ -0,0 +1,118 @@
+import datetime
+
+import pytest
+
+from NaranjaMachineTracker import analytics
+from NaranjaMachineTracker.data_handler import DataHandler
+from NaranjaMachineTracker.synthetic import generate_records
+from NaranjaMachineTracker.utils import get_machine_type
+
+
+def legacy_machine_averages(records):
+    # The per-record loops the vectorized aggregates replaced
+    totals = {}
+    for data in records:
+        for machine_name, machine_data in data['machines'].items():
+            machine_number = int(machine_name.split(' ')[-1])
+            total = totals.setdefault(machine_number, {'utilization': 0, 'cartons_per_packer': 0, 'cartons': 0,
+                                                       'data_points': 0})
+            total['utilization'] += machine_data['utilization']
+            total['cartons'] += machine_data['cartons_packed']
+            if machine_data['packers'] > 0:
+                total['cartons_per_packer'] += machine_data['cartons_per_packer']
+            total['data_points'] += 1
+
+    return {
+        machine_number: {
+            'type': get_machine_type(machine_number),
+            'avg_utilization': total['utilization'] / total['data_points'],
+            'avg_cartons_per_packer': total['cartons_per_packer'] / total['data_points'],
+            'total_cartons': total['cartons']
+        }
+        for machine_number, total in sorted(totals.items())
+    }
+
+
+def legacy_average_by(records, key):
+    totals = {}
+    for data in records:
+        for machine_name, machine_data in data['machines'].items():
+            total = totals.setdefault(key(data, machine_name, machine_data), [0, 0])
+            total[0] += machine_data['utilization']
+            total[1] += 1
+    return {group: total / count for group, (total, count) in sorted(totals.items())}
+
+
+@pytest.fixture
+def records():
+    records = list(generate_records("2025-03-20", 3))
+    # An hour without machines adds nothing to any average
+    records.append({'timestamp': "2025-03-23_5", 'date': "2025-03-23", 'hour': 5, 'username': "Ed", 'machines': {}})
+    return records
+
+
+def test_records_to_frame_has_one_row_per_machine_hour(records):
+    df = analytics.records_to_frame(records)
+    assert list(df.columns) == analytics.FRAME_COLUMNS
+    assert len(df) == sum(len(data['machines']) for data in records)
+    assert analytics.records_to_frame([]).empty
+
+
+def test_machine_averages_match_the_record_loop(records):
+    expected = legacy_machine_averages(records)
+    averages = analytics.machine_averages(analytics.records_to_frame(records)).to_dict(orient='index')
+
+    assert list(averages) == list(expected)
+    for machine_number, row in expected.items():
+        assert averages[machine_number]['type'] == row['type']
+        assert averages[machine_number]['total_cartons'] == row['total_cartons']
+        assert averages[machine_number]['avg_utilization'] == pytest.approx(row['avg_utilization'])
+        assert averages[machine_number]['avg_cartons_per_packer'] == pytest.approx(row['avg_cartons_per_packer'])
+
+
+def test_daily_average_utilization_matches_the_record_loop(records):
+    expected = legacy_average_by(records, lambda data, machine_name, machine_data: data['date'])
+    daily = analytics.daily_average_utilization(analytics.records_to_frame(records))
+    assert daily.to_dict() == pytest.approx(expected)
+    assert list(daily.index) == list(expected)
+
+
+@pytest.mark.parametrize("dimension", ["all", "machine", "carton_type", "inventory"])
+def test_hourly_utilization_matches_the_record_loop(records, dimension):
+    def key(data, machine_name, machine_data):
+        hour_start = datetime.datetime.fromisoformat(data['date']) + datetime.timedelta(hours=data['hour'])
+        if dimension == "all":
+            return hour_start, "all"
+        if dimension == "machine":
+            return hour_start, int(machine_name.split(' ')[-1])
+        return hour_start, machine_data[dimension]
+
+    expected = legacy_average_by(records, key)
+    hourly = analytics.hourly_utilization(analytics.records_to_frame(records), dimension)
+    actual = {
+        (hour_start.to_pydatetime(), group): value
+        for hour_start, row in hourly.iterrows()
+        for group, value in row.items()
+        if value == value
+    }
+    assert actual == pytest.approx(expected)
+
+
+def test_data_handler_aggregates_match_the_record_loop(tmp_path, records):
+    data_handler = DataHandler(str(tmp_path))
+    data_handler.save_many(records)
+
+    expected = legacy_machine_averages([data for data in records if data['date'] == "2025-03-21"])
+    averages = data_handler.machine_averages("2025-03-21")
+    assert list(averages) == [f"Machine {machine_number}" for machine_number in expected]
+    for machine_number, row in expected.items():
+        assert averages[f"Machine {machine_number}"] == pytest.approx(row)
+
+    expected = legacy_average_by(records, lambda data, machine_name, machine_data: data['date'])
+    assert data_handler.daily_average_utilization("2025-03-01", "2025-03-31") == pytest.approx(expected)
+
+    expected = legacy_average_by(
+        records, lambda data, machine_name, machine_data: (data['date'], machine_data['inventory']))
+    inventory = data_handler.daily_inventory_utilization("2025-03-01", "2025-03-31")
+    actual = {(date_str, status): value for date_str, by_status in inventory.items() for status, value in by_status.items()}
+    assert actual == pytest.approx(expected)
@@ -0,0 +1,57 @@
+from NaranjaMachineTracker import backfill
+from NaranjaMachineTracker.data_handler import DataHandler
+from NaranjaMachineTracker.synthetic import generate_records
+
+
+def save_stale_records(data_dir, start_date_str, days):
+    # Records whose derived utilization no longer matches their readings
+    records = list(generate_records(start_date_str, days))
+    for data in records:
+        for machine_data in data['machines'].values():
+            machine_data['utilization'] = -1.0
+    DataHandler(data_dir).save_many(records)
+    return records
+
+
+def test_backfill_rewrites_stale_derived_fields(tmp_path):
+    data_dir = str(tmp_path)
+    records = save_stale_records(data_dir, "2025-03-20", 2)
+
+    summary = backfill.backfill(data_dir, "json", "2025-03-20", "2025-03-21", workers=1)
+
+    assert summary['records'] == summary['updated'] == len(records)
+    assert summary['skipped'] == []
+    for data in DataHandler(data_dir).load_date_range_data("2025-03-20", "2025-03-21"):
+        assert all(machine_data['utilization'] >= 0 for machine_data in data['machines'].values())
+
+
+def test_backfill_dry_run_writes_nothing(tmp_path):
+    data_dir = str(tmp_path)
+    records = save_stale_records(data_dir, "2025-03-20", 1)
+
+    summary = backfill.backfill(data_dir, "json", "2025-03-20", "2025-03-20", workers=1, dry_run=True)
+
+    assert summary['updated'] == len(records)
+    assert DataHandler(data_dir).load_daily_data("2025-03-20") == records
+
+
+def test_backfill_skips_records_saved_during_the_run(tmp_path, monkeypatch):
+    data_dir = str(tmp_path)
+    records = save_stale_records(data_dir, "2025-03-20", 1)
+    resaved = dict(records[0], username="Operator")
+
+    # An operator re-saves one hour after the shard has read it
+    recompute_records = backfill.recompute_records
+
+    def racing_recompute_records(loaded):
+        result = recompute_records(loaded)
+        assert DataHandler(data_dir).save_data(resaved['timestamp'], resaved)
+        return result
+
+    monkeypatch.setattr(backfill, "recompute_records", racing_recompute_records)
+    summary = backfill.backfill(data_dir, "json", "2025-03-20", "2025-03-20", workers=1)
+
+    assert summary['skipped'] == [resaved['timestamp']]
+    assert summary['updated'] == len(records) - 1
+    assert all(diff[0] != resaved['timestamp'] for diff in summary['diffs'])
+    assert DataHandler(data_dir).load_data(resaved['timestamp']) == resaved
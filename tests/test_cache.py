@@ -0,0 +1,74 @@
+import pytest
+
+from NaranjaMachineTracker.cache import CachedDataHandler
+from NaranjaMachineTracker.data_handler import DataHandler
+from NaranjaMachineTracker.synthetic import generate_record, generate_records
+
+
+def cached_keys(data_handler):
+    return set(data_handler._entries)
+
+
+def test_save_many_drops_only_entries_covering_the_saved_dates(tmp_path):
+    data_handler = CachedDataHandler(DataHandler(str(tmp_path)))
+    data_handler.save_many(list(generate_records("2025-03-20", 4)))
+
+    data_handler.load_data("2025-03-20_9")
+    data_handler.load_data("2025-03-21_9")
+    data_handler.load_daily_data("2025-03-20")
+    data_handler.load_daily_data("2025-03-23")
+    data_handler.load_date_range_data("2025-03-21", "2025-03-22")
+    data_handler.list_available_dates()
+
+    data_handler.save_many([generate_record("2025-03-20", 9), generate_record("2025-03-22", 9)])
+
+    assert cached_keys(data_handler) == {
+        ('record', "2025-03-21_9"),
+        ('range', "2025-03-23", "2025-03-23"),
+    }
+
+
+def test_save_many_invalidates_in_one_pass(tmp_path):
+    data_handler = CachedDataHandler(DataHandler(str(tmp_path)))
+    generation = data_handler._generation
+
+    data_handler.save_many(list(generate_records("2025-03-20", 2)))
+
+    assert data_handler._generation == generation + 1
+
+
+def test_save_many_invalidates_even_when_the_save_fails(tmp_path):
+    data_handler = CachedDataHandler(DataHandler(str(tmp_path)))
+    record = generate_record("2025-03-20", 9)
+    data_handler.save_data(record['timestamp'], record)
+    data_handler.load_daily_data("2025-03-20")
+
+    def failing_save_many(records, merge=False):
+        raise OSError("disk full")
+
+    data_handler.data_handler.save_many = failing_save_many
+    with pytest.raises(OSError):
+        data_handler.save_many([generate_record("2025-03-20", 10)])
+
+    assert cached_keys(data_handler) == set()
+
+
+def test_load_racing_a_save_is_not_cached(tmp_path):
+    data_handler = CachedDataHandler(DataHandler(str(tmp_path)))
+    record = generate_record("2025-03-20", 9)
+    data_handler.save_data(record['timestamp'], record)
+
+    # Another session saves while this one is still reading the day
+    load_daily_data = data_handler.data_handler.load_daily_data
+
+    def racing_load_daily_data(date_str):
+        records = load_daily_data(date_str)
+        newer = generate_record("2025-03-20", 10)
+        data_handler.save_data(newer['timestamp'], newer)
+        return records
+
+    data_handler.data_handler.load_daily_data = racing_load_daily_data
+    assert len(data_handler.load_daily_data("2025-03-20")) == 1
+    data_handler.data_handler.load_daily_data = load_daily_data
+
+    assert len(data_handler.load_daily_data("2025-03-20")) == 2
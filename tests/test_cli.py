@@ -0,0 +1,22 @@
+import json
+
+from NaranjaMachineTracker.cli import export_range
+from NaranjaMachineTracker.data_handler import DataHandler
+from NaranjaMachineTracker.synthetic import generate_records
+from NaranjaMachineTracker.utils import MACHINE_NUMBERS
+
+
+def test_jsonl_export_has_one_json_object_per_line(tmp_path):
+    data_handler = DataHandler(str(tmp_path / "data"))
+    data_handler.save_many(list(generate_records("2025-03-20", 3)))
+    output = str(tmp_path / "export.jsonl")
+
+    # Two records per batch, so the export is written in many batches
+    summary = export_range(data_handler, "2025-03-20", "2025-03-22", output,
+                           batch_size=2 * len(MACHINE_NUMBERS))
+
+    with open(output, 'r') as f:
+        lines = f.read().split("\n")
+    assert lines[-1] == ""
+    rows = [json.loads(line) for line in lines[:-1]]
+    assert len(rows) == summary['rows'] == 36 * len(MACHINE_NUMBERS)
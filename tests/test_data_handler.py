@@ -0,0 +1,153 @@
+import multiprocessing
+
+import pytest
+
+from NaranjaMachineTracker.cache import CachedDataHandler
+from NaranjaMachineTracker.data_handler import DataHandler, create_data_handler
+from NaranjaMachineTracker.storage import NEW_RECORD_VERSION, ConflictError, record_version
+from NaranjaMachineTracker.synthetic import generate_record, generate_records
+
+
+class FailingStorage:
+    """Wraps a backend and fails after streaming a few records."""
+
+    def __init__(self, storage, fail_after):
+        self.storage = storage
+        self.fail_after = fail_after
+
+    def __getattr__(self, name):
+        return getattr(self.storage, name)
+
+    def iter_range(self, start_date_str, end_date_str):
+        for i, data in enumerate(self.storage.iter_range(start_date_str, end_date_str)):
+            if i == self.fail_after:
+                raise OSError("disk went away")
+            yield data
+
+
+def test_iter_range_rejects_malformed_dates_when_called(tmp_path):
+    data_handler = DataHandler(str(tmp_path))
+    with pytest.raises(ValueError):
+        data_handler.iter_range("2025-13-01", "2025-12-31")
+
+
+def test_iter_range_raises_storage_errors_mid_stream(tmp_path):
+    data_handler = DataHandler(str(tmp_path))
+    data_handler.save_many(list(generate_records("2025-03-20", 3)))
+    data_handler.storage = FailingStorage(data_handler.storage, fail_after=15)
+
+    streamed = []
+    with pytest.raises(OSError):
+        for data in data_handler.iter_range("2025-03-20", "2025-03-22"):
+            streamed.append(data)
+    assert len(streamed) == 15
+
+
+def test_failed_rollup_rebuild_is_not_marked_built(tmp_path):
+    data_dir = str(tmp_path)
+    DataHandler(data_dir).storage.write_many(list(generate_records("2025-03-20", 3)))
+
+    data_handler = DataHandler(data_dir)
+    data_handler.storage = FailingStorage(data_handler.storage, fail_after=15)
+    with pytest.raises(OSError):
+        data_handler.rebuild_rollups()
+    assert not data_handler.rollups.is_built()
+
+    # A later handler builds them in full
+    daily = DataHandler(data_dir).daily_average_utilization("2025-03-20", "2025-03-22")
+    assert list(daily) == ["2025-03-20", "2025-03-21", "2025-03-22"]
+
+
+def test_sqlite_aggregates_match_the_default_handler(tmp_path):
+    records = list(generate_records("2025-03-20", 3))
+    json_handler = create_data_handler("json", str(tmp_path / "json"))
+    sqlite_handler = create_data_handler("sqlite", str(tmp_path / "sqlite"))
+    json_handler.save_many(records)
+    sqlite_handler.save_many(records)
+    sqlite_handler.save_data("2025-03-21_3", {'timestamp': "2025-03-21_3", 'date': "2025-03-21", 'hour': 3,
+                                              'username': "Ed", 'machines': {}})
+
+    expected = json_handler.machine_averages("2025-03-21")
+    actual = sqlite_handler.machine_averages("2025-03-21")
+    assert list(actual) == list(expected)
+    for machine_name, averages in expected.items():
+        assert actual[machine_name]['type'] == averages['type']
+        assert actual[machine_name]['total_cartons'] == averages['total_cartons']
+        assert actual[machine_name]['avg_utilization'] == pytest.approx(averages['avg_utilization'])
+        assert actual[machine_name]['avg_cartons_per_packer'] == pytest.approx(averages['avg_cartons_per_packer'])
+
+    expected = json_handler.daily_average_utilization("2025-03-20", "2025-03-22")
+    assert sqlite_handler.daily_average_utilization("2025-03-20", "2025-03-22") == pytest.approx(expected)
+
+    expected = json_handler.daily_inventory_utilization("2025-03-20", "2025-03-22")
+    actual = sqlite_handler.daily_inventory_utilization("2025-03-20", "2025-03-22")
+    assert list(actual) == list(expected)
+    for date_str, by_inventory in expected.items():
+        assert actual[date_str] == pytest.approx(by_inventory)
+
+
+@pytest.mark.parametrize("backend", ["json", "parquet", "history", "sqlite"])
+def test_save_with_a_stale_version_raises_a_conflict(tmp_path, backend):
+    data_handler = create_data_handler(backend, str(tmp_path))
+    record = generate_record("2025-03-20", 9)
+    assert data_handler.save_data(record['timestamp'], record, expected_version=NEW_RECORD_VERSION)
+    with pytest.raises(ConflictError):
+        data_handler.save_data(record['timestamp'], record, expected_version=NEW_RECORD_VERSION)
+
+    # Two editors open the same hour; the second save loses
+    loaded, version = data_handler.load_data(record['timestamp'], with_version=True)
+    first = dict(loaded, username="First")
+    second = dict(loaded, username="Second")
+    assert data_handler.save_data(record['timestamp'], first, expected_version=version)
+    with pytest.raises(ConflictError):
+        data_handler.save_data(record['timestamp'], second, expected_version=version)
+    assert data_handler.load_data(record['timestamp']) == first
+
+    # Reloading picks up the current version and the save goes through
+    _, version = data_handler.load_data(record['timestamp'], with_version=True)
+    assert data_handler.save_data(record['timestamp'], second, expected_version=version)
+    assert data_handler.load_data(record['timestamp']) == second
+
+
+def test_cached_conflict_drops_the_stale_record(tmp_path):
+    data_handler = CachedDataHandler(DataHandler(str(tmp_path)))
+    record = generate_record("2025-03-20", 9)
+    data_handler.save_data(record['timestamp'], record)
+    _, version = data_handler.load_data(record['timestamp'], with_version=True)
+
+    # Another process saves; this cache still holds the old record
+    changed = dict(record, username="Elsewhere")
+    DataHandler(str(tmp_path)).save_data(record['timestamp'], changed)
+    with pytest.raises(ConflictError):
+        data_handler.save_data(record['timestamp'], dict(record, username="Here"), expected_version=version)
+
+    assert data_handler.load_data(record['timestamp'], with_version=True) == (changed, record_version(changed))
+
+
+def _increment_optimistically(data_dir, timestamp, times):
+    data_handler = DataHandler(data_dir)
+    for _ in range(times):
+        while True:
+            data, version = data_handler.load_data(timestamp, with_version=True)
+            try:
+                data_handler.save_data(timestamp, dict(data, username=str(int(data['username']) + 1)), version)
+                break
+            except ConflictError:
+                pass
+
+
+def test_versioned_saves_lose_no_update_across_processes(tmp_path):
+    data_dir = str(tmp_path)
+    record = generate_record("2025-03-20", 9)
+    DataHandler(data_dir).save_data(record['timestamp'], dict(record, username="0"))
+
+    workers = [
+        multiprocessing.Process(target=_increment_optimistically, args=(data_dir, record['timestamp'], 25))
+        for _ in range(4)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert DataHandler(data_dir).load_data(record['timestamp'])['username'] == "100"
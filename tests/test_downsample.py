@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from NaranjaMachineTracker.downsample import downsample, lttb_indices, minmax_indices, point_budget
+
+
+@pytest.fixture
+def series():
+    rng = np.random.default_rng(1)
+    x = np.arange(5000)
+    y = rng.normal(60, 10, len(x))
+    y[1234] = 250.0
+    y[4321] = -40.0
+    return x, y
+
+
+@pytest.mark.parametrize("select", [lttb_indices, minmax_indices])
+def test_selection_keeps_the_ends_in_order_within_budget(series, select):
+    x, y = series
+    indices = select(x, y, 200)
+
+    assert 0 < len(indices) <= 200
+    assert indices[0] == 0 and indices[-1] == len(x) - 1
+    assert (np.diff(indices) > 0).all()
+
+
+def test_lttb_uses_the_whole_budget(series):
+    x, y = series
+    assert len(lttb_indices(x, y, 200)) == 200
+
+
+def test_minmax_keeps_every_bucket_extreme(series):
+    x, y = series
+    indices = minmax_indices(x, y, 200)
+
+    assert {1234, 4321} <= set(indices.tolist())
+    edges = np.linspace(1, len(x) - 1, (200 - 2) // 2 + 1).astype(np.int64)
+    for start, end in zip(edges[:-1], edges[1:]):
+        bucket = np.arange(start, end)
+        assert bucket[np.argmin(y[bucket])] in indices
+        assert bucket[np.argmax(y[bucket])] in indices
+
+
+@pytest.mark.parametrize("method", ["lttb", "minmax"])
+def test_short_series_are_returned_whole(method):
+    x = np.arange(10)
+    y = np.arange(10, dtype=float)
+    kept_x, kept_y = downsample(x, y, 100, method)
+    assert kept_x.tolist() == x.tolist()
+    assert kept_y.tolist() == y.tolist()
+
+
+def test_downsample_drops_missing_hours_and_accepts_datetimes():
+    x = np.arange('2025-03-20T00', '2025-04-20T00', dtype='datetime64[h]')
+    y = np.sin(np.arange(len(x)) / 10.0) * 50 + 50
+    y[::7] = np.nan
+
+    kept_x, kept_y = downsample(x, y, 100)
+    assert len(kept_x) == len(kept_y) == 100
+    assert kept_x.dtype == x.dtype
+    assert not np.isnan(kept_y).any()
+    assert kept_x[0] == x[1] and kept_x[-1] == x[-1]
+
+
+def test_unknown_method_is_rejected():
+    with pytest.raises(ValueError):
+        downsample([0, 1], [0.0, 1.0], 100, method="mean")
+
+
+def test_point_budget_has_a_floor():
+    assert point_budget(800) == 1600
+    assert point_budget(10) == 100
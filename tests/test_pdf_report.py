@@ -0,0 +1,42 @@
+import io
+import re
+
+import pytest
+
+from NaranjaMachineTracker.data_handler import DataHandler
+from NaranjaMachineTracker.pdf_report import generate_report, parse_hours, report_sections
+from NaranjaMachineTracker.synthetic import generate_records
+
+
+def page_count(pdf):
+    # Each appended day updates the page tree; the last update counts them all
+    return int(re.findall(rb"/Count\s+(\d+)", pdf)[-1])
+
+
+def test_report_sections_are_a_summary_then_one_per_day():
+    records = list(generate_records("2025-03-20", 2))
+    sections = report_sections(records, "2025-03-20", "2025-03-21", "all")
+
+    assert [len(section) for section in sections] == [1] + [1 + 12, 1 + 12]
+    assert sections[0][0][0] == "summary"
+    assert [section[0][:2] for section in sections[1:]] == [("charts", "2025-03-20"), ("charts", "2025-03-21")]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_generate_report_writes_every_page(tmp_path, workers):
+    data_handler = DataHandler(str(tmp_path))
+    data_handler.save_many(list(generate_records("2025-03-20", 2)))
+
+    output = io.BytesIO()
+    pages = generate_report(data_handler, "2025-03-20", "2025-03-21", output, 8, 9, workers=workers)
+
+    # Summary, then a chart page and two hours per day
+    assert pages == 1 + 2 * (1 + 2)
+    assert output.getvalue().startswith(b"%PDF")
+    assert page_count(output.getvalue()) == pages
+
+
+def test_parse_hours():
+    assert parse_hours(None) == (0, 23)
+    assert parse_hours("6-17") == (6, 17)
+    assert parse_hours("9") == (9, 9)
@@ -0,0 +1,43 @@
+import json
+
+import pytest
+
+from NaranjaMachineTracker.record_codec import MAGIC, decode, decode_record, encode_record
+from NaranjaMachineTracker.synthetic import generate_records
+
+
+def test_records_round_trip_exactly():
+    for data in generate_records("2025-03-20", 2):
+        assert decode_record(encode_record(data)) == data
+
+
+def test_strings_outside_the_configuration_round_trip():
+    data = next(generate_records("2025-03-20", 1))
+    machine_name = next(iter(data['machines']))
+    data['username'] = "José Niño"
+    data['machines'][machine_name] = dict(data['machines'][machine_name], carton_type="Caja 7½ kg",
+                                          inventory="Sin fruta")
+
+    assert decode_record(encode_record(data)) == data
+
+
+def test_hour_without_machines_round_trips():
+    data = {'timestamp': "2025-03-20_5", 'date': "2025-03-20", 'hour': 5, 'username': "Ed", 'machines': {}}
+    assert decode_record(encode_record(data)) == data
+
+
+def test_encoded_record_is_smaller_than_its_json():
+    data = next(generate_records("2025-03-20", 1))
+    assert len(encode_record(data)) * 4 < len(json.dumps(data, indent=2))
+
+
+def test_decode_detects_the_format():
+    data = next(generate_records("2025-03-20", 1))
+    assert encode_record(data).startswith(MAGIC)
+    assert decode(encode_record(data)) == data
+    assert decode(json.dumps(data, indent=2).encode('utf-8')) == data
+
+
+def test_decode_record_rejects_other_payloads():
+    with pytest.raises(ValueError):
+        decode_record(b"{}" + bytes(16))
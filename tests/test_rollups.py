@@ -0,0 +1,48 @@
+import os
+import random
+
+from NaranjaMachineTracker.cache import CachedDataHandler
+from NaranjaMachineTracker.data_handler import DataHandler
+from NaranjaMachineTracker.synthetic import generate_record, generate_records
+
+
+def test_save_on_existing_history_keeps_earlier_days_in_trends(tmp_path):
+    # History written before the rollups existed, bypassing DataHandler
+    data_dir = str(tmp_path)
+    DataHandler(data_dir).storage.write_many(list(generate_records("2025-03-20", 3)))
+
+    record = generate_record("2025-03-23", 9)
+    assert DataHandler(data_dir).save_data(record['timestamp'], record)
+
+    data_handler = DataHandler(data_dir)
+    daily = data_handler.daily_average_utilization("2025-03-01", "2025-03-31")
+    assert list(daily) == ["2025-03-20", "2025-03-21", "2025-03-22", "2025-03-23"]
+
+    weekly = data_handler.utilization_trend("2025-03-01", "2025-03-31", "weekly")
+    expected = data_handler.load_frame("2025-03-17", "2025-03-23")['utilization'].mean()
+    assert abs(weekly["2025-03-17"]['all'] - expected) < 1e-9
+
+
+def test_cached_weekly_trend_is_invalidated_by_a_save_later_in_its_last_week(tmp_path):
+    data_handler = CachedDataHandler(DataHandler(str(tmp_path)))
+    data_handler.save_many(list(generate_records("2025-03-17", 3)))
+
+    # The week of 2025-03-17 runs to 2025-03-23, past the requested range
+    before = data_handler.utilization_trend("2025-03-17", "2025-03-19", "weekly")["2025-03-17"]['all']
+    record = generate_record("2025-03-22", 9, random.Random(1))
+    data_handler.save_data(record['timestamp'], record)
+    after = data_handler.utilization_trend("2025-03-17", "2025-03-19", "weekly")["2025-03-17"]['all']
+
+    expected = data_handler.load_frame("2025-03-17", "2025-03-23")['utilization'].mean()
+    assert after != before
+    assert abs(after - expected) < 1e-9
+
+
+def test_rollup_database_is_kept_out_of_the_data_directory(tmp_path):
+    data_handler = DataHandler(str(tmp_path))
+    record = generate_record("2025-03-20", 9)
+    data_handler.save_data(record['timestamp'], record)
+    data_handler.daily_average_utilization("2025-03-20", "2025-03-20")
+
+    assert os.path.exists(tmp_path / ".rollups" / "rollups.db")
+    assert not [name for name in os.listdir(tmp_path) if name.startswith("rollups")]
@@ -0,0 +1,177 @@
+import json
+import multiprocessing
+import os
+import time
+
+import pytest
+
+from NaranjaMachineTracker.data_handler import create_data_handler
+from NaranjaMachineTracker.storage import MTIME_GRANULARITY_NS, HistoryStorage, JsonStorage
+from NaranjaMachineTracker.synthetic import generate_records
+
+
+BACKENDS = ["json", "binary", "parquet", "history", "sqlite"]
+
+
+def empty_hour(date_str, hour, username="Ed"):
+    return {'timestamp': f"{date_str}_{hour}", 'date': date_str, 'hour': hour, 'username': username, 'machines': {}}
+
+
+def test_history_write_many_of_nothing_is_a_no_op(tmp_path):
+    storage = HistoryStorage(str(tmp_path))
+    storage.write_many([])
+    assert storage.list_dates() == []
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_records_round_trip(tmp_path, backend):
+    records = list(generate_records("2025-03-31", 2))
+    data_handler = create_data_handler(backend, str(tmp_path))
+    assert data_handler.save_many(records) == len(records)
+
+    # Replacing an hour keeps a single copy of it
+    changed = dict(records[3], username="Someone else")
+    assert data_handler.save_data(changed['timestamp'], changed)
+    records[3] = changed
+
+    data_handler = create_data_handler(backend, str(tmp_path))
+    assert data_handler.load_data(changed['timestamp']) == changed
+    assert data_handler.load_data("2025-03-31_23") is None
+    assert data_handler.load_daily_data("2025-04-01") == [data for data in records if data['date'] == "2025-04-01"]
+    assert data_handler.load_date_range_data("2025-03-01", "2025-04-30") == records
+    assert list(data_handler.iter_range("2025-03-31", "2025-04-01")) == records
+    assert data_handler.list_available_dates() == ["2025-03-31", "2025-04-01"]
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_hour_without_machines_round_trips(tmp_path, backend):
+    data_handler = create_data_handler(backend, str(tmp_path))
+    data_handler.save_many([empty_hour("2025-03-20", 5)])
+    assert data_handler.save_data("2025-03-20_6", empty_hour("2025-03-20", 6, "Ana"))
+
+    assert data_handler.load_data("2025-03-20_5") == empty_hour("2025-03-20", 5)
+    assert data_handler.load_daily_data("2025-03-20") == [empty_hour("2025-03-20", 5), empty_hour("2025-03-20", 6, "Ana")]
+    assert data_handler.list_available_dates() == ["2025-03-20"]
+    assert data_handler.load_frame("2025-03-20", "2025-03-20").empty
+
+
+def test_json_manifest_prefers_the_newer_file_of_an_hour_in_both_formats(tmp_path):
+    records = list(generate_records("2025-03-20", 2))
+    JsonStorage(str(tmp_path)).write_many(records)
+
+    # A binary copy of another hour's record appears next to the JSON file
+    time.sleep(0.01)
+    os.makedirs(tmp_path / "copy")
+    JsonStorage(str(tmp_path / "copy"), record_format="binary").write_many([records[-1]])
+    os.replace(tmp_path / "copy" / f"{records[-1]['timestamp']}.rec", tmp_path / f"{records[0]['timestamp']}.rec")
+
+    storage = JsonStorage(str(tmp_path))
+    assert storage.read(records[0]['timestamp']) == records[-1]
+    assert len(storage.list_timestamps()) == len(records)
+
+
+def test_json_manifest_reads_a_record_rewritten_in_place(tmp_path):
+    records = list(generate_records("2025-03-20", 1))
+    storage = JsonStorage(str(tmp_path))
+    storage.write_many(records)
+    assert storage.read_range("2025-03-20", "2025-03-20") == records
+
+    # Editing a file in place leaves the directory untouched
+    changed = dict(records[0], username="Someone else")
+    with open(tmp_path / f"{records[0]['timestamp']}.json", 'w') as f:
+        json.dump(changed, f)
+    assert storage.read(records[0]['timestamp']) == changed
+    assert storage.read_range("2025-03-20", "2025-03-20")[0] == changed
+
+
+def _increment(data_dir, timestamp, times):
+    storage = JsonStorage(data_dir)
+    for _ in range(times):
+        with storage.lock(storage.lock_key(timestamp)):
+            data = storage.read(timestamp)
+            storage.write(timestamp, dict(data, hour=data['hour'] + 1))
+
+
+def test_json_locks_serialize_writers_across_processes_and_are_cleaned_up(tmp_path):
+    data_dir = str(tmp_path)
+    JsonStorage(data_dir).write("2025-03-20_0", empty_hour("2025-03-20", 0))
+
+    workers = [multiprocessing.Process(target=_increment, args=(data_dir, "2025-03-20_0", 50)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    storage = JsonStorage(data_dir)
+    assert storage.read("2025-03-20_0")['hour'] == 200
+    assert os.listdir(tmp_path / ".locks") == []
+
+
+def test_json_writes_leave_no_manifest_or_lock_behind(tmp_path):
+    storage = JsonStorage(str(tmp_path))
+    for data in generate_records("2025-03-20", 2):
+        with storage.lock(storage.lock_key(data['timestamp'])):
+            storage.write(data['timestamp'], data)
+
+    assert sorted(name for name in os.listdir(tmp_path) if name.startswith(".")) == [".locks", ".tmp"]
+    assert os.listdir(tmp_path / ".locks") == []
+    assert len(storage._locks) == 0
+
+
+def test_json_manifest_sees_files_written_in_the_same_mtime_tick_as_a_listing(tmp_path):
+    records = list(generate_records("2025-03-20", 1))
+    reader = JsonStorage(str(tmp_path))
+    writer = JsonStorage(str(tmp_path))
+    writer.write_many(records[:-1])
+
+    # On a filesystem with coarse timestamps the directory can end up with
+    # the same mtime as when the reader listed it
+    assert len(reader.list_timestamps()) == len(records) - 1
+    listed = os.stat(tmp_path)
+    writer.write(records[-1]['timestamp'], records[-1])
+    os.utime(tmp_path, ns=(listed.st_atime_ns, listed.st_mtime_ns))
+
+    assert sorted(reader.list_timestamps()) == sorted(data['timestamp'] for data in records)
+    assert reader.read_range("2025-03-20", "2025-03-20") == records
+
+
+def test_json_manifest_is_reused_once_the_directory_settles(tmp_path):
+    storage = JsonStorage(str(tmp_path))
+    storage.write_many(list(generate_records("2025-03-20", 1)))
+    settled = time.time_ns() - 10 * MTIME_GRANULARITY_NS
+    os.utime(tmp_path, ns=(settled, settled))
+
+    first = storage.list_timestamps()
+    assert storage._get_index() is storage._get_index()
+    assert storage.list_timestamps() == first
+
+
+@pytest.mark.parametrize("record_format", ["json", "binary"])
+def test_json_parallel_range_reads_match_sequential_ones(tmp_path, record_format):
+    records = list(generate_records("2025-03-20", 3))
+    JsonStorage(str(tmp_path), record_format=record_format).write_many(records)
+
+    sequential = JsonStorage(str(tmp_path), load_workers=1)
+    parallel = JsonStorage(str(tmp_path), load_workers=4)
+    assert parallel.read_range("2025-03-20", "2025-03-22") == sequential.read_range("2025-03-20", "2025-03-22")
+    assert parallel.read_range("2025-03-21", "2025-03-21") == [data for data in records if data['date'] == "2025-03-21"]
+
+    # Stopping early leaves the storage usable
+    stream = parallel.iter_range("2025-03-20", "2025-03-22")
+    assert next(stream) == records[0]
+    stream.close()
+    assert parallel.read_range("2025-03-20", "2025-03-22") == records
+
+
+def test_json_parallel_range_reads_raise_read_errors(tmp_path):
+    records = list(generate_records("2025-03-20", 1))
+    storage = JsonStorage(str(tmp_path), load_workers=4)
+    storage.write_many(records)
+    with open(tmp_path / f"{records[5]['timestamp']}.json", 'w') as f:
+        f.write("{not json")
+
+    streamed = []
+    with pytest.raises(ValueError):
+        for data in storage.iter_range("2025-03-20", "2025-03-20"):
+            streamed.append(data)
+    assert streamed == records[:5]
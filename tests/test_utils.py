@@ -0,0 +1,92 @@
+from NaranjaMachineTracker.utils import (
+    CARTON_TYPES, MACHINE_NUMBERS, MachineRegistry, calculate_cartons_per_packer, calculate_cartons_per_packer_batch,
+    calculate_utilization, calculate_utilization_batch, capacities, get_machine_capacity, get_machine_type
+)
+
+
+def legacy_machine_type(machine_number):
+    # The branching lookup that machines.json replaced
+    if 9 <= machine_number <= 14:
+        return "Speed Packer"
+    elif 15 <= machine_number <= 20:
+        return "Jumble Filler"
+    else:
+        return "Unknown"
+
+
+def legacy_machine_capacity(machine_number, carton_type):
+    if machine_number in [9, 10]:
+        if carton_type == "A02D":
+            return 300
+        elif carton_type in ["A07D", "A11D", "E15D"]:
+            return 300
+        elif carton_type == "E10D":
+            return 200
+        elif carton_type == "A15C":
+            return 216
+    elif 11 <= machine_number <= 14:
+        if carton_type == "A02D":
+            return 360
+        elif carton_type in ["A07D", "A11D", "E15D"]:
+            return 360
+        elif carton_type == "E10D":
+            return 240
+        elif carton_type == "A15C":
+            return 264
+    elif 15 <= machine_number <= 20:
+        return 210
+    return 0
+
+
+# Every configured case plus unknown machines and carton types
+LOOKUP_MACHINES = list(range(-1, 25)) + [1000]
+LOOKUP_CARTONS = CARTON_TYPES + ["Z99Z", ""]
+
+
+def test_registry_matches_the_legacy_lookup():
+    assert [get_machine_type(m) for m in LOOKUP_MACHINES] == [legacy_machine_type(m) for m in LOOKUP_MACHINES]
+
+    pairs = [(m, c) for m in LOOKUP_MACHINES for c in LOOKUP_CARTONS]
+    assert [get_machine_capacity(*pair) for pair in pairs] == [legacy_machine_capacity(*pair) for pair in pairs]
+    assert capacities([p[0] for p in pairs], [p[1] for p in pairs]).tolist() == [
+        legacy_machine_capacity(*pair) for pair in pairs
+    ]
+
+
+def test_capacities_of_no_rows():
+    assert capacities([], []).tolist() == []
+
+
+def test_registry_compiles_a_new_machine_group():
+    registry = MachineRegistry({
+        'carton_types': ["A02D", "B01X"],
+        'machine_groups': [
+            {'machines': [30, 31], 'type': "Bagger", 'line': 2, 'capacity': {"B01X": 500}},
+            {'machines': [32], 'type': "Jumble Filler", 'line': 2, 'default_capacity': 120}
+        ]
+    })
+
+    assert registry.machine_numbers == [30, 31, 32]
+    assert registry.machine_types[31] == "Bagger"
+    assert registry.capacity(30, "B01X") == 500
+    assert registry.capacity(30, "A02D") == 0
+    assert registry.capacity(32, "Z99Z") == 120
+    assert registry.capacity(29, "B01X") == 0
+    assert registry.capacities([30, 32, 32, 5], ["B01X", "A02D", "Z99Z", "B01X"]).tolist() == [500, 120, 120, 0]
+
+
+def test_utilization_batch_matches_scalar_exactly():
+    capacities = sorted({get_machine_capacity(m, c) for m in MACHINE_NUMBERS for c in CARTON_TYPES} | {0, 1, 7})
+    pairs = [(cartons, capacity) for capacity in capacities for cartons in range(400)]
+
+    batch = calculate_utilization_batch([p[0] for p in pairs], [p[1] for p in pairs]).tolist()
+    mismatches = [(pair, value) for pair, value in zip(pairs, batch) if value != calculate_utilization(*pair)]
+    assert mismatches == []
+
+
+def test_cartons_per_packer_batch_matches_scalar_exactly():
+    pairs = [(cartons, packers) for packers in range(0, 9) for cartons in range(400)]
+
+    batch = calculate_cartons_per_packer_batch([p[0] for p in pairs], [p[1] for p in pairs]).tolist()
+    mismatches = [(pair, value) for pair, value in zip(pairs, batch) if value != calculate_cartons_per_packer(*pair)]
+    assert mismatches == []